@@ -0,0 +1,81 @@
+"""
+Benchmark the decider LP solve time against the number of site pairs.
+
+The graph is a random set of requests between --sites sites, each with a port capacity of --capacity Mb/s.
+The previous approach (raising the lower bound by 5 and re-solving until infeasible) is run as a reference
+up to --reference-max pairs, as it needs capacity / 5 solves per pass.
+
+Importing the decider sets up the database engine, so DMM_CONFIG has to point to a config (a sqlite one is enough).
+
+    DMM_CONFIG=dmm.cfg python bench/decider.py --sites 20 --pairs 10 50 100 190
+"""
+import argparse
+import random
+from time import perf_counter
+
+import networkx as nx
+import numpy as np
+from scipy.optimize import linprog
+
+from dmm.daemons.core.decider import DeciderDaemon
+
+def build_multi_graph(n_sites, n_pairs, capacity, rng):
+    multi_graph = nx.MultiGraph()
+    sites = [f"T2_SITE_{i}" for i in range(n_sites)]
+    for site in sites:
+        multi_graph.add_node(site, port_capacity=capacity)
+    pairs = [(u, v) for i, u in enumerate(sites) for v in sites[i + 1:]]
+    for n, (u, v) in enumerate(rng.sample(pairs, min(n_pairs, len(pairs)))):
+        for _ in range(rng.randint(1, 3)):
+            multi_graph.add_edge(u, v, rule_id=f"rule-{n}-{rng.random()}", priority=rng.randint(1, 5), bandwidth=0, available_bandwidth=capacity)
+    return multi_graph
+
+def incremental_lower_bound(A, b, c, caps):
+    """
+    The previous _optimize_bandwidth
+    """
+    optim_result = None
+    lower_bound = 0
+    solves = 0
+    while True:
+        bounds = [(lower_bound, cap) for cap in caps]
+        curr_optim_result = linprog(c, A_ub=A, b_ub=b, bounds=bounds, method='highs')
+        solves += 1
+        if not curr_optim_result.success:
+            break
+        optim_result = curr_optim_result
+        lower_bound += 5
+    return optim_result.x, solves
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sites", type=int, default=20, help="number of sites in the mesh")
+    parser.add_argument("--pairs", type=int, nargs="+", default=[10, 50, 100, 190], help="numbers of site pairs with requests")
+    parser.add_argument("--capacity", type=float, default=10000, help="port capacity of every site (Mb/s)")
+    parser.add_argument("--reference-max", type=int, default=50, help="largest number of pairs to run the previous approach on")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    decider = DeciderDaemon(frequency=0)
+    print(f"{'pairs':>6}{'edges':>8}{'solve (s)':>12}{'previous (s)':>14}{'solves':>8}{'max diff':>10}")
+    for n_pairs in args.pairs:
+        multi_graph = build_multi_graph(args.sites, n_pairs, args.capacity, rng)
+        simple_graph, nodes, edges = decider._simplify_graph(multi_graph)
+        A, c, b, caps, _ = decider._prepare_optimization_matrices(simple_graph, nodes, edges)
+
+        start = perf_counter()
+        x = decider._optimize_bandwidth(A, b, c, caps)
+        elapsed = perf_counter() - start
+
+        if n_pairs <= args.reference_max:
+            start = perf_counter()
+            x_ref, solves = incremental_lower_bound(A, b, c, caps)
+            ref_elapsed = perf_counter() - start
+            diff = np.max(np.abs(np.asarray(x) - x_ref))
+            print(f"{n_pairs:>6}{len(edges):>8}{elapsed:>12.4f}{ref_elapsed:>14.4f}{solves:>8}{diff:>10.2f}")
+        else:
+            print(f"{n_pairs:>6}{len(edges):>8}{elapsed:>12.4f}{'-':>14}{'-':>8}{'-':>10}")
+
+if __name__ == "__main__":
+    main()
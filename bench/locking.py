@@ -0,0 +1,115 @@
+"""
+Benchmark the end-to-end cycle latency of the DMM daemons with a single global lock versus per-resource locks.
+
+The daemons are replaced by stand-ins with the same resource declarations as the real ones,
+the SENSE daemons sleep for --sense-latency seconds per pass to simulate a slow SENSE-O backend.
+
+    python bench/locking.py --duration 30 --sense-latency 2
+"""
+import argparse
+from contextlib import contextmanager
+from multiprocessing import Lock, Process, Queue
+from statistics import mean
+from time import monotonic, sleep
+
+from dmm.core.locks import ResourceLocks
+from dmm.daemons.base import DaemonBase
+
+# (name, resources, is_sense) mirroring the resources declared by the daemons in dmm.daemons
+DAEMONS = [
+    ("RefreshSiteDBDaemon", ("sites", "endpoints"), False),
+    ("AllocatorDaemon", ("request:INIT", "request:FINISHED", "endpoints"), True),
+    ("DeciderDaemon", ("request:ALLOCATED", "request:STAGED", "request:MODIFIED", "request:PROVISIONED"), False),
+    ("MonitDaemon", (), False),
+    ("ArchiverDaemon", ("request:DELETED", "request:CANCELED", "request:FAILED", "request:NOT_SENSE"), False),
+    ("FTSModifierDaemon", ("fts",), False),
+    ("RucioInitDaemon", (), False),
+    ("RucioModifierDaemon", ("request:ALLOCATED", "request:STAGED", "request:DECIDED", "request:PROVISIONED"), False),
+    ("RucioFinisherDaemon", ("request:ALLOCATED", "request:STAGED", "request:DECIDED", "request:PROVISIONED", "fts"), False),
+    ("RucioSizeDaemon", (), False),
+    # the handler polls SENSE-O holding sense:status only, its short step applying the results is left out
+    ("SENSEHandlerDaemon", ("sense:status",), True),
+    ("SENSEStagerDaemon", ("request:ALLOCATED",), True),
+    ("SENSEProvisionerDaemon", ("request:DECIDED",), True),
+    ("SENSEModifierDaemon", ("request:STALE",), True),
+    ("SENSECancellerDaemon", ("request:FINISHED", "endpoints"), True),
+    ("SENSEDeleterDaemon", ("request:CANCELED",), True),
+]
+
+class GlobalLock:
+    """
+    The previous behaviour: one lock shared by every daemon regardless of what it touches
+    """
+    def __init__(self):
+        self.lock = Lock()
+
+    @contextmanager
+    def hold(self, keys):
+        with self.lock:
+            yield
+
+class FakeDaemon(DaemonBase):
+    def __init__(self, name, resources, work, frequency, results):
+        super().__init__(frequency)
+        self.name = name
+        self.resources = resources
+        self.work = work
+        self.results = results
+        self.last = None
+
+    def process(self, **kwargs):
+        sleep(self.work)
+        now = monotonic()
+        if self.last is not None:
+            self.results.put((self.name, now - self.last))
+        self.last = now
+
+def run(locks, duration, frequency, sense_latency, work):
+    results = Queue()
+    procs = []
+    for name, resources, is_sense in DAEMONS:
+        daemon = FakeDaemon(name, resources, sense_latency if is_sense else work, frequency, results)
+        proc = Process(target=daemon.run_daemon, args=(daemon.process, locks), name=name)
+        proc.start()
+        procs.append(proc)
+    sleep(duration)
+    for proc in procs:
+        proc.kill()
+        proc.join()
+
+    cycles = {}
+    while not results.empty():
+        name, cycle = results.get()
+        cycles.setdefault(name, []).append(cycle)
+    return cycles
+
+def report(label, cycles, frequency, sense_latency, work):
+    print(f"\n{label}")
+    print(f"{'daemon':<25}{'passes':>8}{'mean cycle (s)':>16}{'lock wait (s)':>15}")
+    waits = []
+    for name, _, is_sense in DAEMONS:
+        samples = cycles.get(name, [])
+        if not samples:
+            print(f"{name:<25}{0:>8}{'-':>16}{'-':>15}")
+            continue
+        ideal = frequency + (sense_latency if is_sense else work)
+        wait = max(mean(samples) - ideal, 0)
+        waits.append(wait)
+        print(f"{name:<25}{len(samples) + 1:>8}{mean(samples):>16.3f}{wait:>15.3f}")
+    if waits:
+        print(f"mean lock wait per pass: {mean(waits):.3f}s")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run each configuration")
+    parser.add_argument("--frequency", type=float, default=1, help="daemon sleep between passes (seconds)")
+    parser.add_argument("--sense-latency", type=float, default=2, help="simulated SENSE-O call time per pass (seconds)")
+    parser.add_argument("--work", type=float, default=0.05, help="time spent per pass by the non-SENSE daemons (seconds)")
+    args = parser.parse_args()
+
+    for label, locks in (("global lock", GlobalLock()), ("per-resource locks", ResourceLocks())):
+        cycles = run(locks, args.duration, args.frequency, args.sense_latency, args.work)
+        report(label, cycles, args.frequency, args.sense_latency, args.work)
+
+if __name__ == "__main__":
+    main()
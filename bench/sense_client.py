@@ -0,0 +1,113 @@
+"""
+Benchmark the per-call latency of the SENSE-O clients against a local fake SENSE-O server.
+
+"fresh" builds a WorkflowCombinedApi for every call, like the daemons used to, which reads the auth config,
+gets a new token and opens a new connection each time. "pooled" goes through dmm.core.sense_api, which
+authenticates once per process and thread and keeps its connection alive.
+It then times one status polling pass of the handler over --instances service instances, one call at a time
+and with dmm.core.sense_api.get_instance_statuses.
+
+    python bench/sense_client.py --calls 200 --auth-latency 0.05 --status-latency 0.05 --instances 100
+"""
+import argparse
+import json
+import os
+import tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from statistics import mean, median
+from threading import Thread
+from time import perf_counter, sleep
+
+from sense.client.workflow_combined_api import WorkflowCombinedApi
+
+from dmm.core.sense_api import get_workflow_api, get_instance_statuses
+
+class FakeSENSEO(BaseHTTPRequestHandler):
+    """
+    Token endpoint and instance status endpoint, counting the calls and connections it serves
+    """
+    protocol_version = "HTTP/1.1" # keep-alive
+    disable_nagle_algorithm = True
+    auth_latency = 0
+    status_latency = 0
+    calls = {"auth": 0, "status": 0}
+    connections = set()
+
+    def _reply(self, body, content_type="application/json"):
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.connections.add(self.client_address)
+        self.calls["auth"] += 1
+        sleep(self.auth_latency)
+        self._reply(json.dumps({"access_token": "token", "refresh_token": "refresh", "expires_in": 3600}))
+
+    def do_GET(self):
+        self.connections.add(self.client_address)
+        self.calls["status"] += 1
+        sleep(self.status_latency)
+        self._reply('"CREATE - READY"')
+
+    def log_message(self, *args):
+        pass
+
+def run(label, make_api, calls):
+    FakeSENSEO.calls.update(auth=0, status=0)
+    FakeSENSEO.connections.clear()
+    latencies = []
+    for _ in range(calls):
+        start = perf_counter()
+        make_api().instance_get_status(si_uuid="bench")
+        latencies.append((perf_counter() - start) * 1000)
+    print(f"{label:<8}{mean(latencies):>10.2f}{median(latencies):>10.2f}{max(latencies):>10.2f}"
+          f"{FakeSENSEO.calls['auth']:>8}{len(FakeSENSEO.connections):>8}")
+
+def poll(instances, concurrency):
+    FakeSENSEO.calls.update(auth=0, status=0)
+    start = perf_counter()
+    statuses = get_instance_statuses([f"instance-{n}" for n in range(instances)], concurrency)
+    elapsed = perf_counter() - start
+    errors = sum(isinstance(status, Exception) for status in statuses.values())
+    print(f"{concurrency:<8}{elapsed * 1000:>10.1f}{FakeSENSEO.calls['status']:>8}{errors:>8}")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--auth-latency", type=float, default=0.0, help="seconds the token endpoint takes to answer")
+    parser.add_argument("--status-latency", type=float, default=0.0, help="seconds the status endpoint takes to answer")
+    parser.add_argument("--instances", type=int, default=100, help="service instances polled per handler pass")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    FakeSENSEO.auth_latency = args.auth_latency
+    FakeSENSEO.status_latency = args.status_latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSENSEO)
+    Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False) as f:
+        f.write(f"AUTH_ENDPOINT: {url}/auth\nAPI_ENDPOINT: {url}/api\nCLIENT_ID: bench\nSECRET: bench\n"
+                "USERNAME: bench\nPASSWORD: bench\nverify: false\n")
+    os.environ["SENSE_AUTH_OVERRIDE"] = f.name
+    try:
+        print(f"{'client':<8}{'mean ms':>10}{'p50 ms':>10}{'max ms':>10}{'tokens':>8}{'conns':>8}")
+        run("fresh", WorkflowCombinedApi, args.calls)
+        run("pooled", get_workflow_api, args.calls)
+        print(f"\n{'workers':<8}{'pass ms':>10}{'calls':>8}{'errors':>8}")
+        serial = poll(args.instances, 1)
+        poll(args.instances, args.concurrency) # first pass authenticates the pool threads
+        concurrent = poll(args.instances, args.concurrency)
+        print(f"handler pass {serial / concurrent:.1f}x faster, {(serial - concurrent) * 1000:.0f} ms saved")
+    finally:
+        os.unlink(f.name)
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
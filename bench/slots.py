@@ -0,0 +1,103 @@
+"""
+Benchmark the free slot computation of the slot scheduler against the number of SENSE reservations.
+
+Both versions of get_next_slot are timed against the pure Python ones they replaced, on the same random
+reservations over a --time units horizon with a --bandwidth Mb/s link, and their outputs are compared.
+The sim version (every bandwidth break against every reservation) is only run as a reference up to --reference-max reservations.
+
+    python bench/slots.py --reservations 100 1000 5000 10000
+"""
+import argparse
+import random
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from dmm.daemons.core.slots import get_next_slot
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "sim"))
+from find_next_slot import get_next_slot as sweep_next_slot
+
+def staircase_next_slot(unavailable, total):
+    """
+    The previous dmm.daemons.core.slots.get_next_slot
+    """
+    if not total:
+        return []
+    t_x1, t_x2, t_h = next(iter(total))
+    result_regions = []
+    current_y = 0
+    for u_x1, u_x2, u_h in sorted(unavailable, key=lambda u: (u[0], u[2])):
+        if u_h <= current_y:
+            continue
+        if u_x1 > t_x1:
+            result_regions.append((t_x1, u_x1, current_y, t_h))
+        result_regions.append((t_x1, u_x1, current_y, u_h))
+        current_y = u_h
+    if current_y < t_h:
+        result_regions.append((t_x1, t_x2, current_y, t_h))
+    valid_regions = [(x1, x2, y1, y2) for x1, x2, y1, y2 in result_regions if x2 > x1 and y2 > y1]
+    return sorted(valid_regions, key=lambda r: (r[2], r[0], -r[3], r[1]))
+
+def breaks_next_slot(unavailable, total):
+    """
+    The previous sim/find_next_slot.py get_next_slot
+    """
+    res = set()
+    for t_x1, t_x2, t_h in total:
+        y_breaks = {0, t_h}
+        y_breaks.update(uh for _, _, uh in unavailable if uh < t_h)
+        y_sorted = sorted(y_breaks)
+        for idx, y1 in enumerate(y_sorted[:-1]):
+            next_y, last_y = y_sorted[idx + 1], y_sorted[-1]
+            for y2 in (next_y, last_y):
+                if y2 <= y1:
+                    continue
+                x2_limit = t_x2
+                for u_x1, _, u_h in sorted(unavailable, key=lambda u: u[0]):
+                    if u_h > y1 and u_x1 < x2_limit:
+                        x2_limit = u_x1
+                        break
+                res.add((t_x1, x2_limit, y1, y2))
+    return sorted(res, key=lambda r: (r[2], r[0], -r[3], r[1]))
+
+def sense_reservations(n, time, bandwidth, rng):
+    reservations = []
+    for _ in range(n):
+        start = rng.uniform(0, time)
+        reservations.append((start, start + rng.uniform(1, time / 10), rng.randint(1, bandwidth // 100) * 100))
+    return reservations
+
+def timed(function, *args):
+    start = perf_counter()
+    result = function(*args)
+    return result, perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reservations", type=int, nargs="+", default=[100, 1000, 5000, 10000], help="numbers of SENSE reservations")
+    parser.add_argument("--time", type=float, default=1440, help="scheduling horizon (time units)")
+    parser.add_argument("--bandwidth", type=int, default=100000, help="link bandwidth (Mb/s)")
+    parser.add_argument("--reference-max", type=int, default=1000, help="largest number of reservations to run the previous sim version on")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    total = [(0, args.time, args.bandwidth)]
+    print(f"{'reservations':>12} {'staircase':>11} {'vectorized':>11} {'speedup':>8} {'sim':>11} {'vectorized':>11} {'speedup':>8}")
+    for n in args.reservations:
+        unavailable = sense_reservations(n, args.time, args.bandwidth, rng)
+        previous, previous_time = timed(staircase_next_slot, unavailable, total)
+        current, current_time = timed(get_next_slot, unavailable, total)
+        assert previous == current, f"staircase slots differ with {n} reservations"
+        sweep, sweep_time = timed(sweep_next_slot, unavailable, total)
+        if n <= args.reference_max:
+            breaks, breaks_time = timed(breaks_next_slot, unavailable, total)
+            assert breaks == sweep, f"sim slots differ with {n} reservations"
+            reference = f"{breaks_time * 1000:>9.1f}ms {sweep_time * 1000:>9.1f}ms {breaks_time / sweep_time:>7.0f}x"
+        else:
+            reference = f"{'-':>11} {sweep_time * 1000:>9.1f}ms {'-':>8}"
+        print(f"{n:>12} {previous_time * 1000:>9.1f}ms {current_time * 1000:>9.1f}ms {previous_time / current_time:>7.1f}x {reference}")
+
+if __name__ == "__main__":
+    main()
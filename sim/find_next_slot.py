@@ -1,8 +1,10 @@
 import numpy as np
 from typing import Iterable, Set, Tuple, List
-from itertools import combinations
+from itertools import repeat
 from math import inf
 
+from dmm.daemons.core.slots import BandwidthUsage, find_best_over_and_best_under as best_fit_groups
+
 Rect1D = Tuple[int, int, int]        # (start_time, end_time, bandwidth)
 Rect2D = Tuple[int, int, int, int]   # (x1, x2, y1, y2)
 Slots1D = Iterable[Rect1D]
@@ -18,41 +20,38 @@ total_slots = {(0, 30, 400)}
 request_r  = [(200, 4), (100, 2), (500, 1)]
 
 #Tracking Bandwidth Usage
-current_bandwidth_usage = {}  # {time_point: current_max_bandwidth_used}
+current_bandwidth_usage = BandwidthUsage()  # highest bandwidth used over time
 
 def get_current_max_bandwidth(x1, x2):
     """Get the current maximum bandwidth used in the time range [x1, x2]"""
-    max_used = 0
-    for t in range(x1, x2):
-        max_used = max(max_used, current_bandwidth_usage.get(t, 0))
-    return max_used
+    return current_bandwidth_usage.max_used(x1, x2)
 
 def update_bandwidth_usage(x1, x2, y1, y2):
     """Update the bandwidth usage for the time range [x1, x2]"""
-    for t in range(x1, x2):
-        current_bandwidth_usage[t] = max(current_bandwidth_usage.get(t, 0), y2)
+    current_bandwidth_usage.reserve(x1, x2, y2)
 
 def get_next_slot(unavailable: Slots1D, total: Slots1D) -> List[Rect2D]:
     """
     Compute available regions by subtracting unavailable from total,
     resulting in available bandwidth rectangle regions
     """
+    reservations = np.array(list(unavailable), dtype=float).reshape(-1, 3)
+    # reservations by height, each with the earliest start among the ones at least as high
+    order = np.argsort(reservations[:, 2], kind="stable")
+    heights = reservations[order, 2]
+    earliest = np.minimum.accumulate(reservations[order, 0][::-1])[::-1]
     res: Slots2D = set()
     for t_x1, t_x2, t_h in total:
-        y_breaks = {0, t_h}
-        y_breaks.update(uh for _, _, uh in unavailable if uh < t_h)
-        y_sorted = sorted(y_breaks)
-        for idx, y1 in enumerate(y_sorted[:-1]):
-            next_y, last_y = y_sorted[idx + 1], y_sorted[-1]
-            for y2 in (next_y, last_y):
-                if y2 <= y1:
-                    continue
-                x2_limit = t_x2
-                for u_x1, _, u_h in sorted(unavailable, key=lambda u: u[0]):
-                    if u_h > y1 and u_x1 < x2_limit:
-                        x2_limit = u_x1
-                        break
-                res.add((t_x1, x2_limit, y1, y2))
+        y_sorted = np.unique(np.concatenate(([0, t_h], heights[heights < t_h])))
+        y1 = y_sorted[:-1]
+        # a slot starting at y1 ends where the first reservation higher than y1 starts
+        higher = np.searchsorted(heights, y1, side="right")
+        x2_limit = np.full(len(y1), t_x2, dtype=float)
+        blocked = higher < len(heights)
+        x2_limit[blocked] = np.minimum(t_x2, earliest[higher[blocked]])
+        x2_limit, y1 = x2_limit.tolist(), y1.tolist()
+        res.update(zip(repeat(t_x1), x2_limit, y1, y_sorted[1:].tolist()))
+        res.update(zip(repeat(t_x1), x2_limit, y1, repeat(y_sorted[-1].item())))
     return sorted(res, key=lambda r: (r[2], r[0], -r[3], r[1]))
 
 def compute_slot_areas(slots: List[Rect2D]) -> List[int]:
@@ -109,24 +108,8 @@ def allocate_requests_in_slot(slot_rect, requests):
     return allocation, wasted
 
 
-def find_best_fit_groups(r_remaining, current_slot_area):
-    best_under, best_under_sum = (), 0
-    best_over, best_over_sum = (), inf
-    for n in range(1, len(r_remaining) + 1):
-        for combo in combinations(r_remaining, n):
-            s = sum(area for area, _ in combo)
-            # best fit within capacity
-            if s <= current_slot_area and s > best_under_sum:
-                best_under, best_under_sum = combo, s
-                if s == current_slot_area:
-                    break
-            # best fit over capacity
-            elif s > current_slot_area and s < best_over_sum:
-                best_over, best_over_sum = combo, s
-        # find the perfect fit
-        if best_under_sum == current_slot_area:
-            break
-    return best_under, best_under_sum, best_over, best_over_sum
+def find_best_fit_groups(r_remaining, current_slot_area, epsilon=None):
+    return best_fit_groups(r_remaining, current_slot_area, epsilon)
 
 def evaluate_blank2_area(best_over_sum, current_slot_area, current_slot_rect, next_slot_rect):
     x1, x2, y1, y2 = current_slot_rect
@@ -157,12 +140,7 @@ def find_r_slot_with_allocation(
 ) -> Tuple[List[str], List[Tuple[int, int, float, float, int]], List[Rect2D], float, float]:
     # Reset global bandwidth usage
     global current_bandwidth_usage
-    current_bandwidth_usage = {}
-
-    # Initialize bandwidth usage with unavailable slots
-    for x1, x2, h in unavailable_slots:
-        for t in range(x1, x2):
-            current_bandwidth_usage[t] = h
+    current_bandwidth_usage = BandwidthUsage(unavailable_slots)
 
     result = []
     r_remaining = r_list[:]
@@ -0,0 +1,187 @@
+"""
+Replay rule workloads against the scheduling strategies and compare them.
+
+A workload is one JSON object per line:
+
+    {"name": "...", "bandwidth": 400, "time": 30, "reservations": [[10, 13, 50], ...], "rules": [[200, 4], ...]}
+
+with the link bandwidth in Mb/s, the horizon in time units, the reservations as (start, end, bandwidth)
+and the rules as (size, priority), sizes being areas in Mb/s x time units.
+
+Every strategy turns a workload into spans (rule, start, end, bandwidth) which are scored on the same metrics:
+scheduled rules, makespan, wasted area (free bandwidth left unused before the makespan), overbooked area
+(bandwidth allocated past the link capacity), priority weighted completion time and wall clock time.
+
+The decider strategies run the production DeciderDaemon, importing it sets up the database engine,
+so DMM_CONFIG has to point to a config (a sqlite one is enough). Leave them out with --strategies otherwise.
+
+    DMM_CONFIG=dmm.cfg python sim/harness.py sim/workloads.jsonl --random 20
+"""
+import argparse
+import json
+import random
+from collections import namedtuple
+from time import perf_counter
+
+import networkx as nx
+
+import least_waste
+from prio_first import schedule_rules
+
+Workload = namedtuple("Workload", ["name", "bandwidth", "time", "reservations", "rules"])
+Span = namedtuple("Span", ["rid", "x1", "x2", "bandwidth"]) # rid is the 0-based index of the rule in the workload
+# what DeciderDaemon._plan_pair reads from a request
+PlannedRule = namedtuple("PlannedRule", ["rule_id", "rule_size", "priority"])
+
+def load_workloads(path):
+    workloads = []
+    with open(path) as f:
+        for n, line in enumerate(f):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            workloads.append(Workload(
+                name=data.get("name", f"{path}:{n + 1}"),
+                bandwidth=data["bandwidth"],
+                time=data["time"],
+                reservations=[tuple(r) for r in data.get("reservations", [])],
+                rules=[tuple(r) for r in data["rules"]],
+            ))
+    return workloads
+
+def random_workload(n, rng):
+    """
+    A SENSE sized link with a few existing reservations and a batch of rules
+    """
+    bandwidth, time = 100000, 1440
+    reservations = []
+    for _ in range(rng.randint(0, 5)):
+        start = rng.uniform(0, time)
+        reservations.append((start, min(time, start + rng.uniform(30, 600)), rng.randint(1, 40) * 1000))
+    rules = [(rng.uniform(1e5, 1.5e7), rng.randint(1, 5)) for _ in range(rng.randint(2, 30))]
+    return Workload(f"random-{n}", bandwidth, time, reservations, rules)
+
+def run_prio_first(workload):
+    results = schedule_rules(workload.rules, workload.bandwidth, workload.reservations)
+    return [Span(idx, start, start + duration, bandwidth) for idx, start, duration, bandwidth in results]
+
+def run_least_waste(workload):
+    allocations = least_waste.run_find_least_waste(workload.reservations, (workload.bandwidth, workload.time), workload.rules).allocations
+    return [Span(rid - 1, x1, x2, y2 - y1) for x1, x2, y1, y2, rid in allocations]
+
+def run_least_waste_v2(workload):
+    allocations, _, _ = least_waste.run_find_least_waste_v2(workload.reservations, (workload.bandwidth, workload.time), workload.rules)
+    return [Span(rid - 1, x1, x2, y2 - y1) for x1, x2, y1, y2, rid in allocations]
+
+_decider = None
+
+def decider(workload):
+    global _decider
+    if _decider is None:
+        from dmm.daemons.core.decider import DeciderDaemon
+        _decider = DeciderDaemon(frequency=0)
+    _decider.horizon = workload.time
+    return _decider
+
+def run_decider_lp(workload):
+    """
+    The LP shares the bandwidth free right now, every rule keeps its share until it is done
+    """
+    lp = decider(workload)
+    free = workload.bandwidth - sum(h for x1, x2, h in workload.reservations if x1 <= 0 < x2)
+    if free <= 0:
+        return []
+    multi_graph = nx.MultiGraph()
+    multi_graph.add_node("src", port_capacity=free)
+    multi_graph.add_node("dst", port_capacity=free)
+    for idx, (_, priority) in enumerate(workload.rules):
+        multi_graph.add_edge("src", "dst", rule_id=idx, priority=priority, bandwidth=0, available_bandwidth=free)
+    simple_graph, nodes, edges = lp._simplify_graph(multi_graph)
+    A, c, b, caps, edge_index = lp._prepare_optimization_matrices(simple_graph, nodes, edges)
+    x = lp._optimize_bandwidth(A, b, c, caps)
+    allocations = lp._allocate_bandwidth(multi_graph, simple_graph, edges, edge_index, x)
+    return [
+        Span(idx, 0, size / allocations[idx], allocations[idx])
+        for idx, (size, _) in enumerate(workload.rules) if allocations[idx] > 0
+    ]
+
+def run_decider_slots(workload):
+    slots = decider(workload)
+    # rule sizes are in bytes for the decider
+    reqs = [PlannedRule(idx, size * slots.time_unit * 1e6 / 8, priority) for idx, (size, priority) in enumerate(workload.rules)]
+    port_capacities = {"src": workload.bandwidth, "dst": workload.bandwidth}
+    planned = slots._plan_pair("src", "dst", reqs, port_capacities, {"src": list(workload.reservations)})
+    return [Span(req.rule_id, start, start + workload.rules[req.rule_id][0] / bandwidth, bandwidth) for req, start, bandwidth in planned]
+
+STRATEGIES = {
+    "prio_first": run_prio_first,
+    "least_waste": run_least_waste,
+    "least_waste_v2": run_least_waste_v2,
+    "decider_lp": run_decider_lp,
+    "decider_slots": run_decider_slots,
+}
+
+def evaluate(workload, spans):
+    completion = {}
+    for span in spans:
+        completion[span.rid] = max(completion.get(span.rid, 0), span.x2)
+    makespan = max(completion.values(), default=0)
+
+    breaks = sorted({0, makespan, *(x for x1, x2, _ in workload.reservations for x in (x1, x2) if 0 < x < makespan),
+                     *(x for span in spans for x in (span.x1, span.x2) if 0 < x < makespan)})
+    wasted = overbooked = 0
+    for t1, t2 in zip(breaks[:-1], breaks[1:]):
+        reserved = min(workload.bandwidth, sum(h for x1, x2, h in workload.reservations if x1 < t2 and x2 > t1))
+        used = sum(span.bandwidth for span in spans if span.x1 < t2 and span.x2 > t1)
+        wasted += max(0, workload.bandwidth - reserved - used) * (t2 - t1)
+        overbooked += max(0, reserved + used - workload.bandwidth) * (t2 - t1)
+
+    priorities = sum(workload.rules[rid][1] for rid in completion)
+    weighted_completion = sum(workload.rules[rid][1] * end for rid, end in completion.items()) / priorities if priorities else 0
+    return {
+        "scheduled": len(completion),
+        "makespan": makespan,
+        "wasted": wasted,
+        "overbooked": overbooked,
+        "weighted_completion": weighted_completion,
+    }
+
+def replay(workload, strategy):
+    start = perf_counter()
+    try:
+        spans = STRATEGIES[strategy](workload)
+    except Exception as e:
+        return {"workload": workload.name, "strategy": strategy, "error": f"{type(e).__name__}: {e}"}
+    elapsed = perf_counter() - start
+    return {"workload": workload.name, "strategy": strategy, "rules": len(workload.rules), **evaluate(workload, spans), "wall_ms": elapsed * 1000}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("workloads", nargs="*", help="JSONL workload files")
+    parser.add_argument("--random", type=int, default=0, help="number of random SENSE sized workloads to add")
+    parser.add_argument("--strategies", nargs="+", choices=list(STRATEGIES), default=list(STRATEGIES))
+    parser.add_argument("--json", action="store_true", help="print one JSON result per line instead of a table")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workloads = [workload for path in args.workloads for workload in load_workloads(path)]
+    rng = random.Random(args.seed)
+    workloads += [random_workload(n, rng) for n in range(args.random)]
+    if workloads and any(strategy.startswith("decider") for strategy in args.strategies):
+        decider(workloads[0]) # import and set up the decider outside of the timings
+
+    if not args.json:
+        print(f"{'workload':<24}{'strategy':<16}{'scheduled':>10}{'makespan':>12}{'wasted':>14}{'overbooked':>14}{'w. completion':>15}{'wall (ms)':>11}")
+    for workload in workloads:
+        for strategy in args.strategies:
+            result = replay(workload, strategy)
+            if args.json:
+                print(json.dumps(result))
+            elif "error" in result:
+                print(f"{workload.name:<24}{strategy:<16}  {result['error']}")
+            else:
+                print(f"{workload.name:<24}{strategy:<16}{result['scheduled']:>5}/{result['rules']:<4}{result['makespan']:>12.1f}"
+                      f"{result['wasted']:>14.1f}{result['overbooked']:>14.1f}{result['weighted_completion']:>15.1f}{result['wall_ms']:>11.1f}")
+
+if __name__ == "__main__":
+    main()
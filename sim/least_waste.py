@@ -1,9 +1,10 @@
 import numpy as np
 from typing import Iterable, Set, Tuple, List
-from itertools import combinations
+from collections import namedtuple
 from math import inf
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+
+from dmm.daemons.core.slots import Allocation, BandwidthUsage, get_next_slot as next_slots
+from dmm.daemons.core.slots import find_best_over_and_best_under as best_fit_groups
 
 # Type definitions
 Rect1D = Tuple[int, int, int]  # (start_time, end_time, bandwidth)
@@ -11,21 +12,22 @@ Rect2D = Tuple[int, int, int, int]  # (x1, x2, y1, y2)
 Slots1D = Iterable[Rect1D]
 Slots2D = Set[Rect2D]
 
+# What happened in a slot: the rules placed in it (none when no rule fit), whether they were all the remaining ones
+# and how many slots were merged to fit them. Text and plot reports are in least_waste_report.py
+SlotFit = namedtuple("SlotFit", ["slot_index", "rules", "all_remaining", "merged_slots"], defaults=(False, 0))
+LeastWasteResult = namedtuple("LeastWasteResult", ["fits", "allocations", "waste", "total_available_area", "total_r_area"])
+
 # Tracking Bandwidth Usage
-current_bandwidth_usage = {}  # {time_point: current_max_bandwidth_used}
+current_bandwidth_usage = BandwidthUsage()  # highest bandwidth used over time
 
 def get_current_max_bandwidth(x1, x2):
     """Get the current maximum bandwidth used in the time range [x1, x2]"""
-    max_used = 0
-    for t in range(x1, x2):
-        max_used = max(max_used, current_bandwidth_usage.get(t, 0))
-    return max_used
+    return current_bandwidth_usage.max_used(x1, x2)
 
 
 def update_bandwidth_usage(x1, x2, y1, y2):
     """Update the bandwidth usage for the time range [x1, x2]"""
-    for t in range(x1, x2):
-        current_bandwidth_usage[t] = max(current_bandwidth_usage.get(t, 0), y2)
+    current_bandwidth_usage.reserve(x1, x2, y2)
 
 
 def get_next_slot(unavailable: Slots1D, total: Slots1D) -> List[Rect2D]:
@@ -35,41 +37,7 @@ def get_next_slot(unavailable: Slots1D, total: Slots1D) -> List[Rect2D]:
     # Example: Slot 2 is included by Slot 1, Slot 4 in included by Slot 3 ...
     #
     """
-    if not total:
-        return []
-    total_region = next(iter(total))
-    t_x1, t_x2, t_h = total_region
-
-    available_regions = [(t_x1, t_x2, 0, t_h)]
-
-    unavailable_sorted = sorted(unavailable, key=lambda u: (u[0], u[2]))
-
-    result_regions = []
-    current_y = 0
-
-    for u_x1, u_x2, u_h in unavailable_sorted:
-        # If the current unavailable slot is lower than previous slot, skip
-        if u_h <= current_y:
-            continue
-
-        if u_x1 > t_x1:
-            result_regions.append((t_x1, u_x1, current_y, t_h))
-
-        if u_h > current_y:
-            result_regions.append((t_x1, u_x1, current_y, u_h))
-
-        current_y = u_h
-
-    if current_y < t_h:
-        result_regions.append((t_x1, t_x2, current_y, t_h))
-
-    valid_regions = [
-        (x1, x2, y1, y2) for x1, x2, y1, y2 in result_regions
-        if x2 > x1 and y2 > y1
-    ]
-
-    # Sort by (y1, x1, -y2, x2) as specified
-    return sorted(valid_regions, key=lambda r: (r[2], r[0], -r[3], r[1]))
+    return next_slots(unavailable, total)
 
 
 def compute_slot_areas(slots: List[Rect2D]) -> List[int]:
@@ -88,11 +56,6 @@ def r_sorted_by_area(rules: List[Tuple[int, int]], reverse: bool = False) -> Lis
     return sorted(r_with_index, key=lambda x: x[0], reverse=reverse)
 
 
-def ordinal(n: int) -> str:
-    """Return ordinal string, e.g., 1->1st, 2->2nd"""
-    return f"{n}{'st' if n == 1 else 'nd' if n == 2 else 'rd' if n == 3 else 'th'}"
-
-
 def can_fit_all_remaining_rule(r_remaining, current_slot_area):
     """
     Check if the outer slot can fit all remaining rules
@@ -186,7 +149,7 @@ def allocate_rule_in_slot_best_under(slot_rect, rule, rule_r):
         y_end = y_cursor + allocated_height
 
         allocation.append((x1, x_end, y_cursor, y_end, rid))
-        update_bandwidth_usage(int(x1), int(x_end), y_cursor, y_end)
+        update_bandwidth_usage(x1, x_end, y_cursor, y_end)
 
         y_cursor = y_end
 
@@ -201,7 +164,7 @@ def allocate_rule_in_slot_best_under(slot_rect, rule, rule_r):
     return allocation, wasted
 
 
-def find_best_over_and_best_under(r_remaining, current_slot_area):
+def find_best_over_and_best_under(r_remaining, current_slot_area, epsilon=None):
     """
     To find out the set of rule which is best fit of the current slot
     Two possible situation:
@@ -210,23 +173,7 @@ def find_best_over_and_best_under(r_remaining, current_slot_area):
 
     This helps to determine the less waste situation
     """
-    best_under, best_under_sum = (), 0
-    best_over, best_over_sum = (), inf
-    for n in range(1, len(r_remaining) + 1):
-        for combo in combinations(r_remaining, n):
-            s = sum(area for area, _ in combo)
-            # best fit within capacity
-            if s <= current_slot_area and s > best_under_sum:
-                best_under, best_under_sum = combo, s
-                if s == current_slot_area:
-                    break
-            # best fit over capacity
-            elif s > current_slot_area and s < best_over_sum:
-                best_over, best_over_sum = combo, s
-        # find the perfect fit
-        if best_under_sum == current_slot_area:
-            break
-    return best_under, best_under_sum, best_over, best_over_sum
+    return best_fit_groups(r_remaining, current_slot_area, epsilon)
 
 
 def evaluate_blank2_area(best_over_sum, current_slot_area, current_slot_rect, next_slot_rect):
@@ -367,10 +314,7 @@ def conflict_detected_outer_slot(slot_rect, rule, rule_r: List[Tuple[int, int]])
         y_end = y_cursor + height_updated
 
         allocation.append((x1, x_end, y_cursor, y_end, rid))
-        update_bandwidth_usage(int(x1), int(x_end), y_cursor, y_end)
-
-        print(f"Rule R{rid}: initial_h={initial_height:.2f}, additional_h={additional_height:.2f}, "
-              f"final_h={height_updated:.2f}, bandwidth=[{y_cursor:.2f}, {y_end:.2f}]")
+        update_bandwidth_usage(x1, x_end, y_cursor, y_end)
 
         y_cursor = y_end
 
@@ -426,7 +370,7 @@ def allocate_rule_fill_bandwidth(slot_rect, rule, rule_r: List[Tuple[int, int]],
         y_end = effective_y1 + height
 
         allocation.append((x1, x_end, effective_y1, y_end, rid))
-        update_bandwidth_usage(int(x1), int(x_end), effective_y1, y_end)
+        update_bandwidth_usage(x1, x_end, effective_y1, y_end)
 
         # If this happens, need to re-allocate the height (need to fill out bandwidth)
         if y_end < y2:
@@ -506,9 +450,8 @@ def allocate_rule_fill_bandwidth(slot_rect, rule, rule_r: List[Tuple[int, int]],
             y_end = y_cursor + height
 
             allocation.append((x1, x_end, y_cursor, y_end, req_data['rid']))
-            update_bandwidth_usage(int(x1), int(x_end), y_cursor, y_end)
+            update_bandwidth_usage(x1, x_end, y_cursor, y_end)
 
-            print(f"Allocated rule R{req_data['rid']}: bandwidth [{y_cursor:.2f}, {y_end:.2f}]")
             y_cursor = y_end
 
     else:
@@ -583,13 +526,13 @@ def best_fit_allocation(r_remaining: List[Tuple[int, int]],
                                slot_area_list: List[int],
                                rule_r: List[Tuple[int, int]],
                                i: int,
-                               slot_index: int) -> Tuple[bool, List[str], List, List, List[Tuple[int, int]]]:
+                               slot_index: int) -> Tuple[bool, List[SlotFit], List, List, List[Tuple[int, int]]]:
     """
     Find and allocate best fit group of rule for current slot
 
     Returns:
         allocated: Whether any rule were allocated
-        result: Description messages
+        result: What was fitted in the slot
         allocation: List of allocations
         wasted: List of wasted regions
         r_remaining: Updated remaining rule
@@ -623,7 +566,7 @@ def best_fit_allocation(r_remaining: List[Tuple[int, int]],
     if best_under and best_under_sum <= current_slot_area:
         # Set the best group of rules as best under
         best_fit_group = best_under
-        result.append(f"rule {list(best_fit_group)} fitted in the {ordinal(slot_index)} area")
+        result.append(SlotFit(slot_index, tuple(best_fit_group)))
         alloc, waste = allocate_rule_in_slot_best_under(
             current_slot_rect, best_fit_group, rule_r
         )
@@ -634,7 +577,7 @@ def best_fit_allocation(r_remaining: List[Tuple[int, int]],
     elif best_over and blank_2 < current_slot_area:
         best_fit_group = best_over
         use_overflow = True
-        result.append(f"rule {list(best_fit_group)} fitted in the {ordinal(slot_index)} area")
+        result.append(SlotFit(slot_index, tuple(best_fit_group)))
         # This situation won't consider any priority ratio, just apply the normal allocate rule
         alloc, waste = allocate_rule_in_slot(current_slot_rect, best_fit_group)
         allocation.extend(alloc)
@@ -642,7 +585,7 @@ def best_fit_allocation(r_remaining: List[Tuple[int, int]],
 
     else:
         # No fit found, skip this slot
-        result.append(f"No rule fit in the {ordinal(slot_index)} area")
+        result.append(SlotFit(slot_index, ()))
         return False, result, allocation, wasted, r_remaining
 
     # Remove allocated rule
@@ -663,13 +606,13 @@ def minimum_rule_check(r_remaining: List[Tuple[int, int]],
                               current_slot_rect: Rect2D,
                               slot_rects: List[Rect2D],
                               i: int,
-                              slot_index: int) -> Tuple[bool, List[str], List, List, List[Tuple[int, int]]]:
+                              slot_index: int) -> Tuple[bool, List[SlotFit], List, List, List[Tuple[int, int]]]:
     """
     Check if minimum rule size exceeds current slot capacity
 
     Returns:
         should_continue: Whether to continue to next iteration
-        result: Description messages
+        result: What was fitted in the slot
         allocation: List of allocations
         wasted: List of wasted regions
         r_remaining: Updated remaining rule
@@ -700,7 +643,7 @@ def minimum_rule_check(r_remaining: List[Tuple[int, int]],
 
     # If extension needed exceeds maximum allowed, skip this slot
     if min_rule_height_extend > max_height_extend:
-        result.append(f"No rule fit in the {ordinal(slot_index)} area")
+        result.append(SlotFit(slot_index, ()))
         return True, result, allocation, wasted, r_remaining
 
     # Place smallest rule in current slot
@@ -723,7 +666,7 @@ def last_slot(r_remaining: List[Tuple[int, int]],
               slot_rects: List[Rect2D],
               slot_area_list: List[int],
               allocation: List,
-              current_slot_index: int) -> Tuple[List[str], List, List]:
+              current_slot_index: int) -> Tuple[List[SlotFit], List, List]:
     """
     Handle allocation logic for the last slot
     """
@@ -760,7 +703,7 @@ def last_slot(r_remaining: List[Tuple[int, int]],
 
     # All remaining rule can fit
     if can_fit_all_remaining_rule(r_remaining, effective_slot_area):
-        result.append(f"All remaining rule {r_remaining} fitted in the {ordinal(slot_index)} area")
+        result.append(SlotFit(slot_index, tuple(r_remaining), True))
 
         # 如果需要合并，使用 progressive_inner_outer_merge
         if effective_slot_area > current_slot_area:
@@ -1008,11 +951,8 @@ def allocate_rule_in_merged_slot(
         actual_x_end = min(actual_x_end, max_time)
 
         allocation.append((x_start, actual_x_end, y_start, y_end, rid))
-        update_bandwidth_usage(int(x_start), int(actual_x_end), y_start, y_end)
+        update_bandwidth_usage(x_start, actual_x_end, y_start, y_end)
 
-        actual_area = (actual_x_end - x_start) * (y_end - y_start)
-        print(f"Allocated: time [{x_start:.1f}, {actual_x_end:.1f}], bandwidth [{y_start:.2f}, {y_end:.2f}]")
-        #print(f"    Actual area: {actual_area:.1f} (requested: {req_area})")
 
         # Move cursor up
         y_cursor = y_end
@@ -1186,7 +1126,7 @@ def find_borrowable_areas(
         total_time: int,
         total_bandwidth: float,
         unavailable_slots: Slots1D,
-        current_bandwidth_usage: dict
+        current_bandwidth_usage: BandwidthUsage
 ) -> List[Rect2D]:
     """
     For the outer slot, if the area shows that it can fit all the rules
@@ -1224,7 +1164,7 @@ def extend_merged_area_with_future(
         total_time: int,
         total_bandwidth: float,
         unavailable_slots: Slots1D,
-        current_bandwidth_usage: dict
+        current_bandwidth_usage: BandwidthUsage
 ) -> dict:
     """
     If needed:
@@ -1269,17 +1209,13 @@ def find_r_slot_with_allocation(
         rule_r: List[Tuple[int, int]],
         total_time: int = None,
         total_bandwidth: float = None
-) -> Tuple[List[str], List[Tuple[int, int, float, float, int]], List[Rect2D], float, float]:
+) -> LeastWasteResult:
     """
     Main allocation function
     """
     #Initialize bandwidth tracking
     global current_bandwidth_usage
-    current_bandwidth_usage = {}
-
-    for x1, x2, h in unavailable_slots:
-        for t in range(x1, x2):
-            current_bandwidth_usage[t] = h
+    current_bandwidth_usage = BandwidthUsage(unavailable_slots)
 
     r_remaining = r_list[:]
     # Calculate the total size of the rule needed
@@ -1316,7 +1252,7 @@ def find_r_slot_with_allocation(
             result.extend(res)
             allocation.extend(alloc)
             wasted.extend(waste)
-            return result, allocation, wasted, total_available_area, total_r_area
+            return least_waste_result(result, allocation, wasted, total_available_area, total_r_area)
 
         # Compare mode: check if all remaining fit in current slot
         if compare_mode:
@@ -1327,20 +1263,20 @@ def find_r_slot_with_allocation(
             )
             if success:
                 # inner slot is empty. successfully merged, and can be fitted
-                result.append(f"All remaining rules fitted using progressive merge (consumed {slots_consumed} slots)")
+                result.append(SlotFit(slot_index, tuple(r_remaining), True, slots_consumed))
                 allocation.extend(alloc)
                 r_remaining = []
-                return result, allocation, wasted, total_available_area, total_r_area
+                return least_waste_result(result, allocation, wasted, total_available_area, total_r_area)
             # inner slot is not empty
             if can_fit_all_remaining_rule(r_remaining, current_slot_area):
                 #print("previous inner slot is not empty, not merging")
-                result.append(f"All remaining rule {r_remaining} fitted in the {ordinal(slot_index)} area")
+                result.append(SlotFit(slot_index, tuple(r_remaining), True))
                 alloc, waste = allocate_rule_fill_bandwidth(
                     current_slot_rect, r_remaining, rule_r, unavailable_slots
                 )
                 allocation.extend(alloc)
                 wasted.extend(waste)
-                return result, allocation, wasted, total_available_area, total_r_area
+                return least_waste_result(result, allocation, wasted, total_available_area, total_r_area)
 
             # Move to next slot
             i += 1
@@ -1377,7 +1313,11 @@ def find_r_slot_with_allocation(
         slot_index += 1
         compare_mode = True
 
-    return result, allocation, wasted, total_available_area, total_r_area
+    return least_waste_result(result, allocation, wasted, total_available_area, total_r_area)
+
+
+def least_waste_result(fits, allocation, wasted, total_available_area, total_r_area) -> LeastWasteResult:
+    return LeastWasteResult(fits, [Allocation(*a) for a in allocation], wasted, total_available_area, total_r_area)
 
 
 def check_allocation_validity(allocations: List[Tuple[float, float, float, float, int]],
@@ -1417,31 +1357,19 @@ def check_allocation_validity(allocations: List[Tuple[float, float, float, float
 
     return is_valid
 
-def run_find_least_waste(unavailable_slots, main_slot, request_r):
+def run_find_least_waste(unavailable_slots, main_slot, request_r) -> LeastWasteResult:
+    """
+    Allocate the rules in one pass, least_waste_report.py prints or draws the result
+    """
     bandwidth, time = main_slot
     total_slots = [(0, time, bandwidth)]
     slot_rects = get_next_slot(unavailable_slots, total_slots)
     slot_areas = compute_slot_areas(slot_rects)
     request_areas = r_sorted_by_area(request_r)
 
-    for area, rid in request_areas:
-        size, priority = request_r[rid-1]
-
-    result_texts, allocations, waste_rects, total_available_area, total_r_area = find_r_slot_with_allocation(
+    return find_r_slot_with_allocation(
         request_areas, slot_areas, slot_rects, unavailable_slots, request_r, time, bandwidth
     )
-    for x1, x2, y1, y2, rid in allocations:
-        size, priority = request_r[rid-1]
-        print(f"  R{rid}: time [{x1:.1f}, {x2:.1f}], bandwidth [{y1:.2f}, {y2:.2f}]")
-        print(f"       size={size}, priority={priority}, actual_area={(x2-x1)*(y2-y1):.1f}")
-    print()
-
-    if total_available_area < total_r_area:
-        print(f"Need to extend space (shortage: {total_r_area - total_available_area})")
-    else:
-        print("All requests can be accommodated")
-
-    visualize_integrated_schedule(request_r, unavailable_slots, total_slots, allocations, waste_rects)
 
 
 def find_r_slot_with_allocation_with_checking(
@@ -1450,18 +1378,14 @@ def find_r_slot_with_allocation_with_checking(
         slot_rects: List[Rect2D],
         unavailable_slots: Slots1D,
         rule_r: List[Tuple[int, int]]
-) -> Tuple[List[str], List[Tuple[int, int, float, float, int]], List[Rect2D], float, float]:
+) -> LeastWasteResult:
     """
     If is_valid = false,
     go back to original allocation, with only best under
     """
     # Initialize bandwidth tracking
     global current_bandwidth_usage
-    current_bandwidth_usage = {}
-
-    for x1, x2, h in unavailable_slots:
-        for t in range(x1, x2):
-            current_bandwidth_usage[t] = h
+    current_bandwidth_usage = BandwidthUsage(unavailable_slots)
 
     r_remaining = r_list[:]
     total_r_area = sum(area for area, _ in r_remaining)
@@ -1493,18 +1417,18 @@ def find_r_slot_with_allocation_with_checking(
             result.extend(res)
             allocation.extend(alloc)
             wasted.extend(waste)
-            return result, allocation, wasted, total_available_area, total_r_area
+            return least_waste_result(result, allocation, wasted, total_available_area, total_r_area)
 
         # Compare mode: check if all remaining fit
         if compare_mode:
             if can_fit_all_remaining_rule(r_remaining, current_slot_area):
-                result.append(f"All remaining rule {r_remaining} fitted in the {ordinal(slot_index)} area")
+                result.append(SlotFit(slot_index, tuple(r_remaining), True))
                 alloc, waste = allocate_rule_fill_bandwidth(
                     current_slot_rect, r_remaining, rule_r, unavailable_slots
                 )
                 allocation.extend(alloc)
                 wasted.extend(waste)
-                return result, allocation, wasted, total_available_area, total_r_area
+                return least_waste_result(result, allocation, wasted, total_available_area, total_r_area)
 
             # Move to next slot
             i += 1
@@ -1517,7 +1441,7 @@ def find_r_slot_with_allocation_with_checking(
         )
 
         if best_under and best_under_sum <= current_slot_area:
-            result.append(f"Rules {list(best_under)} fitted in the {ordinal(slot_index)} area")
+            result.append(SlotFit(slot_index, tuple(best_under)))
             alloc, waste = allocate_rule_in_slot_best_under(
                 current_slot_rect, best_under, rule_r
             )
@@ -1527,13 +1451,13 @@ def find_r_slot_with_allocation_with_checking(
             for val in best_under:
                 r_remaining.remove(val)
         else:
-            result.append(f"No rule fit in the {ordinal(slot_index)} area")
+            result.append(SlotFit(slot_index, ()))
 
         i += 1
         slot_index += 1
         compare_mode = True
 
-    return result, allocation, wasted, total_available_area, total_r_area
+    return least_waste_result(result, allocation, wasted, total_available_area, total_r_area)
 
 
 def run_find_least_waste_v2(unavailable_slots, main_slot, request_r, max_iterations=10):
@@ -1543,6 +1467,10 @@ def run_find_least_waste_v2(unavailable_slots, main_slot, request_r, max_iterati
     bandwidth, time = main_slot
     total_slots = [(0, time, bandwidth)]
 
+    # the slots do not depend on the rules, they are the same for every iteration
+    slot_rects = get_next_slot(unavailable_slots, total_slots)
+    slot_areas = compute_slot_areas(slot_rects)
+
     remaining_indices = list(range(len(request_r)))
     dropped_indices = []
     iteration = 0
@@ -1554,14 +1482,7 @@ def run_find_least_waste_v2(unavailable_slots, main_slot, request_r, max_iterati
         if not remaining_indices:
             return [], list(range(len(request_r))), iteration
 
-        for idx in remaining_indices:
-            size, priority = request_r[idx]
-            print(f"  R{idx+1}: size={size}, priority={priority}")
-
         # allocated the rules
-        slot_rects = get_next_slot(unavailable_slots, total_slots)
-        slot_areas = compute_slot_areas(slot_rects)
-
         request_areas = []
         for orig_idx in remaining_indices:
             size, priority = request_r[orig_idx]
@@ -1575,21 +1496,9 @@ def run_find_least_waste_v2(unavailable_slots, main_slot, request_r, max_iterati
                 unavailable_slots, request_r
             )
 
-        print(f"\nAllocation results:")
-        for x1, x2, y1, y2, rid in allocations:
-            size, priority = request_r[rid-1]
-            print(f"  R{rid}: time=[{x1:.1f}, {x2:.1f}], bandwidth=[{y1:.2f}, {y2:.2f}]")
-            print(f"       size={size}, priority={priority}, actual_area={(x2-x1)*(y2-y1):.1f}")
-
         is_valid = check_allocation_validity(allocations, main_slot, request_r)
 
         if is_valid:
-            allocated_size = sum(request_r[rid-1][0] for _, _, _, _, rid in allocations)
-            total_requested = sum(size for size, _ in request_r)
-
-            visualize_integrated_schedule(request_r, unavailable_slots, total_slots,
-                                         allocations, waste_rects)
-
             return allocations, dropped_indices, iteration
 
         else:
@@ -1636,11 +1545,6 @@ def final_allocation(unavailable_slots, main_slot, request_r):
     is_valid = check_allocation_validity(allocations, main_slot, request_r)
 
     if is_valid:
-        for x1, x2, y1, y2, rid in allocations:
-            size, priority = request_r[rid - 1]
-
-        visualize_integrated_schedule(request_r, unavailable_slots, total_slots,
-                                      allocations, waste_rects)
         return allocations, [], 1
 
     allocations, dropped_indices, iterations = run_find_least_waste_v2(
@@ -1648,74 +1552,3 @@ def final_allocation(unavailable_slots, main_slot, request_r):
     )
 
     return allocations, dropped_indices, iterations
-
-
-def visualize_integrated_schedule(rule_r, unavailable_slots, total_slots, allocations, waste_rects):
-    """
-    visualize （mostly the same of the one in the warehouse.ipynb）
-    """
-    fig, ax = plt.subplots(figsize=(12, 8))
-    max_time = 0
-    if unavailable_slots:
-        max_time = max(max_time, max(end for _, end, _ in unavailable_slots))
-    if allocations:
-        max_time = max(max_time, max(x2 for x1, x2, _, _, _ in allocations))
-    max_time = max(max_time, 30)  # Minimum time range
-
-    total_bandwidth = next(iter(total_slots))[2] if total_slots else 100
-
-    for x1, x2, h in total_slots:
-        ax.add_patch(patches.Rectangle((x1, 0), x2 - x1, h,
-                                       fill=False, edgecolor='black', linewidth=2))
-
-    for x1, x2, h in unavailable_slots:
-        ax.add_patch(patches.Rectangle((x1, 0), x2 - x1, h,
-                                       color='red', alpha=0.6, label="Unavailable"))
-        ax.text((x1 + x2) / 2, h / 2, f'Reserved\n{h} BW',
-                ha='center', va='center', fontsize=8, color='white', weight='bold')
-
-    for x1, x2, y1, y2, rid in allocations:
-        ax.add_patch(patches.Rectangle((x1, y1), x2 - x1, y2 - y1,
-                                       color='blue', alpha=0.7))
-
-        size, priority = rule_r[rid - 1]
-        height = y2 - y1
-        width = x2 - x1
-
-        label = f'R{rid}\nSize: {size}\nPrio: {priority}\nBW: {height:.1f}'
-        ax.text(x1 + width / 2, y1 + height / 2, label,
-                ha='center', va='center', fontsize=8, color='white', weight='bold')
-
-    info_x = max_time + 2
-    info_y = total_bandwidth - 5
-    dy = total_bandwidth / 15
-
-    ax.text(info_x, info_y, "rule (size, priority, height):", fontsize=10, weight='bold')
-    info_y -= dy
-
-    rid_to_height = {}
-    for x1, x2, y1, y2, rid in allocations:
-        height = y2 - y1
-        rid_to_height[rid] = height
-
-    for i, (size, priority) in enumerate(rule_r, 1):
-        height = f"{rid_to_height.get(i, 0):.1f}" if i in rid_to_height else "0"
-        ax.text(info_x, info_y, f"R{i}: ({size}, {priority}, {height})", fontsize=9)
-        info_y -= dy
-
-    ax.set_xlim(0, max_time + 8)
-    ax.set_ylim(0, total_bandwidth + 10)
-    ax.set_xlabel('Time', fontsize=12)
-    ax.set_ylabel('Bandwidth', fontsize=12)
-    ax.grid(True, alpha=0.3)
-
-    handles = []
-    if unavailable_slots:
-        handles.append(patches.Patch(color='red', alpha=0.6, label='Unavailable/Reserved'))
-    if allocations:
-        handles.append(patches.Patch(color='blue', alpha=0.7, label='Allocated rule'))
-    if handles:
-        ax.legend(handles=handles, loc='upper right')
-
-    plt.tight_layout()
-    plt.show()
@@ -0,0 +1,112 @@
+"""
+Text and plot reports of the least_waste allocations, kept out of the allocation code so it runs at full speed.
+
+    result = run_find_least_waste(unavailable_slots, main_slot, request_r)
+    print_report(result, request_r)
+    visualize_integrated_schedule(request_r, unavailable_slots, [(0, time, bandwidth)], result.allocations, result.waste)
+"""
+import matplotlib.pyplot as plt
+import matplotlib.patches as patches
+
+from least_waste import LeastWasteResult, SlotFit
+
+
+def ordinal(n: int) -> str:
+    """Return ordinal string, e.g., 1->1st, 2->2nd"""
+    return f"{n}{'st' if n==1 else 'nd' if n==2 else 'rd' if n==3 else 'th'}"
+
+
+def format_fit(fit: SlotFit) -> str:
+    if fit.merged_slots:
+        return f"All remaining rules fitted using progressive merge (consumed {fit.merged_slots} slots)"
+    if fit.all_remaining:
+        return f"All remaining rule {list(fit.rules)} fitted in the {ordinal(fit.slot_index)} area"
+    if fit.rules:
+        return f"rule {list(fit.rules)} fitted in the {ordinal(fit.slot_index)} area"
+    return f"No rule fit in the {ordinal(fit.slot_index)} area"
+
+
+def print_report(result: LeastWasteResult, request_r):
+    for fit in result.fits:
+        print(format_fit(fit))
+    for x1, x2, y1, y2, rid in result.allocations:
+        size, priority = request_r[rid-1]
+        print(f"  R{rid}: time [{x1:.1f}, {x2:.1f}], bandwidth [{y1:.2f}, {y2:.2f}]")
+        print(f"       size={size}, priority={priority}, actual_area={(x2-x1)*(y2-y1):.1f}")
+    print()
+
+    if result.total_available_area < result.total_r_area:
+        print(f"Need to extend space (shortage: {result.total_r_area - result.total_available_area})")
+    else:
+        print("All requests can be accommodated")
+
+
+def visualize_integrated_schedule(rule_r, unavailable_slots, total_slots, allocations, waste_rects):
+    """
+    visualize （mostly the same of the one in the warehouse.ipynb）
+    """
+    fig, ax = plt.subplots(figsize=(12, 8))
+    max_time = 0
+    if unavailable_slots:
+        max_time = max(max_time, max(end for _, end, _ in unavailable_slots))
+    if allocations:
+        max_time = max(max_time, max(x2 for x1, x2, _, _, _ in allocations))
+    max_time = max(max_time, 30)  # Minimum time range
+
+    total_bandwidth = next(iter(total_slots))[2] if total_slots else 100
+
+    for x1, x2, h in total_slots:
+        ax.add_patch(patches.Rectangle((x1, 0), x2 - x1, h,
+                                       fill=False, edgecolor='black', linewidth=2))
+
+    for x1, x2, h in unavailable_slots:
+        ax.add_patch(patches.Rectangle((x1, 0), x2 - x1, h,
+                                       color='red', alpha=0.6, label="Unavailable"))
+        ax.text((x1 + x2) / 2, h / 2, f'Reserved\n{h} BW',
+                ha='center', va='center', fontsize=8, color='white', weight='bold')
+
+    for x1, x2, y1, y2, rid in allocations:
+        ax.add_patch(patches.Rectangle((x1, y1), x2 - x1, y2 - y1,
+                                       color='blue', alpha=0.7))
+
+        size, priority = rule_r[rid - 1]
+        height = y2 - y1
+        width = x2 - x1
+
+        label = f'R{rid}\nSize: {size}\nPrio: {priority}\nBW: {height:.1f}'
+        ax.text(x1 + width / 2, y1 + height / 2, label,
+                ha='center', va='center', fontsize=8, color='white', weight='bold')
+
+    info_x = max_time + 2
+    info_y = total_bandwidth - 5
+    dy = total_bandwidth / 15
+
+    ax.text(info_x, info_y, "rule (size, priority, height):", fontsize=10, weight='bold')
+    info_y -= dy
+
+    rid_to_height = {}
+    for x1, x2, y1, y2, rid in allocations:
+        height = y2 - y1
+        rid_to_height[rid] = height
+
+    for i, (size, priority) in enumerate(rule_r, 1):
+        height = f"{rid_to_height.get(i, 0):.1f}" if i in rid_to_height else "0"
+        ax.text(info_x, info_y, f"R{i}: ({size}, {priority}, {height})", fontsize=9)
+        info_y -= dy
+
+    ax.set_xlim(0, max_time + 8)
+    ax.set_ylim(0, total_bandwidth + 10)
+    ax.set_xlabel('Time', fontsize=12)
+    ax.set_ylabel('Bandwidth', fontsize=12)
+    ax.grid(True, alpha=0.3)
+
+    handles = []
+    if unavailable_slots:
+        handles.append(patches.Patch(color='red', alpha=0.6, label='Unavailable/Reserved'))
+    if allocations:
+        handles.append(patches.Patch(color='blue', alpha=0.7, label='Allocated rule'))
+    if handles:
+        ax.legend(handles=handles, loc='upper right')
+
+    plt.tight_layout()
+    plt.show()
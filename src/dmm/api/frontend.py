@@ -7,9 +7,10 @@ from fastapi.responses import JSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 
-from dmm.db.session import databased
+from dmm.db.session import databased, pool_stats
 from dmm.models.request import Request as DBRequest
 from dmm.models.site import Site
+from dmm.models.rule_state import RuleState
 
 from dmm.daemons.core.sites import RefreshSiteDBDaemon
 from rucio.client import Client
@@ -67,7 +68,8 @@ async def get_sites(request: Request, session=None):
 async def open_rule_details(request: Request, rule_id: str, session=None):
     try:
         req = DBRequest.from_id(rule_id, session=session)
-        return templates.TemplateResponse("details.html", {"request": request, "data": req})
+        rule_state = RuleState.from_id(rule_id, session=session)
+        return templates.TemplateResponse("details.html", {"request": request, "data": req, "rule_state": rule_state})
     except Exception as e:
         logging.error(e)
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -149,4 +151,4 @@ async def refresh_sites():
     
 @api.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy", "db_pool": pool_stats()}
\ No newline at end of file
@@ -44,7 +44,7 @@ def config_get(section, option, default=None, extract_function=ConfigParser.Conf
     logging.debug(f"Getting config option {option} from section {section}")
     try:
         return extract_function(get_config(), section, option)
-    except ConfigParser.NoOptionError:
+    except (ConfigParser.NoOptionError, ConfigParser.NoSectionError):
         if default is not None:
             return default
         else:
@@ -0,0 +1,60 @@
+import logging
+from multiprocessing import Event
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+__BUS = None
+
+class TransitionBus:
+    """
+    Wakes up the daemons owning a request status as soon as a request transitions into it,
+    instead of leaving them asleep until their next polling period.
+    Subscriptions must be made before the daemons are forked so every process shares the same events.
+    """
+    def __init__(self):
+        self.subscribers = {} # status -> events of the daemons waiting on it
+
+    def subscribe(self, statuses) -> Event:
+        """
+        Get an event which is set whenever a request moves into any of the given statuses
+        """
+        event = Event()
+        for status in statuses:
+            self.subscribers.setdefault(status, []).append(event)
+        return event
+
+    def publish(self, status) -> None:
+        for event in self.subscribers.get(status, []):
+            event.set()
+
+def set_bus(bus) -> None:
+    """
+    Set the transition bus used by this process (and inherited by the daemons forked from it).
+    """
+    global __BUS
+    __BUS = bus
+
+def publish_transition(status) -> None:
+    """
+    Notify the daemons waiting on the given status, a no-op if no bus is set (e.g. standalone frontend)
+    """
+    if __BUS is None:
+        return
+    logging.debug(f"Publishing transition to {status}")
+    __BUS.publish(status)
+
+def record_transition(status, session) -> None:
+    """
+    Remember a request status transition, the daemons waiting on it are woken up once the session commits
+    """
+    session.info.setdefault("transitions", set()).add(status)
+
+@event.listens_for(Session, "after_commit")
+def _publish_transitions(session):
+    for status in session.info.pop("transitions", set()):
+        publish_transition(status)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_transitions(session):
+    session.info.pop("transitions", None)
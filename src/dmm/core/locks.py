@@ -0,0 +1,38 @@
+import logging
+import zlib
+from contextlib import contextmanager
+from multiprocessing import Lock
+from time import monotonic
+
+class ResourceLocks:
+    """
+    Striped set of inter-process locks keyed by resource name (e.g. "request:STAGED" or "endpoints").
+    Keys are hashed onto a fixed number of stripes, this must be created before the daemons are forked
+    so every process shares the same underlying semaphores.
+    """
+    def __init__(self, stripes=64):
+        if stripes <= 0:
+            raise ValueError(f"Number of lock stripes must be positive, got {stripes}")
+        self.stripes = [Lock() for _ in range(stripes)]
+
+    def _indices(self, keys) -> list:
+        # always acquire stripes in ascending order so two holders can never deadlock
+        return sorted({zlib.crc32(key.encode()) % len(self.stripes) for key in keys})
+
+    @contextmanager
+    def hold(self, keys):
+        """
+        Hold the locks for all the given resource keys, an empty set of keys does not lock anything
+        """
+        acquired = []
+        start = monotonic()
+        try:
+            for index in self._indices(keys):
+                self.stripes[index].acquire()
+                acquired.append(index)
+            if acquired:
+                logging.debug(f"Acquired locks for {sorted(keys)} after {monotonic() - start:.3f}s")
+            yield
+        finally:
+            for index in reversed(acquired):
+                self.stripes[index].release()
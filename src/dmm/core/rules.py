@@ -0,0 +1,48 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from dmm.models.rule_state import RuleState
+
+def get_replication_rules(client, rule_ids, concurrency=1) -> dict:
+    """
+    Fetch replication rules from Rucio with up to concurrency calls in flight.
+    Returns a map of rule_id to the rule, or to the exception raised while fetching it.
+    Only the calls run in the worker threads, the results are applied by the caller in its own session.
+    """
+    rule_ids = list(dict.fromkeys(rule_ids))
+
+    def fetch(rule_id):
+        try:
+            return client.get_replication_rule(rule_id)
+        except Exception as e:
+            return e
+
+    if concurrency <= 1 or len(rule_ids) <= 1:
+        return {rule_id: fetch(rule_id) for rule_id in rule_ids}
+    logging.debug(f"Fetching {len(rule_ids)} rules from Rucio with {concurrency} workers")
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(rule_ids)), thread_name_prefix="rucio") as pool:
+        return dict(zip(rule_ids, pool.map(fetch, rule_ids)))
+
+def get_rule_states(client, rule_ids, ttl=0, concurrency=1, session=None) -> dict:
+    """
+    Rule state snapshot shared by the rucio daemons, one Rucio call per rule and per ttl seconds.
+    Rules whose RuleState row is missing or older than ttl are fetched again and their rows updated,
+    the others are served from the table, so whichever daemon runs first in a cycle pays for the calls.
+    Returns a map of rule_id to the RuleState, or to the exception raised while fetching it.
+    """
+    rule_ids = list(dict.fromkeys(rule_ids))
+    states = RuleState.from_ids(rule_ids, session=session)
+    now = datetime.now()
+    stale = [rule_id for rule_id in rule_ids if rule_id not in states or states[rule_id].fetched_at < now - timedelta(seconds=ttl)]
+    logging.debug(f"Rule state snapshot: {len(rule_ids) - len(stale)} fresh, {len(stale)} to fetch from Rucio")
+
+    result = {rule_id: states[rule_id] for rule_id in rule_ids if rule_id not in stale}
+    for rule_id, rule in get_replication_rules(client, stale, concurrency).items():
+        if isinstance(rule, Exception):
+            result[rule_id] = rule
+            continue
+        state = states.get(rule_id) or RuleState(rule_id=rule_id)
+        state.update_from_rule(rule, now, session=session)
+        result[rule_id] = state
+    return result
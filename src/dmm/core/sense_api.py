@@ -0,0 +1,142 @@
+import base64
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+
+import requests
+
+from sense.client.requestwrapper import RequestWrapper
+from sense.client.workflow_combined_api import WorkflowCombinedApi
+from sense.client.address_api import AddressApi
+from sense.client.discover_api import DiscoverApi
+from sense.common import getHTTPTimeout
+
+class PooledRequestWrapper(RequestWrapper):
+    """
+    SENSE-O request wrapper which sends its calls over one keep-alive HTTP session
+    and refreshes its access token shortly before it expires instead of after a 401.
+    Not thread safe (the headers live in the config), use get_request_wrapper to get one per thread.
+    """
+    refresh_margin = 60 # seconds before the expiry of the access token at which it is refreshed
+
+    def __init__(self, config=None, noauth=False):
+        self.pid = os.getpid()
+        self.session = requests.Session()
+        self.token_expires_at = None
+        self._expiring_token = None
+        super().__init__(config, noauth=noauth)
+
+    def _setHeaders(self, content="json", accept="json"):
+        super()._setHeaders(content, accept)
+        if self.token is not self._expiring_token:
+            self._expiring_token = self.token
+            self.token_expires_at = self._token_expiry(self.token)
+
+    @staticmethod
+    def _token_expiry(token):
+        """
+        Expiry time of an access token, from the token response or from the claims of a JWT, None if unknown
+        """
+        if token.get("expires_in"):
+            return time() + float(token["expires_in"])
+        try:
+            payload = token["access_token"].split(".")[1]
+            return float(json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))["exp"])
+        except Exception:
+            return None
+
+    def _send(self, method, api_path, params, data=None):
+        if not self.noauth and self.token_expires_at and time() > self.token_expires_at - self.refresh_margin:
+            logging.debug("SENSE-O access token about to expire, refreshing it")
+            self._refreshToken()
+        url = self.config["REST_API"] + api_path
+        kwargs = {"params": params, "data": data, "verify": self.config["verify"], "timeout": getHTTPTimeout()}
+        out = self.session.request(method, url, headers=self.config["headers"], **kwargs)
+        if out.status_code == 401 and not self.noauth:
+            self._refreshToken()
+            out = self.session.request(method, url, headers=self.config["headers"], **kwargs)
+        return out
+
+    def _get(self, api_path, params):
+        return self._send("GET", api_path, params)
+
+    def _put(self, api_path, data, params):
+        return self._send("PUT", api_path, params, data)
+
+    def _post(self, api_path, data, params):
+        return self._send("POST", api_path, params, data)
+
+    def _delete(self, api_path, params):
+        return self._send("DELETE", api_path, params)
+
+_local = threading.local()
+_first_wrappers = {} # pid -> first wrapper of the process, its tokens are reused by the wrappers of the other threads
+_pools = {} # pid -> (workers, thread pool), kept between passes so its threads keep their connections
+_lock = threading.Lock()
+
+def get_request_wrapper() -> PooledRequestWrapper:
+    """
+    The SENSE-O request wrapper of the calling thread, authenticated once per process and kept for its lifetime.
+    Daemons are forked, so a wrapper created before the fork is never reused by the child.
+    """
+    wrapper = getattr(_local, "wrapper", None)
+    if wrapper is not None and wrapper.pid == os.getpid():
+        return wrapper
+    with _lock:
+        first = _first_wrappers.get(os.getpid())
+        if first is None:
+            logging.debug(f"Creating SENSE-O client for process {os.getpid()}")
+            wrapper = _first_wrappers[os.getpid()] = PooledRequestWrapper()
+        else:
+            wrapper = PooledRequestWrapper(config=dict(first.config))
+    _local.wrapper = wrapper
+    return wrapper
+
+def get_workflow_api() -> WorkflowCombinedApi:
+    return WorkflowCombinedApi(req_wrapper=get_request_wrapper())
+
+def get_address_api() -> AddressApi:
+    return AddressApi(req_wrapper=get_request_wrapper())
+
+def get_discover_api() -> DiscoverApi:
+    return DiscoverApi(req_wrapper=get_request_wrapper())
+
+def get_instance_statuses(si_uuids, concurrency=1) -> dict:
+    """
+    Fetch the status of SENSE-O service instances with up to concurrency calls in flight, SENSE-O has no bulk status call.
+    Returns a map of instance uuid to its status, or to the exception raised while fetching it.
+    """
+    si_uuids = list(dict.fromkeys(si_uuids))
+
+    def fetch(si_uuid):
+        return get_workflow_api().instance_get_status(si_uuid=si_uuid) or "UNKNOWN"
+
+    return dict(zip(si_uuids, map_concurrently(fetch, si_uuids, concurrency)))
+
+def map_concurrently(fn, items, concurrency=1) -> list:
+    """
+    Call fn on every item with up to concurrency calls in flight on the SENSE-O thread pool of the process.
+    Returns the results in the order of the items, or the exception raised for an item. fn must not use the database session.
+    """
+    def call(item):
+        try:
+            return fn(item)
+        except Exception as e:
+            return e
+
+    if concurrency <= 1 or len(items) <= 1:
+        return [call(item) for item in items]
+    return list(_get_pool(concurrency).map(call, items))
+
+def _get_pool(concurrency) -> ThreadPoolExecutor:
+    with _lock:
+        workers, pool = _pools.get(os.getpid(), (None, None))
+        if workers != concurrency:
+            if pool is not None:
+                pool.shutdown(wait=False)
+            pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sense")
+            _pools[os.getpid()] = (concurrency, pool)
+        return pool
@@ -1,13 +1,21 @@
 import logging
+from contextlib import nullcontext
 from multiprocessing import Process
 from time import sleep
 import os
 
 class DaemonBase:
+    # resources (see dmm.core.locks) this daemon changes during a pass, daemons with disjoint resources run concurrently
+    resources = ()
+    # request statuses (see dmm.core.events) which wake this daemon up before its next period
+    wakes_on = ()
+
     def __init__(self, frequency, kwargs={}):
         self.frequency = frequency
         self.kwargs = kwargs
         self.pid = None
+        self.wakeup = None
+        self.locks = None
 
     def process(self):
         raise NotImplementedError("Subclasses must implement this method")
@@ -15,25 +23,55 @@ class DaemonBase:
     def run_once(self, **kwargs):
         raise NotImplementedError("Subclasses must implement this method")
 
-    def run_daemon(self, process, lock, **kwargs):
+    def run_daemon(self, process, locks, **kwargs):
         if self.frequency < 0:
             logging.info(f"{self.__class__.__name__} frequency is set to negative, not starting the daemon.")
             return
+        self.locks = locks
         while True:
-            with lock:
-                logging.debug(f"{self.__class__.__name__} acquired lock")
+            with locks.hold(self.resources):
                 try:
                     process(**kwargs)
                 except Exception as e:
                     logging.error(f"Error in {self.__class__.__name__}: {e}")
-            logging.debug(f"{self.__class__.__name__} released lock, sleeping for {self.frequency} seconds")
+            logging.debug(f"{self.__class__.__name__} released locks, sleeping for {self.frequency} seconds")
+            self.sleep()
+
+    def hold(self, resources):
+        """
+        Hold the locks of resources for part of a pass, for daemons which only need them for a short step
+        and leave them out of resources. Must not be called while holding resources, stripes are only ordered within one call.
+        """
+        if self.locks is None:
+            return nullcontext()
+        return self.locks.hold(resources)
+
+    def sleep(self):
+        """
+        Sleep until the next period, or until a request moves into one of the statuses this daemon handles
+        """
+        if self.wakeup is None:
             sleep(self.frequency)
+            return
+        if self.wakeup.wait(timeout=self.frequency):
+            logging.debug(f"{self.__class__.__name__} woken up by a transition to {self.wakes_on}")
+        self.wakeup.clear()
+
+    def subscribe(self, bus):
+        """
+        Subscribe to the transitions this daemon wakes on. Every daemon must subscribe before any of them is started,
+        a daemon forked earlier would keep a copy of the bus without the later subscriptions and never wake them up.
+        """
+        if self.wakes_on and self.wakeup is None:
+            self.wakeup = bus.subscribe(self.wakes_on)
 
-    def start(self, lock):
+    def start(self, locks, bus=None):
         logging.info(f"Starting {self.__class__.__name__}")
+        if bus is not None:
+            self.subscribe(bus)
         try:
             proc = Process(target=self.run_daemon,
-                        args=(self.process, lock),
+                        args=(self.process, locks),
                         kwargs=self.kwargs,
                         name=self.__class__.__name__)
             proc.start()
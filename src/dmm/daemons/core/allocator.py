@@ -6,11 +6,14 @@ from dmm.daemons.base import DaemonBase
 from dmm.models.request import Request
 from dmm.models.endpoint import Endpoint
 
-from dmm.db.session import databased
+from dmm.db.session import databased, savepoint
 
-from sense.client.address_api import AddressApi
+from dmm.core.sense_api import get_address_api
 
 class AllocatorDaemon(DaemonBase):
+    resources = ("request:INIT", "request:FINISHED", "endpoints")
+    wakes_on = ("INIT",)
+
     def __init__(self, frequency, **kwargs):
         super().__init__(frequency, **kwargs)
         
@@ -41,7 +44,7 @@ class AllocatorDaemon(DaemonBase):
                     "src_endpoint": req_fin.src_endpoint,
                     "dst_endpoint": req_fin.dst_endpoint,
                     "transfer_status": "ALLOCATED"
-                })
+                }, session=session)
                 req_fin.update_transfer_status(status="DELETED", session=session)
                 return True
         return False
@@ -62,36 +65,37 @@ class AllocatorDaemon(DaemonBase):
         dst_allocation = None
         
         try:
-            # Get allocations
-            src_allocation = self._get_allocation(new_request.src_site.name, new_request.rule_id)
-            dst_allocation = self._get_allocation(new_request.dst_site.name, new_request.rule_id)
+            with savepoint(session):
+                # Get allocations
+                src_allocation = self._get_allocation(new_request.src_site.name, new_request.rule_id)
+                dst_allocation = self._get_allocation(new_request.dst_site.name, new_request.rule_id)
             
-            # Format IP addresses consistently
-            free_src_ipv6 = ipaddress.IPv6Network(src_allocation).compressed
-            free_dst_ipv6 = ipaddress.IPv6Network(dst_allocation).compressed
+                # Format IP addresses consistently
+                free_src_ipv6 = ipaddress.IPv6Network(src_allocation).compressed
+                free_dst_ipv6 = ipaddress.IPv6Network(dst_allocation).compressed
             
-            # Find matching endpoints
-            src_endpoint = Endpoint.for_rule(site_name=new_request.src_site.name, ip_range=free_src_ipv6, session=session)
-            dst_endpoint = Endpoint.for_rule(site_name=new_request.dst_site.name, ip_range=free_dst_ipv6, session=session)
+                # Find matching endpoints
+                src_endpoint = Endpoint.for_rule(site_name=new_request.src_site.name, ip_range=free_src_ipv6, session=session)
+                dst_endpoint = Endpoint.for_rule(site_name=new_request.dst_site.name, ip_range=free_dst_ipv6, session=session)
             
-            # Validate endpoints
-            if not src_endpoint:
-                raise ValueError(f"Could not find source endpoint with IP range {free_src_ipv6}")
-            if not dst_endpoint:
-                raise ValueError(f"Could not find destination endpoint with IP range {free_dst_ipv6}")
+                # Validate endpoints
+                if not src_endpoint:
+                    raise ValueError(f"Could not find source endpoint with IP range {free_src_ipv6}")
+                if not dst_endpoint:
+                    raise ValueError(f"Could not find destination endpoint with IP range {free_dst_ipv6}")
                 
-            # Update request with allocated endpoints
-            new_request.update({
-                "src_endpoint": src_endpoint,
-                "dst_endpoint": dst_endpoint,
-                "transfer_status": "ALLOCATED"
-            })
+                # Update request with allocated endpoints
+                new_request.update({
+                    "src_endpoint": src_endpoint,
+                    "dst_endpoint": dst_endpoint,
+                    "transfer_status": "ALLOCATED"
+                }, session=session)
             
-            # Mark endpoints as in use
-            src_endpoint.mark_inuse(in_use=True, session=session)
-            dst_endpoint.mark_inuse(in_use=True, session=session)
+                # Mark endpoints as in use
+                src_endpoint.mark_inuse(in_use=True, session=session)
+                dst_endpoint.mark_inuse(in_use=True, session=session)
             
-            logging.info(f"Successfully allocated endpoints for request {new_request.rule_id}")
+                logging.info(f"Successfully allocated endpoints for request {new_request.rule_id}")
             
         except Exception as e:
             # Clean up any allocations we made
@@ -110,7 +114,7 @@ class AllocatorDaemon(DaemonBase):
         @param sitename: name of the site (used for the address pool)
         @param alloc_name: alias for the allocation used in SENSE-O, this is just the rule_id
         """
-        addressApi = AddressApi()
+        addressApi = get_address_api()
         pool_name = f"RUCIO_Site_BGP_Subnet_Pool-{sitename}"
         alloc_type = "IPv6"
         try:
@@ -130,7 +134,7 @@ class AllocatorDaemon(DaemonBase):
         """
         try:
             logging.debug(f"Freeing IPv6 allocation {alloc_name}")
-            addressApi = AddressApi()
+            addressApi = get_address_api()
             pool_name = f'RUCIO_Site_BGP_Subnet_Pool-{sitename}'
             addressApi.free_address(pool_name, name=alloc_name)
             logging.debug(f"Allocation {alloc_name} freed for {sitename}")
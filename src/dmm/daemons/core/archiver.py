@@ -0,0 +1,40 @@
+import logging
+from datetime import datetime, timedelta
+
+from dmm.daemons.base import DaemonBase
+
+from dmm.models.request import Request
+from dmm.models.archive import RequestArchive
+from dmm.models.rule_state import RuleState
+from dmm.db.session import databased
+
+from dmm.core.config import config_get_int
+
+class ArchiverDaemon(DaemonBase):
+    """
+    Daemon to move requests in a terminal state out of the request table, so the daemons and the frontend
+    only go through the requests that are still in flight.
+    """
+    resources = ("request:DELETED", "request:CANCELED", "request:FAILED", "request:NOT_SENSE")
+
+    def __init__(self, frequency, **kwargs):
+        super().__init__(frequency, **kwargs)
+        self.max_age = config_get_int("archive", "max_age", default=7, constraint="pos") # days
+        self.batch_size = config_get_int("archive", "batch_size", default=1000, constraint="pos")
+
+    def process(self, **kwargs):
+        self.run_once(**kwargs)
+
+    @databased
+    def run_once(self, session=None):
+        before = datetime.now() - timedelta(days=self.max_age)
+        pruned = RuleState.prune(before, session=session)
+        if pruned:
+            logging.info(f"Pruned {pruned} rule states fetched before {before}")
+        reqs = Request.archivable(before, limit=self.batch_size, session=session)
+        if not reqs:
+            return
+        for req in reqs:
+            RequestArchive.from_request(req).save(session=session)
+            req.delete(session=session)
+        logging.info(f"Archived {len(reqs)} requests last updated before {before}")
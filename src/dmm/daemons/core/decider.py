@@ -1,55 +1,117 @@
 import logging
 import numpy as np
 from scipy.optimize import linprog
+from scipy import sparse
 import networkx as nx
 from math import floor
+from datetime import datetime, timedelta
+from configparser import ConfigParser
 
 from dmm.daemons.base import DaemonBase
+from dmm.daemons.core.slots import SlotScheduler, earliest_start, free_bandwidth
 
 from dmm.models.request import Request
 from dmm.models.mesh import Mesh
-from dmm.db.session import databased
+from dmm.db.session import databased, count_queries
+
+from dmm.core.config import config_get, config_get_int
 
 class DeciderDaemon(DaemonBase):
+    resources = ("request:ALLOCATED", "request:STAGED", "request:MODIFIED", "request:PROVISIONED")
+    wakes_on = ("STAGED", "MODIFIED", "FINISHED")
+
     def __init__(self, frequency, **kwargs):
         super().__init__(frequency, **kwargs)
+        self.strategy = config_get("decider", "strategy", default="lp")
+        if self.strategy not in ("lp", "slots"):
+            raise ValueError(f"Unknown decider strategy: {self.strategy}")
+        self.time_unit = config_get_int("decider", "time_unit", default=60, constraint="pos") # seconds
+        self.horizon = config_get_int("decider", "horizon", default=1440, constraint="pos") # time units
+        # rule groups are packed approximately past a few rules, within this fraction of the slot area
+        self.packing_epsilon = config_get("decider", "packing_epsilon", default=0.01, extract_function=ConfigParser.getfloat)
+        # inputs and results of the last solve, reused while the inputs stay the same
+        self.last_fingerprint = None
+        self.last_allocations = None
+        self.last_solution = (None, None)
         
     def process(self, **kwargs):
         self.run_once(**kwargs)
     
     @databased
     def run_once(self, session=None):
+        with count_queries(session) as counter:
+            if self.strategy == "slots":
+                self._schedule(session)
+            else:
+                self._decide(session)
+        logging.debug(f"Decider pass ran {counter['queries']} queries")
+
+    def _decide(self, session) -> None:
         multi_graph = self._build_multi_graph(session)
         
         if not multi_graph.nodes:
             return
 
-        simple_graph, nodes, edges = self._simplify_graph(multi_graph)
-        A, c, b, edge_index = self._prepare_optimization_matrices(simple_graph, nodes, edges)
-        optim_result = self._optimize_bandwidth(A, b, c, edges)
+        fingerprint = self._fingerprint(multi_graph)
+        if fingerprint == self.last_fingerprint:
+            # still write the allocations back below, in case the previous pass failed to commit them
+            logging.debug("Decider inputs unchanged since the last pass, reusing the previous allocations")
+            allocations = self.last_allocations
+        else:
+            simple_graph, nodes, edges = self._simplify_graph(multi_graph)
+            optim_result = self._solve(simple_graph, nodes, edges)
+            edge_index = {edge[:2]: i for i, edge in enumerate(edges)}
+            allocations = self._allocate_bandwidth(multi_graph, simple_graph, edges, edge_index, optim_result)
+            self.last_fingerprint, self.last_allocations = fingerprint, allocations
 
-        self._allocate_bandwidth(multi_graph, simple_graph, edges, edge_index, optim_result)
-
-        self._allocate_new_bandwidth(multi_graph, session)
-        self._modify_existing_bandwidth(multi_graph, session)
+        self._allocate_new_bandwidth(allocations, session)
+        self._modify_existing_bandwidth(allocations, session)
 
     def _build_multi_graph(self, session) -> nx.MultiGraph:
         """
         Build a network graph from the requests in the database.
-        The max available bandwidth is gotten from the Mesh table.
+        The max available bandwidth is gotten from the Mesh table, loaded once for all sites.
         """
         multi_graph = nx.MultiGraph()
         reqs = Request.from_status(status=["MODIFIED", "DECIDED", "STALE", "STAGED", "PROVISIONED", "FINISHED"], session=session) # get all requests which would affect the decision (i.e. don't consider requests that are in CANCELLED or FAILED state)
         if reqs == []:
             return multi_graph
+        port_capacities = Mesh.port_capacities(session=session)
         for req in reqs:
-            src_port_capacity = Mesh.max_bandwidth(req.src_site, session=session)
-            multi_graph.add_node(req.src_site.name, port_capacity=src_port_capacity)
-            dst_port_capacity = Mesh.max_bandwidth(req.dst_site, session=session)
-            multi_graph.add_node(req.dst_site.name, port_capacity=dst_port_capacity)
-            multi_graph.add_edge(req.src_site.name, req.dst_site.name, rule_id=req.rule_id, priority=req.priority, bandwidth=req.bandwidth, available_bandwidth=req.available_bandwidth)
+            # use the site names directly, loading the Site relationships costs two queries per request
+            multi_graph.add_node(req.src_site_, port_capacity=port_capacities.get(req.src_site_))
+            multi_graph.add_node(req.dst_site_, port_capacity=port_capacities.get(req.dst_site_))
+            multi_graph.add_edge(req.src_site_, req.dst_site_, rule_id=req.rule_id, priority=req.priority, bandwidth=req.bandwidth, available_bandwidth=req.available_bandwidth)
         return multi_graph
 
+    @staticmethod
+    def _fingerprint(graph) -> tuple:
+        """
+        Everything the decision depends on: the port capacities and the rules (or merged site pairs) with their
+        priorities and available bandwidths, independent of the order the requests were loaded in.
+        """
+        nodes = tuple(sorted((node, data['port_capacity']) for node, data in graph.nodes(data=True)))
+        edges = tuple(sorted(
+            (data.get('rule_id', ''), *sorted((u, v)), data['priority'], data.get('available_bandwidth'))
+            for u, v, data in graph.edges(data=True)
+        ))
+        return nodes, edges
+
+    def _solve(self, simple_graph, nodes, edges) -> np.ndarray:
+        """
+        Solve the LP for the simplified graph, or reuse the previous solution if only rules within the same
+        site pairs changed while their summed priorities and available bandwidths stayed the same.
+        """
+        fingerprint = self._fingerprint(simple_graph)
+        last_fingerprint, last_solution = self.last_solution
+        if fingerprint == last_fingerprint:
+            logging.debug("Site pairs unchanged since the last solve, reusing the previous solution")
+            return np.array([last_solution[frozenset((u, v))] for u, v, _ in edges])
+        A, c, b, caps, _ = self._prepare_optimization_matrices(simple_graph, nodes, edges)
+        x = self._optimize_bandwidth(A, b, c, caps)
+        self.last_solution = (fingerprint, {frozenset((u, v)): x[i] for i, (u, v, _) in enumerate(edges)})
+        return x
+
     def _simplify_graph(self, multi_graph) -> tuple:
         """
         Simplify the network graph by merging edges with the same source and destination nodes.
@@ -71,6 +133,8 @@ class DeciderDaemon(DaemonBase):
     def _prepare_optimization_matrices(self, simple_graph, nodes, edges) -> tuple:
         """
         Prepare the matrices for the linear programming optimization.
+        A is the sparse node-edge incidence matrix bounded by the port capacities in b,
+        the available bandwidth of each edge is returned separately as its upper bound.
         """
         n_edges = len(edges)
         edge_index = {edge[:2]: i for i, edge in enumerate(edges)}
@@ -80,39 +144,44 @@ class DeciderDaemon(DaemonBase):
             priority = data['priority']
             c[i] = -priority
         
-        A = nx.incidence_matrix(simple_graph, nodelist=nodes, edgelist=edges).toarray()
+        A = nx.incidence_matrix(simple_graph, nodelist=nodes, edgelist=edges).tocsr()
         b = np.array([simple_graph.nodes[node]['port_capacity'] for node in nodes])
 
-        available_bandwidths = np.array([data['available_bandwidth'] for _, _, data in edges])
-
-        A = np.vstack([A, np.eye(n_edges)])
-        b = np.concatenate([b, available_bandwidths])
+        caps = [data['available_bandwidth'] for _, _, data in edges]
 
-        return A, c, b, edge_index
+        return A, c, b, caps, edge_index
 
-    def _optimize_bandwidth(self, A, b, c, edges) -> object:
+    def _optimize_bandwidth(self, A, b, c, caps) -> object:
         """
         Optimize the bandwidth allocation using linear programming.
+        First find the largest bandwidth every edge can get at the same time (max-min), then maximize the
+        priority weighted bandwidth with that minimum, rounded down to a multiple of 5, as the lower bound.
+        If that second problem fails the max-min allocation is used as is.
         """
-        optim_result = None
-        lower_bound = 0
-        while True:
-            # keep trying until the optimization fails (i.e. the lower bound is too high)
-            # we can show that the ideal case is when the lower bound is the maximum possible value
-            bounds = [(lower_bound, None) for _ in range(len(edges))]
-            curr_optim_result = linprog(c, A_ub=A, b_ub=b, bounds=bounds, method='highs')
-            if not curr_optim_result.success:
-                break
-            else:
-                optim_result = curr_optim_result
-                lower_bound += 5
-        if optim_result is None:
+        n_edges = len(caps)
+        # max t subject to A x <= b and t - x_i <= 0 for every edge, over the variables (x, t)
+        t_c = np.zeros(n_edges + 1)
+        t_c[-1] = -1
+        t_A = sparse.vstack([
+            sparse.hstack([A, sparse.csr_matrix((A.shape[0], 1))]),
+            sparse.hstack([-sparse.eye(n_edges), np.ones((n_edges, 1))]),
+        ], format="csr")
+        t_b = np.concatenate([b, np.zeros(n_edges)])
+        t_bounds = [(0, cap) for cap in caps] + [(0, None)]
+        max_min_result = linprog(t_c, A_ub=t_A, b_ub=t_b, bounds=t_bounds, method='highs')
+        if not max_min_result.success:
             raise ValueError("No feasible solution found for the optimization problem.")
+
+        # the solver can land just below a multiple of 5, never round above the max-min itself
+        lower_bound = floor((max_min_result.x[-1] + 1e-9) / 5) * 5
+        bounds = [(lower_bound, cap) for cap in caps]
+        optim_result = linprog(c, A_ub=A, b_ub=b, bounds=bounds, method='highs')
         if not optim_result.success:
-            raise ValueError("Optimization failed.")
+            logging.warning(f"Priority optimization failed ({optim_result.message}), falling back to the max-min allocation")
+            return max_min_result.x[:-1]
         return optim_result.x
 
-    def _allocate_bandwidth(self, multi_graph, simple_graph, edges, edge_index, bandwidths) -> None:
+    def _allocate_bandwidth(self, multi_graph, simple_graph, edges, edge_index, bandwidths) -> dict:
         """
         Set the bandwidths in the graph based on the optimization result.
         @param multi_graph: the network multi_graph
@@ -120,7 +189,9 @@ class DeciderDaemon(DaemonBase):
         @param edges: the edges of the graph
         @param edge_index: the edge index mapping
         @param x: the optimization result
+        @return: map of rule_id to allocated bandwidth
         """
+        allocations = {}
         for u, v, key, data in multi_graph.edges(keys=True, data=True):
             total_priority = simple_graph[u][v]['priority']
             if total_priority > 0:
@@ -129,34 +200,192 @@ class DeciderDaemon(DaemonBase):
                 multi_graph[u][v][key]['bandwidth'] = floor(bandwidth // 1000) * 1000 # round to lowest 1000 because SENSE doesn't like it otherwise, probably should be a configurable value
             else:
                 multi_graph[u][v][key]['bandwidth'] = 0
+            allocations[data['rule_id']] = int(multi_graph[u][v][key]['bandwidth'])
+        return allocations
 
-    def _allocate_new_bandwidth(self, multi_graph, session) -> None:
+    def _allocate_new_bandwidth(self, allocations, session) -> None:
         """
         Allocate bandwidth for new requests and mark them as decided
         """
         reqs_allocated = Request.from_status(status=["STAGED"], session=session)
         for req in reqs_allocated:
-            for _, _, key, data in multi_graph.edges(keys=True, data=True):
-                if "rule_id" in data and data["rule_id"] == req.rule_id:
-                    allocated_bandwidth = int(data["bandwidth"])
-            req.update_bandwidth(allocated_bandwidth, session=session)
+            if req.rule_id not in allocations:
+                logging.warning(f"Request {req.rule_id} was not part of the decision, will try again")
+                continue
+            allocated_bandwidth = allocations[req.rule_id]
+            # staged in the session together with the other requests, written in one flush at the end of the pass
+            req.update({"bandwidth": allocated_bandwidth, "transfer_status": "DECIDED"}, session=session)
             logging.info(f"Allocated bandwidth for request {req.rule_id}: {allocated_bandwidth}")
-            req.update_transfer_status(status="DECIDED", session=session)
 
-    def _modify_existing_bandwidth(self, multi_graph, session) -> None:
+    def _modify_existing_bandwidth(self, allocations, session) -> None:
         """
         Modify the bandwidth for existing requests and mark them as stale
         """
         reqs_provisioned = Request.from_status(status=["MODIFIED", "PROVISIONED"], session=session)
         for req in reqs_provisioned:
-            for _, _, key, data in multi_graph.edges(keys=True, data=True):
-                if "rule_id" in data and data["rule_id"] == req.rule_id:
-                    allocated_bandwidth = int(data["bandwidth"])
+            if req.rule_id not in allocations:
+                logging.warning(f"Request {req.rule_id} was not part of the decision, will try again")
+                continue
+            if req.sense_operation:
+                # the circuit is still being set up with the current bandwidth, modify it once that is done
+                logging.debug(f"Request {req.rule_id} has a pending SENSE {req.sense_operation}, not modifying it yet")
+                continue
+            allocated_bandwidth = allocations[req.rule_id]
             if allocated_bandwidth != req.bandwidth:
-                req.update_previous_bandwidth(req.bandwidth, session=session)
-                req.update_bandwidth(allocated_bandwidth, session=session)
+                req.update({"previous_bandwidth": req.bandwidth, "bandwidth": allocated_bandwidth, "transfer_status": "STALE"}, session=session)
                 logging.info(f"Modified bandwidth for request {req.rule_id}: {allocated_bandwidth}")
-                req.update_transfer_status(status="STALE", session=session)
+            elif req.transfer_status == "MODIFIED" and req.sense_provisioned_at is not None:
+                # provisioned while its priority changed, and the circuit already has the right bandwidth
+                req.update_transfer_status(status="PROVISIONED", session=session)
+
+    def _schedule(self, session) -> None:
+        """
+        Plan the staged requests ahead with the slot scheduler, each gets a bandwidth and a start time
+        within the horizon around the bandwidth already held by the other requests on its ports.
+        Requests whose priority changed (MODIFIED) are planned again unless they already hold their bandwidth.
+        """
+        now = datetime.now()
+        reqs = Request.from_status(status=["STAGED", "DECIDED", "STALE", "PROVISIONED", "MODIFIED", "FINISHED"], session=session)
+        reqs_staged = [req for req in reqs if req.transfer_status == "STAGED"]
+        for req in reqs:
+            if req.transfer_status == "MODIFIED" and self._replan_modified(req, session):
+                reqs_staged.append(req)
+        if not reqs_staged:
+            return
+        port_capacities = Mesh.port_capacities(session=session)
+
+        planned = {req.rule_id for req in reqs_staged}
+        reservations = {} # site name -> [(start, end, bandwidth)] in time units from now
+        for req in reqs:
+            if req.rule_id not in planned and req.bandwidth:
+                reservation = self._reservation(req, now)
+                reservations.setdefault(req.src_site_, []).append(reservation)
+                reservations.setdefault(req.dst_site_, []).append(reservation)
+
+        pairs = {}
+        for req in reqs_staged:
+            pairs.setdefault(tuple(sorted((req.src_site_, req.dst_site_))), []).append(req)
+        # site pairs with the most priority at stake get the first pick of the shared ports
+        for (site_1, site_2), pair_reqs in sorted(pairs.items(), key=lambda item: -sum(req.priority or 0 for req in item[1])):
+            self._schedule_pair(site_1, site_2, pair_reqs, port_capacities, reservations, now, session)
+
+    def _replan_modified(self, req, session) -> bool:
+        """
+        Settle a request whose priority changed, returns whether it has to be planned again like a staged one.
+        A running circuit keeps its bandwidth until it is done and a pending provisioning keeps its plan,
+        a request the stager never got to goes back to it.
+        """
+        if req.sense_provisioned_at is not None:
+            logging.info(f"Request {req.rule_id} already holds its bandwidth, keeping it with priority {req.priority}")
+            req.update_transfer_status(status="PROVISIONED", session=session)
+        elif req.sense_operation:
+            logging.info(f"Request {req.rule_id} has a pending SENSE {req.sense_operation}, keeping its plan")
+            req.update_transfer_status(status="DECIDED", session=session)
+        elif req.sense_uuid is None:
+            logging.info(f"Request {req.rule_id} was not staged yet, sending it back to the stager")
+            req.update_transfer_status(status="ALLOCATED", session=session)
+        else:
+            return True
+        return False
+
+    def _schedule_pair(self, site_1, site_2, reqs, port_capacities, reservations, now, session) -> None:
+        for req, start, bandwidth in self._plan_pair(site_1, site_2, reqs, port_capacities, reservations):
+            scheduled_start = now + timedelta(seconds=start * self.time_unit)
+            req.update({"bandwidth": bandwidth, "scheduled_start": scheduled_start, "transfer_status": "DECIDED"}, session=session)
+            logging.info(f"Scheduled request {req.rule_id} at {scheduled_start} with bandwidth {bandwidth}")
+
+    def _plan_pair(self, site_1, site_2, reqs, port_capacities, reservations) -> list:
+        """
+        Pack the requests of a site pair, returns (request, start, bandwidth) with the start in time units from now
+        and adds the planned transfers to the reservations of both sites. Only rule_id, rule_size and priority are read.
+        """
+        if port_capacities.get(site_1) is None or port_capacities.get(site_2) is None:
+            logging.warning(f"No port capacity for {site_1} or {site_2}, cannot schedule their requests")
+            return []
+        capacity = min(port_capacities[site_1], port_capacities[site_2])
+
+        reqs_sized = []
+        for req in reqs:
+            if req.rule_size:
+                reqs_sized.append(req)
+            else:
+                logging.debug(f"Request {req.rule_id} has no size yet, will schedule it once it does")
+        if not reqs_sized:
+            return []
+
+        unavailable = self._unavailable(site_1, site_2, capacity, port_capacities, reservations)
+        rules = [(self._area(req.rule_size), req.priority or 0) for req in reqs_sized]
+        allocations, dropped = SlotScheduler(capacity, self.horizon, unavailable, epsilon=self.packing_epsilon).schedule(rules)
+
+        planned = []
+        deferred = [reqs_sized[idx] for idx in dropped]
+        for x1, x2, y1, y2, rid in allocations:
+            req = reqs_sized[rid - 1]
+            bandwidth = floor((y2 - y1) // 1000) * 1000 # SENSE only takes multiples of 1000
+            unavailable = self._unavailable(site_1, site_2, capacity, port_capacities, reservations)
+            # rounding down makes the transfer longer, it may run into a later reservation
+            if bandwidth <= 0 or free_bandwidth(unavailable, capacity, x1, x1 + self._area(req.rule_size) / bandwidth) < bandwidth:
+                deferred.append(req)
+                continue
+            planned.append(self._plan_request(req, x1, bandwidth, site_1, site_2, reservations))
+
+        # requests which did not fit in the packing start as soon as their ports have room for them
+        for req in deferred:
+            unavailable = self._unavailable(site_1, site_2, capacity, port_capacities, reservations)
+            start = earliest_start(unavailable, capacity, self._area(req.rule_size), self.horizon, granularity=1000)
+            if start is None:
+                logging.info(f"Request {req.rule_id} does not fit within the next {self.horizon} time units, will try again")
+                continue
+            planned.append(self._plan_request(req, *start, site_1, site_2, reservations))
+        return planned
+
+    def _plan_request(self, req, start, bandwidth, site_1, site_2, reservations) -> tuple:
+        reservation = (start, start + self._area(req.rule_size) / bandwidth, bandwidth)
+        reservations.setdefault(site_1, []).append(reservation)
+        reservations.setdefault(site_2, []).append(reservation)
+        return req, start, bandwidth
+
+    def _area(self, rule_size) -> float:
+        """
+        Size of a rule in Mb/s x time units, rule sizes are in bytes
+        """
+        return rule_size * 8 / 1e6 / self.time_unit
+
+    def _reservation(self, req, now) -> tuple:
+        """
+        (start, end, bandwidth) held by a request which already has a bandwidth, in time units from now
+        """
+        begin = (req.scheduled_start or req.sense_provisioned_at or now) - now
+        start = max(begin.total_seconds() / self.time_unit, 0)
+        if req.transfer_status == "FINISHED" or not req.rule_size:
+            return start, self.horizon, req.bandwidth
+        end = begin.total_seconds() / self.time_unit + self._area(req.rule_size) / req.bandwidth
+        if end <= start:
+            # running past its estimate, assume it keeps its bandwidth
+            end = self.horizon
+        return start, end, req.bandwidth
+
+    def _unavailable(self, site_1, site_2, capacity, port_capacities, reservations) -> list:
+        """
+        Bandwidth profile of a site pair as seen by the slot scheduler: non-overlapping (start, end, bandwidth)
+        segments, the bandwidth being what the busier of the two ports leaves unavailable on a link of the given capacity
+        """
+        held = reservations.get(site_1, []) + reservations.get(site_2, [])
+        breaks = sorted({0, self.horizon, *(x for x1, x2, _ in held for x in (x1, x2) if 0 < x < self.horizon)})
+        profile = []
+        for t1, t2 in zip(breaks[:-1], breaks[1:]):
+            height = max(
+                capacity - port_capacities[site] + sum(h for x1, x2, h in reservations.get(site, []) if x1 < t2 and x2 > t1)
+                for site in (site_1, site_2)
+            )
+            height = min(height, capacity)
+            if height <= 0:
+                continue
+            if profile and profile[-1][1] == t1 and profile[-1][2] == height:
+                profile[-1] = (profile[-1][0], t2, height)
+            else:
+                profile.append((t1, t2, height))
+        return profile
 
     @staticmethod
     def _good_response(response):
@@ -6,11 +6,13 @@ from dmm.daemons.base import DaemonBase
 from datetime import datetime
 
 from dmm.models.request import Request
-from dmm.db.session import databased
+from dmm.db.session import databased, savepoint
 
 from dmm.core.config import config_get
 
 class MonitDaemon(DaemonBase):
+    resources = () # only writes the prometheus/health columns which no other daemon touches
+
     def __init__(self, frequency, **kwargs):
         super().__init__(frequency, **kwargs)
         self.prometheus_user = config_get("prometheus", "user")
@@ -29,18 +31,22 @@ class MonitDaemon(DaemonBase):
             if req.sense_provisioned_at is None:
                 continue
 
-            bytes_now = self.get_all_bytes_at_t(current_timestamp, req.src_endpoint.ip_range)
+            try:
+                with savepoint(session):
+                    bytes_now = self.get_all_bytes_at_t(current_timestamp, req.src_endpoint.ip_range)
 
-            if req.prometheus_bytes is None:
-                req.update_prometheus_bytes(bytes_now, session=session)
-                continue
+                    if req.prometheus_bytes is None:
+                        req.update_prometheus_bytes(bytes_now, session=session)
+                        continue
 
-            throughput = self.calculate_throughput(bytes_now, req.prometheus_bytes)
-            req.update_prometheus_throughput(throughput, session=session)
-            req.update_prometheus_bytes(bytes_now, session=session)
+                    throughput = self.calculate_throughput(bytes_now, req.prometheus_bytes)
+                    req.update_prometheus_throughput(throughput, session=session)
+                    req.update_prometheus_bytes(bytes_now, session=session)
 
-            health_status = self.determine_health_status(throughput, req.bandwidth)
-            req.update_health(health_status, session=session)
+                    health_status = self.determine_health_status(throughput, req.bandwidth)
+                    req.update_health(health_status, session=session)
+            except Exception as e:
+                logging.error(f"Failed to monitor {req.rule_id}, {e}, will try again")
 
     def calculate_throughput(self, bytes_now, prometheus_bytes):
         return round((bytes_now - prometheus_bytes) / self.frequency / 1024 / 1024 / 1024 * 8, 2)
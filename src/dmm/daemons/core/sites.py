@@ -11,10 +11,11 @@ from dmm.db.session import databased
 
 from dmm.core.config import config_get
 
-from sense.client.discover_api import DiscoverApi
-from sense.client.workflow_combined_api import WorkflowCombinedApi
+from dmm.core.sense_api import get_discover_api, get_workflow_api
 
 class RefreshSiteDBDaemon(DaemonBase):
+    resources = ("sites", "endpoints")
+
     def __init__(self, frequency, **kwargs):
         super().__init__(frequency, **kwargs)
     
@@ -102,7 +103,7 @@ class RefreshSiteDBDaemon(DaemonBase):
         Get the full uri and root uri for a given site
         """
         try:
-            discover_api = DiscoverApi()
+            discover_api = get_discover_api()
             response = discover_api.discover_lookup_name_get(site, search="metadata", type="/sitename")
             if not self._good_response(response) or not response["results"]:
                 raise ValueError(f"Discover query failed for {site}")
@@ -124,7 +125,7 @@ class RefreshSiteDBDaemon(DaemonBase):
         Get the site info for a given root uri namely used for getting the peer points and port capacity
         """
         try:
-            discover_api = DiscoverApi()
+            discover_api = get_discover_api()
             site_info = discover_api.discover_domain_id_get(root_uri)
             if not self._good_response(site_info):
                 raise ValueError(f"Site Info Query Failed for {root_uri}")
@@ -139,7 +140,7 @@ class RefreshSiteDBDaemon(DaemonBase):
         """
         try:
             logging.info(f"Getting list of endpoints for {site_.sense_uri}")
-            workflow_api = WorkflowCombinedApi()
+            workflow_api = get_workflow_api()
             manifest_json = {
                 "Metadata": "?metadata?",
                 "sparql-ext": f"SELECT ?metadata WHERE {{ ?site nml:hasService ?md_svc. ?md_svc mrs:hasNetworkAttribute ?dir_xrootd. ?dir_xrootd mrs:type 'metadata:directory'. ?dir_xrootd mrs:tag '/xrootd'. ?dir_xrootd mrs:value ?metadata.  FILTER regex(str(?site), '{site_.sense_uri}') }} LIMIT 1",
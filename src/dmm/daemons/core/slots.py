@@ -0,0 +1,644 @@
+"""
+Time-slotted bandwidth scheduler, the production version of the least waste packing prototyped in sim/least_waste.py.
+
+Rules are rectangles in the time x bandwidth plane: their area is the data to transfer, the scheduler picks a height
+(bandwidth) and a width (duration) for each of them so they fill the free regions left between existing reservations.
+Everything is kept on the scheduler instance, so several of them can run side by side.
+"""
+from collections import namedtuple
+from math import inf, floor
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+Rect1D = Tuple[float, float, float]  # (start_time, end_time, bandwidth)
+Rect2D = Tuple[float, float, float, float]  # (x1, x2, y1, y2)
+Rule = Tuple[float, int]  # (area, rid), rid is the 1-based index of the rule in the scheduler's input
+
+Allocation = namedtuple("Allocation", ["x1", "x2", "y1", "y2", "rid"])
+
+def get_next_slot(unavailable: Iterable[Rect1D], total: Iterable[Rect1D]) -> List[Rect2D]:
+    """
+    Compute the available regions by subtracting unavailable from total, every reservation that is higher than
+    the previous ones splits the plane into an outer slot (up to the total bandwidth) and an inner slot (up to the reservation)
+    """
+    if not total:
+        return []
+    t_x1, t_x2, t_h = next(iter(total))
+
+    reservations = np.array(list(unavailable), dtype=float).reshape(-1, 3)
+    order = np.lexsort((reservations[:, 2], reservations[:, 0]))
+    u_x1, u_h = reservations[order, 0], reservations[order, 2]
+    # in order of start time, the reservations higher than all the earlier ones are the steps of the staircase
+    below = np.maximum.accumulate(np.concatenate(([0.0], u_h)))
+    top = below[-1]
+    steps = (u_h > below[:-1]) & (u_x1 > t_x1)
+    u_x1, u_h, below = u_x1[steps], u_h[steps], below[:-1][steps]
+
+    outer = below < t_h
+    x2 = np.concatenate((u_x1[outer], u_x1, [t_x2] if top < t_h else []))
+    y1 = np.concatenate((below[outer], below, [top] if top < t_h else []))
+    y2 = np.concatenate((np.full(np.count_nonzero(outer), t_h, dtype=float), u_h, [t_h] if top < t_h else []))
+    valid = x2 > t_x1
+    x2, y1, y2 = x2[valid], y1[valid], y2[valid]
+    order = np.lexsort((x2, -y2, y1))
+    return [(t_x1, x, y_1, y_2) for x, y_1, y_2 in zip(x2[order].tolist(), y1[order].tolist(), y2[order].tolist())]
+
+def compute_slot_areas(slots: List[Rect2D]) -> List[float]:
+    return [(x2 - x1) * (y2 - y1) for x1, x2, y1, y2 in slots]
+
+# up to this many rules the exact search is fast whatever their areas
+EXACT_MAX_RULES = 12
+
+def find_best_over_and_best_under(r_remaining: List[Rule], current_slot_area: float, epsilon: Optional[float] = None) -> tuple:
+    """
+    Find the group of rules whose total area is the closest to the slot area from below (best under)
+    and from above (best over), returns (best_under, best_under_sum, best_over, best_over_sum).
+
+    Exact subset sum over the reachable totals by default, among groups with the same total the one with the
+    fewest rules, then the earliest ones, is picked. With epsilon and more than EXACT_MAX_RULES rules the areas
+    are rounded to a grid instead, both totals are then within epsilon * current_slot_area of the exact ones.
+    """
+    if epsilon and len(r_remaining) > EXACT_MAX_RULES:
+        return _grid_best_over_and_best_under(r_remaining, current_slot_area, epsilon)
+
+    key = lambda group: (len(group), group)
+    groups = {0: ()} # reachable total up to the slot area -> indices of the best group with that total
+    best_over, best_over_sum = None, inf
+    for i, (area, _) in enumerate(r_remaining):
+        for total, group in list(groups.items()):
+            new_total, new_group = total + area, group + (i,)
+            if new_total <= current_slot_area:
+                if new_total not in groups or key(new_group) < key(groups[new_total]):
+                    groups[new_total] = new_group
+            # adding rules only makes a group larger, groups over the slot area are not extended
+            elif new_total < best_over_sum or (new_total == best_over_sum and key(new_group) < key(best_over)):
+                best_over, best_over_sum = new_group, new_total
+
+    best_under, best_under_sum = (), 0
+    for total, group in groups.items():
+        if total > best_under_sum or (total == best_under_sum and group and key(group) < key(best_under)):
+            best_under, best_under_sum = group, total
+    best_under = tuple(r_remaining[j] for j in best_under)
+    best_over = tuple(r_remaining[j] for j in best_over) if best_over is not None else ()
+    return best_under, best_under_sum, best_over, best_over_sum
+
+def _grid_best_over_and_best_under(r_remaining: List[Rule], current_slot_area: float, epsilon: float) -> tuple:
+    """
+    Subset sum over grid totals, the areas rounded down to multiples of unit = epsilon * current_slot_area / n.
+    For every grid total the smallest and largest exact total reaching it are kept, a group and its grid total
+    differ by less than n units so both answers are within epsilon * current_slot_area of the exact ones.
+    """
+    n = len(r_remaining)
+    unit = epsilon * current_slot_area / n
+
+    # a rule larger than the slot is a best over candidate on its own, the others go through the grid
+    best_over, best_over_sum = (), inf
+    fitting = []
+    for rule in r_remaining:
+        if rule[0] > current_slot_area:
+            if rule[0] < best_over_sum:
+                best_over, best_over_sum = (rule,), rule[0]
+        else:
+            fitting.append(rule)
+    if not fitting:
+        return (), 0, best_over, best_over_sum
+
+    areas = np.array([area for area, _ in fitting], dtype=float)
+    weights = np.floor(areas / unit).astype(np.int64)
+    # the smallest total over the slot area is at most the slot area plus the largest rule in it
+    size = int((current_slot_area + areas.max()) // unit) + 1
+    lowest = np.full(size, inf)
+    highest = np.full(size, -inf)
+    lowest[0] = highest[0] = 0
+    took_lowest, took_highest = [], [] # per rule, the grid totals it improved (packed bits), to rebuild the groups
+    for w, area in zip(weights, areas):
+        candidate = np.full(size, inf)
+        candidate[w:] = lowest[:size - w] + area
+        took = candidate < lowest
+        lowest = np.where(took, candidate, lowest)
+        took_lowest.append(np.packbits(took))
+
+        candidate = np.full(size, -inf)
+        candidate[w:] = highest[:size - w] + area
+        took = candidate > highest
+        highest = np.where(took, candidate, highest)
+        took_highest.append(np.packbits(took))
+
+    def group_at(total, took_bits):
+        indices = []
+        for i in range(len(fitting) - 1, -1, -1):
+            if (took_bits[i][total >> 3] >> (7 - (total & 7))) & 1:
+                indices.append(i)
+                total -= weights[i]
+        group = tuple(fitting[j] for j in sorted(indices))
+        return group, sum(area for area, _ in group)
+
+    best_under, best_under_sum = (), 0
+    for totals, took_bits in ((lowest, took_lowest), (highest, took_highest)):
+        under = np.where(totals <= current_slot_area, totals, -inf)
+        total = int(np.argmax(under))
+        if under[total] > best_under_sum:
+            best_under, best_under_sum = group_at(total, took_bits)
+        over = np.where(totals > current_slot_area, totals, inf)
+        total = int(np.argmin(over))
+        if over[total] < best_over_sum:
+            best_over, best_over_sum = group_at(total, took_bits)
+    return best_under, best_under_sum, best_over, best_over_sum
+
+def has_bandwidth_conflict(x1, x2, y1, y2, unavailable: Iterable[Rect1D]) -> bool:
+    """
+    Check if the rectangle overlaps any of the reservations
+    """
+    for ux1, ux2, uh in unavailable:
+        if not (x2 <= ux1 or x1 >= ux2) and not (y1 >= uh or y2 <= 0):
+            return True
+    return False
+
+def check_slot_is_empty(slot_index, slot_rects: List[Rect2D], allocation: List[Allocation]) -> bool:
+    if slot_index >= len(slot_rects):
+        return False
+    slot_x1, slot_x2, slot_y1, slot_y2 = slot_rects[slot_index]
+    for x1, x2, y1, y2, _ in allocation:
+        if not (x2 <= slot_x1 or x1 >= slot_x2 or y2 <= slot_y1 or y1 >= slot_y2):
+            return False
+    return True
+
+def _priority_ratio(priority, priorities) -> float:
+    # rules with the same priority all get the same share
+    if len(set(priorities)) == 1:
+        return 1.0
+    return float(priority)
+
+class BandwidthUsage:
+    """
+    Highest bandwidth in use over continuous time, kept in a segment tree built as reservations come in.
+    Nodes are split at their middle down to the resolution, then exactly at the reservation boundaries,
+    so both operations visit O(log((end - start) / resolution)) nodes. Times past the end grow the tree.
+    """
+    def __init__(self, unavailable: Iterable[Rect1D] = (), start: float = 0, end: float = 1, resolution: float = 1e-6):
+        self.start = start
+        self.end = max(end, start + resolution)
+        self.resolution = resolution
+        # per node: highest use anywhere in it, use reserved over all of it, split point and children (-1 if none)
+        self.highest, self.reserved, self.split, self.left, self.right = [0], [0], [None], [-1], [-1]
+        self.root = 0
+        for x1, x2, h in unavailable:
+            self.reserve(x1, x2, h)
+
+    def max_used(self, x1, x2) -> float:
+        x1, x2 = max(x1, self.start), min(x2, self.end)
+        if x2 <= x1:
+            return 0
+        return self._max_used(self.root, self.start, self.end, x1, x2)
+
+    def reserve(self, x1, x2, y2) -> None:
+        x1 = max(x1, self.start)
+        if x2 <= x1:
+            return
+        while x2 > self.end:
+            self._grow()
+        self._reserve(self.root, self.start, self.end, x1, x2, y2)
+
+    def _max_used(self, node, lo, hi, x1, x2) -> float:
+        if node == -1:
+            return 0
+        if x1 <= lo and hi <= x2:
+            return self.highest[node]
+        used = self.reserved[node]
+        split = self.split[node]
+        if split is None:
+            return used
+        if x1 < split:
+            used = max(used, self._max_used(self.left[node], lo, split, x1, min(x2, split)))
+        if x2 > split:
+            used = max(used, self._max_used(self.right[node], split, hi, max(x1, split), x2))
+        return used
+
+    def _reserve(self, node, lo, hi, x1, x2, y2) -> None:
+        self.highest[node] = max(self.highest[node], y2)
+        if x1 <= lo and hi <= x2:
+            self.reserved[node] = max(self.reserved[node], y2)
+            return
+        split = self.split[node]
+        if split is None:
+            split = (lo + hi) / 2 if hi - lo > self.resolution else (x1 if x1 > lo else x2)
+            self.split[node] = split
+        if x1 < split:
+            self.left[node] = self._child(self.left[node])
+            self._reserve(self.left[node], lo, split, x1, min(x2, split), y2)
+        if x2 > split:
+            self.right[node] = self._child(self.right[node])
+            self._reserve(self.right[node], split, hi, max(x1, split), x2, y2)
+
+    def _child(self, node) -> int:
+        if node != -1:
+            return node
+        self.highest.append(0)
+        self.reserved.append(0)
+        self.split.append(None)
+        self.left.append(-1)
+        self.right.append(-1)
+        return len(self.highest) - 1
+
+    def _grow(self) -> None:
+        # the new root covers twice the time, the old one becomes its left half
+        root = self._child(-1)
+        self.highest[root] = self.highest[self.root]
+        self.split[root] = self.end
+        self.left[root] = self.root
+        self.root = root
+        self.end = self.start + 2 * (self.end - self.start)
+
+class SlotScheduler:
+    """
+    Pack rules into the free regions of a link with the given bandwidth over [0, time), around the unavailable reservations.
+    """
+    def __init__(self, bandwidth: float, time: float, unavailable: Iterable[Rect1D] = (), epsilon: Optional[float] = None):
+        self.bandwidth = bandwidth
+        self.time = time
+        self.unavailable = list(unavailable)
+        self.epsilon = epsilon
+        self.rules = []
+        self.usage = BandwidthUsage(self.unavailable, end=self.time)
+
+    def schedule(self, rules: List[Tuple[float, float]], max_iterations: Optional[int] = None) -> Tuple[List[Allocation], List[int]]:
+        """
+        Schedule the rules given as (area, priority), dropping the smallest rule until the allocation is valid.
+        Returns the allocations (rid is the 1-based index into rules) and the 0-based indices of the rules left without one,
+        either dropped or left out because they did not fit in the last slot.
+        """
+        self.rules = list(rules)
+        remaining_indices = list(range(len(self.rules)))
+        dropped_indices = []
+        # the free regions only depend on the reservations, dropping rules does not change them
+        slot_rects = get_next_slot(self.unavailable, [(0, self.time, self.bandwidth)])
+        slot_areas = compute_slot_areas(slot_rects)
+        iteration = 0
+        while remaining_indices and (max_iterations is None or iteration < max_iterations):
+            iteration += 1
+            request_areas = sorted(((self.rules[idx][0], idx + 1) for idx in remaining_indices), key=lambda x: x[0])
+
+            allocations = self.allocate(request_areas, slot_areas, slot_rects)
+            if self.is_valid(allocations):
+                allocated = {rid for _, _, _, _, rid in allocations}
+                return allocations, dropped_indices + [idx for idx in remaining_indices if idx + 1 not in allocated]
+
+            min_idx = min(remaining_indices, key=lambda idx: self.rules[idx][0])
+            remaining_indices.remove(min_idx)
+            dropped_indices.append(min_idx)
+        return [], dropped_indices + remaining_indices
+
+    def is_valid(self, allocations: List[Allocation]) -> bool:
+        """
+        Check that every allocation stays within the link, keeps the area of its rule and does not overlap a reservation
+        """
+        tol = 1e-9 * max(self.time, self.bandwidth, 1) # rounding errors of the stacking
+        for x1, x2, y1, y2, rid in allocations:
+            size, _ = self.rules[rid - 1]
+            if x2 > self.time + tol or y2 > self.bandwidth + tol:
+                return False
+            if abs((x2 - x1) * (y2 - y1) - size) > 0.1:
+                return False
+            if has_bandwidth_conflict(x1 + tol, x2 - tol, y1 + tol, y2 - tol, self.unavailable):
+                return False
+        return True
+
+    def allocate(self, r_list: List[Rule], slot_area_list: List[float], slot_rects: List[Rect2D]) -> List[Allocation]:
+        """
+        Go through the slots alternating between the outer slots, where everything left is placed at once if it fits,
+        and the inner slots, which get the best fitting group of rules below their area
+        """
+        self.usage = BandwidthUsage(self.unavailable, end=self.time)
+        slot_rects = list(slot_rects)
+        slot_area_list = list(slot_area_list)
+        r_remaining = r_list[:]
+
+        # the area rules can be placed in: the inner slots and the last slot
+        inner_sum = sum(slot_area_list[i] for i in range(1, len(slot_area_list) - 1, 2)) if len(slot_area_list) > 1 else 0
+        total_available_area = inner_sum + (slot_area_list[-1] if slot_area_list else 0)
+
+        allocation = []
+        i = 0
+        compare_mode = True
+        while r_remaining and i < len(slot_area_list):
+            current_slot_area = slot_area_list[i]
+            current_slot_rect = slot_rects[i]
+
+            if i == len(slot_area_list) - 1:
+                allocation.extend(self._last_slot(r_remaining, current_slot_area, current_slot_rect,
+                                                  total_available_area, slot_rects, slot_area_list, allocation, i))
+                return allocation
+
+            if compare_mode:
+                if sum(area for area, _ in r_remaining) <= current_slot_area:
+                    allocation.extend(self._allocate_fill_bandwidth(current_slot_rect, r_remaining))
+                    return allocation
+                i += 1
+                compare_mode = False
+                continue
+
+            best_under, best_under_sum, _, _ = find_best_over_and_best_under(r_remaining, current_slot_area, self.epsilon)
+            if best_under and best_under_sum <= current_slot_area:
+                allocation.extend(self._allocate_best_under(current_slot_rect, best_under))
+                for rule in best_under:
+                    r_remaining.remove(rule)
+            i += 1
+            compare_mode = True
+        return allocation
+
+    def _last_slot(self, r_remaining, current_slot_area, current_slot_rect, total_available_area,
+                   slot_rects, slot_area_list, allocation, current_slot_index) -> List[Allocation]:
+        """
+        Place what is left in the last slot, merged with the empty inner slots before it if that is needed to fit everything
+        """
+        effective_slot_area = current_slot_area
+        check_index = current_slot_index - 1
+        while check_index >= 0 and check_index % 2 == 1 and check_slot_is_empty(check_index, slot_rects, allocation):
+            effective_slot_area += slot_area_list[check_index]
+            check_index -= 2
+
+        if sum(area for area, _ in r_remaining) <= effective_slot_area:
+            if effective_slot_area > current_slot_area:
+                merged = self._merge_with_empty_inner(current_slot_index, slot_rects, slot_area_list, allocation, r_remaining)
+                if merged is not None:
+                    return merged
+            return self._allocate_fill_bandwidth(current_slot_rect, r_remaining)
+
+        # cannot fit everything, place the best fitting group and leave the rest out
+        best_group = self._out_of_range(r_remaining, effective_slot_area, total_available_area)
+        if best_group:
+            return self._allocate_best_under(current_slot_rect, best_group)
+        return []
+
+    def _out_of_range(self, remaining_r, current_slot_area, total_available_area) -> List[Rule]:
+        """
+        Best fitting group of the remaining rules, rules of the same size are swapped for the ones with a higher priority
+        """
+        if not remaining_r:
+            return []
+        # nothing was allocated yet, compare with everything that is available instead of the last slot only
+        if len(remaining_r) == len(self.rules) and total_available_area is not None:
+            effective_slot_area = total_available_area
+        else:
+            effective_slot_area = current_slot_area
+        best_under, best_under_sum, _, _ = find_best_over_and_best_under(remaining_r, effective_slot_area, self.epsilon)
+        if not best_under or best_under_sum > effective_slot_area:
+            return []
+
+        same_size_candidates = {}
+        best_group_sizes = [area for area, _ in best_under]
+        for area, rid in remaining_r:
+            if area in best_group_sizes:
+                same_size_candidates.setdefault(area, []).append((area, rid))
+
+        final_best_group = []
+        used_rules = set()
+        for size in best_group_sizes:
+            best_candidate = None
+            highest_priority = -1
+            for area, rid in same_size_candidates.get(size, []):
+                priority = self.rules[rid - 1][1]
+                if (area, rid) not in used_rules and priority > highest_priority:
+                    highest_priority = priority
+                    best_candidate = (area, rid)
+            if best_candidate:
+                final_best_group.append(best_candidate)
+                used_rules.add(best_candidate)
+        return final_best_group
+
+    def _merge_with_empty_inner(self, outer_index, slot_rects, slot_area_list, allocation, r_remaining) -> Optional[List[Allocation]]:
+        """
+        Merge the outer slot with the empty inner slots around it, alternating inner + inner and outer + inner,
+        until the merged area fits all remaining rules. Returns None if it never does.
+        """
+        prev_inner_index = outer_index - 1
+        if outer_index < 1 or prev_inner_index % 2 == 0 or not check_slot_is_empty(prev_inner_index, slot_rects, allocation):
+            return None
+
+        required = sum(area for area, _ in r_remaining)
+        inner_rects = [slot_rects[prev_inner_index]]
+        inner_area = slot_area_list[prev_inner_index]
+        if inner_area + slot_area_list[outer_index] >= required:
+            return self._allocate_in_merged_slot(inner_rects + [slot_rects[outer_index]], r_remaining)
+
+        next_inner_index = outer_index + 1
+        next_outer_index = outer_index + 2
+        while next_outer_index < len(slot_rects):
+            inner_rects = inner_rects + [slot_rects[next_inner_index]]
+            inner_area += slot_area_list[next_inner_index]
+            if inner_area + slot_area_list[next_outer_index] >= required:
+                return self._allocate_in_merged_slot(inner_rects + [slot_rects[next_outer_index]], r_remaining)
+            next_inner_index = next_outer_index + 1
+            next_outer_index = next_outer_index + 2
+        return None
+
+    def _allocate_in_slot(self, slot_rect, rules) -> List[Allocation]:
+        """
+        Stack the rules on top of each other over the full width of the slot
+        """
+        allocation = []
+        x1, x2, y1, y2 = slot_rect
+        width = x2 - x1
+        y_cursor = max(y1, self.usage.max_used(x1, x2))
+        for area, rid in rules:
+            h = area / width
+            allocation.append(Allocation(x1, x2, y_cursor, y_cursor + h, rid))
+            self.usage.reserve(x1, x2, y_cursor + h)
+            y_cursor += h
+        return allocation
+
+    def _allocate_best_under(self, slot_rect, rules) -> List[Allocation]:
+        """
+        Split the free height of the slot between the rules by priority, the width follows from their area
+        """
+        allocation = []
+        if not rules:
+            return allocation
+        x1, x2, y1, y2 = slot_rect
+        slot_width = x2 - x1
+        y_cursor = max(y1, self.usage.max_used(x1, x2))
+        available_height = y2 - y_cursor
+        total_priority = sum(self.rules[rid - 1][1] for _, rid in rules)
+
+        for r_area, rid in rules:
+            priority = self.rules[rid - 1][1]
+            height_ratio = priority / total_priority if total_priority > 0 else 1.0 / len(rules)
+            allocated_height = available_height * height_ratio
+            if allocated_height > 0:
+                actual_width = r_area / allocated_height
+            else:
+                actual_width = slot_width
+                allocated_height = r_area / actual_width if actual_width > 0 else 0
+            # the priority share can be too thin for the rule to finish within the slot
+            if actual_width > slot_width:
+                actual_width = slot_width
+                allocated_height = r_area / actual_width
+
+            x_end = x1 + actual_width
+            y_end = y_cursor + allocated_height
+            allocation.append(Allocation(x1, x_end, y_cursor, y_end, rid))
+            self.usage.reserve(x1, x_end, y_end)
+            y_cursor = y_end
+        return allocation
+
+    def _allocate_fill_bandwidth(self, slot_rect, rules) -> List[Allocation]:
+        """
+        Give the rules all the free height of the slot, shared by priority,
+        falls back to _allocate_on_conflict if that overlaps a reservation or does not fit
+        """
+        x1, x2, y1, y2 = slot_rect
+        effective_y1 = max(y1, self.usage.max_used(x1, x2))
+        effective_height = y2 - effective_y1
+        if effective_height <= 0 or not rules:
+            return []
+        slot_width = x2 - x1
+
+        if len(rules) == 1:
+            area, rid = rules[0]
+            height = effective_height
+            width = area / height
+            if width > slot_width:
+                width = slot_width
+                height = area / width
+            self.usage.reserve(x1, x1 + width, effective_y1 + height)
+            return [Allocation(x1, x1 + width, effective_y1, effective_y1 + height, rid)]
+
+        if sum(area for area, _ in rules) > effective_height * slot_width:
+            return self._allocate_in_slot(slot_rect, rules)
+
+        priorities = [self.rules[rid - 1][1] for _, rid in rules]
+        ratios = [_priority_ratio(priority, priorities) for priority in priorities]
+        total_ratio = sum(ratios)
+        shapes = []
+        for (area, rid), ratio in zip(rules, ratios):
+            height = effective_height * ratio / total_ratio
+            width = area / height if height > 0 else 0
+            shapes.append((area, rid, width, height))
+
+        tol = 1e-9 * max(y2, slot_width, 1) # rounding errors of the stacking
+        y_cursor = effective_y1
+        for _, _, width, height in shapes:
+            x_end = x1 + width
+            y_end = y_cursor + height
+            if has_bandwidth_conflict(x1, x_end, y_cursor, y_end, self.unavailable) or y_end > y2 + tol or width > slot_width + tol:
+                return self._allocate_on_conflict(slot_rect, rules)
+            y_cursor = y_end
+
+        allocation = []
+        y_cursor = effective_y1
+        for _, rid, width, height in shapes:
+            x_end = x1 + width
+            y_end = y_cursor + height
+            allocation.append(Allocation(x1, x_end, y_cursor, y_end, rid))
+            self.usage.reserve(x1, x_end, y_end)
+            y_cursor = y_end
+        return allocation
+
+    def _allocate_on_conflict(self, slot_rect, rules) -> List[Allocation]:
+        """
+        Stack the rules over the full width of the slot, then share the height left on top between them by priority
+        """
+        x1, x2, y1, y2 = slot_rect
+        slot_width = x2 - x1
+        effective_y1 = max(y1, self.usage.max_used(x1, x2))
+        if y2 - effective_y1 <= 0:
+            return []
+
+        remaining_unused_bandwidth = y2 - (effective_y1 + sum(area for area, _ in rules) / slot_width)
+        if remaining_unused_bandwidth <= 0:
+            return self._allocate_in_slot(slot_rect, rules)
+
+        priorities = [self.rules[rid - 1][1] for _, rid in rules]
+        priority_sum = sum(priorities)
+        if priority_sum == 0:
+            priorities = [1.0] * len(rules)
+            priority_sum = len(rules)
+
+        allocation = []
+        y_cursor = effective_y1
+        for (area, rid), priority in zip(rules, priorities):
+            height_updated = area / slot_width + remaining_unused_bandwidth * priority / priority_sum
+            width_updated = area / height_updated
+            x_end = x1 + width_updated
+            y_end = y_cursor + height_updated
+            allocation.append(Allocation(x1, x_end, y_cursor, y_end, rid))
+            self.usage.reserve(x1, x_end, y_end)
+            y_cursor = y_end
+        return allocation
+
+    def _allocate_in_merged_slot(self, component_rects, rules) -> List[Allocation]:
+        """
+        Stack the rules over the widest part of the merged slots that no reservation blocks at the current height
+        """
+        allocation = []
+        max_time = max(rect[1] for rect in component_rects)
+        max_bandwidth = max(rect[3] for rect in component_rects)
+        y_cursor = min(rect[2] for rect in component_rects)
+
+        for req_area, rid in rules:
+            remaining_bandwidth = max_bandwidth - y_cursor
+            if remaining_bandwidth <= 0:
+                continue
+
+            max_width = 0
+            best_time_range = None
+            for rx1, rx2, ry1, ry2 in component_rects:
+                if ry2 <= y_cursor:
+                    continue
+                if any(not (rx2 <= ux1 or rx1 >= ux2) and uh > y_cursor for ux1, ux2, uh in self.unavailable):
+                    continue
+                if rx2 - rx1 > max_width:
+                    max_width = rx2 - rx1
+                    best_time_range = (rx1, rx2)
+            if best_time_range is None:
+                best_time_range = component_rects[0][:2]
+                max_width = best_time_range[1] - best_time_range[0]
+
+            x_start, x_end = best_time_range
+            height_needed = req_area / max_width
+            if height_needed > remaining_bandwidth:
+                # use all the bandwidth left and take longer
+                actual_height = remaining_bandwidth
+                actual_x_end = min(x_start + req_area / actual_height, max_time)
+                actual_height = req_area / (actual_x_end - x_start)
+            else:
+                actual_height = height_needed
+                actual_x_end = x_end
+
+            y_end = min(y_cursor + actual_height, max_bandwidth)
+            actual_x_end = min(actual_x_end, max_time)
+            allocation.append(Allocation(x_start, actual_x_end, y_cursor, y_end, rid))
+            self.usage.reserve(x_start, actual_x_end, y_end)
+            y_cursor = y_end
+        return allocation
+
+def free_bandwidth(unavailable: Iterable[Rect1D], bandwidth: float, t1: float, t2: float) -> float:
+    """
+    Lowest bandwidth left over [t1, t2) once the (possibly overlapping) reservations are taken out
+    """
+    breaks = sorted({t1, t2, *(x for x1, x2, _ in unavailable for x in (x1, x2) if t1 < x < t2)})
+    return min(
+        bandwidth - sum(h for x1, x2, h in unavailable if x1 < b2 and x2 > b1)
+        for b1, b2 in zip(breaks[:-1], breaks[1:])
+    )
+
+def earliest_start(unavailable: Iterable[Rect1D], bandwidth: float, area: float, time: float, granularity: Optional[float] = None) -> Optional[Tuple[float, float]]:
+    """
+    Earliest start for a rule of the given area at a constant bandwidth (a multiple of granularity if given) within [0, time).
+    Returns (start, bandwidth) with the most bandwidth available from that start, or None if it does not fit.
+    """
+    unavailable = list(unavailable)
+    breaks = sorted({0, time, *(x for x1, x2, _ in unavailable for x in (x1, x2) if 0 < x < time)})
+    for i, start in enumerate(breaks[:-1]):
+        usable = inf
+        for t1, t2 in zip(breaks[i:-1], breaks[i + 1:]):
+            usable = min(usable, free_bandwidth(unavailable, bandwidth, t1, t2))
+            if granularity:
+                usable = floor(usable / granularity) * granularity
+            if usable <= 0:
+                break
+            # the rule finishes within the segments looked at so far
+            if start + area / usable <= t2:
+                return start, usable
+    return None
@@ -5,12 +5,15 @@ import requests
 import urllib
 
 from dmm.models.request import Request
-from dmm.db.session import databased
+from dmm.db.session import databased, savepoint
 
 from dmm.core.config import config_get
 from dmm.daemons.base import DaemonBase
 
 class FTSModifierDaemon(DaemonBase):
+    resources = ("fts",)
+    wakes_on = ("ALLOCATED", "DECIDED", "PROVISIONED", "DELETED")
+
     def __init__(self, frequency, **kwargs):
         super().__init__(frequency, **kwargs)
         self.fts_host = config_get("fts", "fts_host")
@@ -33,7 +36,11 @@ class FTSModifierDaemon(DaemonBase):
         reqs = Request.from_status(status=statuses, session=session)
         if reqs:
             for req in reqs:
-                action(req, session)
+                try:
+                    with savepoint(session):
+                        action(req, session)
+                except Exception as e:
+                    logging.error(f"Failed to update FTS limits for {req.rule_id}, {e}, will try again")
 
     def _modify_request(self, req, session):
         if req.fts_limit_current != req.fts_limit_desired:
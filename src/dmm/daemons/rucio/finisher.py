@@ -1,13 +1,19 @@
 from dmm.daemons.base import DaemonBase
 
 from dmm.models.request import Request
-from dmm.db.session import databased
+from dmm.db.session import databased, savepoint
+from dmm.core.config import config_get_int
+from dmm.core.rules import get_rule_states
 
 import logging
 
 class RucioFinisherDaemon(DaemonBase):
+    resources = ("request:ALLOCATED", "request:STAGED", "request:DECIDED", "request:PROVISIONED", "fts")
+
     def __init__(self, frequency, **kwargs):
         super().__init__(frequency, **kwargs)
+        self.concurrency = config_get_int("rucio", "concurrency", default=8, constraint="pos")
+        self.snapshot_ttl = config_get_int("rucio", "snapshot_ttl", default=30, constraint="nonneg")
 
     def process(self, **kwargs):
         self.run_once(**kwargs)
@@ -18,11 +24,18 @@ class RucioFinisherDaemon(DaemonBase):
         if not reqs:
             return
         
+        rules = get_rule_states(client, [req.rule_id for req in reqs], self.snapshot_ttl, self.concurrency, session=session)
         for req in reqs:
-            self._process_request(req, client, session)
+            try:
+                with savepoint(session):
+                    self._process_request(req, rules[req.rule_id], session)
+            except Exception as e:
+                logging.error(f"Failed to check rule state for {req.rule_id}, {e}, will try again")
 
-    def _process_request(self, req, client, session):
-        status = client.get_replication_rule(req.rule_id)['state']
+    def _process_request(self, req, rule, session):
+        if isinstance(rule, Exception):
+            raise rule
+        status = rule.state
         if status == "OK":
             logging.debug(f"Request {req.rule_id} finished with status {status}")
             req.update_transfer_status(status="FINISHED", session=session)  # Mark request as finished
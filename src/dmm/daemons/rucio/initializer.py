@@ -1,18 +1,49 @@
 import logging
+from datetime import datetime, timedelta
+from itertools import chain, islice, product
 
 from dmm.daemons.base import DaemonBase
 from dmm.models.request import Request
+from dmm.models.archive import RequestArchive
 from dmm.models.site import Site
 from dmm.db.session import databased
+from dmm.core.events import record_transition
 
-from dmm.core.config import config_get_int
+from dmm.core.config import config_get, config_get_int
+
+from rucio.common.utils import date_to_str
 
 class RucioInitDaemon(DaemonBase):
     """
     Daemon to initialize Rucio rules and create requests in the database.
     """
+    resources = () # only inserts new rows
+    # rules are listed again from this long before the newest update seen, for rules committed late in Rucio
+    scan_overlap = timedelta(minutes=5)
+    batch_size = 1000
+    # Rucio filters rules on the codes of its RuleState enum, the names are accepted in the config as well
+    rule_state_codes = {
+        "REPLICATING": "R",
+        "OK": "O",
+        "STUCK": "S",
+        "SUSPENDED": "U",
+        "WAITING_APPROVAL": "W",
+        "INJECT": "I",
+    }
+
     def __init__(self, frequency, **kwargs):
         super().__init__(frequency, **kwargs)
+        # rules of archived requests are still listed by Rucio, remember them so they are not created again
+        self.archived_rule_ids = set()
+        self.archived_until = None
+        # server side filters, rules are listed once per activity and state (empty lists do not filter)
+        self.activities = self._config_list("activities", default="")
+        self.states = [self.rule_state_codes.get(state.upper(), state.upper()) for state in self._config_list("states", default="REPLICATING")]
+        # only rules updated in Rucio after this time are listed, None lists all of them
+        self.updated_after = None
+        # rules which could not be turned into requests (e.g. a site unknown to DMM) by rule id, they do not
+        # hold updated_after back, a rule failing for good would otherwise have every pass list it again
+        self.failed_rules = {}
 
     def process(self, **kwargs):
         self.run_once(**kwargs)
@@ -22,45 +53,83 @@ class RucioInitDaemon(DaemonBase):
         """
         Process Rucio rules and create requests in the database.
         """
-        rules = client.list_replication_rules()
-        for rule in rules:
-            if self._is_rule_in_db(rule, session):
-                logging.debug(f"Rule {rule['id']} already exists in the database.")
-                continue
-            
-            if rule.get("state") == "OK":
-                logging.debug(f"Rule {rule['id']} is already finished; skipping.")
-                continue
-            elif rule.get("state") == "STUCK":
-                logging.debug(f"Rule {rule['id']} is stuck; skipping.")
-                continue
-
-            logging.debug(f"Processing rule {rule['id']}.")
-            try:
-                new_request = self._create_request_from_rule(rule, client, session)
-                new_request.save(session=session)
-                logging.info(f"Created new request for rule {rule['id']}.")
-            except Exception as e:
-                logging.error(f"Failed to create request for rule {rule['id']}: {e}")
-                continue
-
-    def _is_rule_in_db(self, rule, session) -> bool:
+        self._refresh_archived_rule_ids(session)
+        newest_update = None
+        failed_rules = {}
+        seen_rule_ids = set()
+        # the rules which failed in the earlier passes are tried again after the listed ones, a listed rule is newer
+        rules = chain(self._list_rules(client), list(self.failed_rules.values()))
+        while True:
+            batch = list(islice(rules, self.batch_size))
+            if not batch:
+                break
+            known_rule_ids = Request.known_ids([rule["id"] for rule in batch], session=session)
+            for rule in batch:
+                if rule["id"] in seen_rule_ids:
+                    continue
+                seen_rule_ids.add(rule["id"])
+                updated_at = rule.get("updated_at")
+                if isinstance(updated_at, datetime) and (newest_update is None or updated_at > newest_update):
+                    newest_update = updated_at
+
+                if rule["id"] in known_rule_ids or rule["id"] in self.archived_rule_ids:
+                    logging.debug(f"Rule {rule['id']} already exists in the database.")
+                    continue
+
+                if rule.get("state") == "OK":
+                    logging.debug(f"Rule {rule['id']} is already finished; skipping.")
+                    continue
+                elif rule.get("state") == "STUCK":
+                    logging.debug(f"Rule {rule['id']} is stuck; skipping.")
+                    continue
+
+                logging.debug(f"Processing rule {rule['id']}.")
+                try:
+                    new_request = self._create_request_from_rule(rule, session)
+                    record_transition(new_request.transfer_status, session)
+                    new_request.save(session=session)
+                    logging.info(f"Created new request for rule {rule['id']}.")
+                except Exception as e:
+                    logging.error(f"Failed to create request for rule {rule['id']}: {e}, will try again")
+                    failed_rules[rule["id"]] = rule
+                    continue
+
+        if failed_rules:
+            logging.info(f"{len(failed_rules)} rules could not be turned into requests, trying them again in the next pass")
+        # only once the whole pass went through, a pass which raised lists and retries the same rules again
+        self.failed_rules = failed_rules
+        if newest_update is not None:
+            self.updated_after = newest_update - self.scan_overlap
+
+    def _list_rules(self, client):
         """
-        Check if the rule already exists in the database.
+        List the rules matching the activity and state filters which were updated since the last pass.
         """
-        return Request.from_id(rule["id"], session=session) is not None
+        for activity, state in product(self.activities or [None], self.states or [None]):
+            filters = {}
+            if activity:
+                filters["activity"] = activity
+            if state:
+                filters["state"] = state
+            if self.updated_after:
+                filters["updated_after"] = date_to_str(self.updated_after)
+            logging.debug(f"Listing replication rules with filters {filters}")
+            yield from client.list_replication_rules(filters=filters)
 
-    def _get_rule_size(self, rule, client) -> int:
+    @staticmethod
+    def _config_list(option, default):
+        return [value.strip() for value in config_get("rucio", option, default=default).split(",") if value.strip()]
+
+    def _refresh_archived_rule_ids(self, session) -> None:
         """
-        Get the total size of the files in the rule (in bytes).
+        Add the rule ids archived since the last pass to the in-memory set.
         """
-        try:
-            return sum([i.get("bytes") for i in client.list_files(scope=rule["scope"], name=rule["name"])])
-        except Exception as e:
-            logging.error(f"Failed to get rule size for rule {rule['id']}: {e}")
-            return None
+        for rule_id, archived_at in RequestArchive.rule_ids_since(self.archived_until, session=session):
+            self.archived_rule_ids.add(rule_id)
+            if self.archived_until is None or archived_at > self.archived_until:
+                self.archived_until = archived_at
 
-    def _create_request_from_rule(self, rule, client, session) -> Request:
+    def _create_request_from_rule(self, rule, session) -> Request:
         """
         Create a new request from the given rule.
         """
@@ -83,14 +152,12 @@ class RucioInitDaemon(DaemonBase):
             logging.debug(f"Rule {rule['id']} identified as a SENSE rule.")
             transfer_status = "INIT"
 
-        rule_size = self._get_rule_size(rule, client)
-
         return Request(
             rule_id=rule["id"],
             src_site=src_site,
             dst_site=dst_site,
             priority=priority,
-            rule_size=rule_size,
+            rule_size=None, # resolved later by the size daemon, rules do not carry the size of their DID
             transfer_status=transfer_status,
             fts_limit_desired=fts_limit_desired,
         )    
\ No newline at end of file
@@ -2,11 +2,17 @@ import logging
 
 from dmm.daemons.base import DaemonBase
 from dmm.models.request import Request
-from dmm.db.session import databased
+from dmm.db.session import databased, savepoint
+from dmm.core.config import config_get_int
+from dmm.core.rules import get_rule_states
 
 class RucioModifierDaemon(DaemonBase):
+    resources = ("request:ALLOCATED", "request:STAGED", "request:DECIDED", "request:PROVISIONED")
+
     def __init__(self, frequency, **kwargs):
         super().__init__(frequency, **kwargs)
+        self.concurrency = config_get_int("rucio", "concurrency", default=8, constraint="pos")
+        self.snapshot_ttl = config_get_int("rucio", "snapshot_ttl", default=30, constraint="nonneg")
 
     def process(self, **kwargs):
         self.run_once(**kwargs)
@@ -17,10 +23,18 @@ class RucioModifierDaemon(DaemonBase):
         if not reqs:
             return
         
+        rules = get_rule_states(client, [req.rule_id for req in reqs], self.snapshot_ttl, self.concurrency, session=session)
         for req in reqs:
-            curr_prio_in_rucio = client.get_replication_rule(req.rule_id)["priority"]
-            if req.priority != curr_prio_in_rucio:
-                self._update_request_priority(req, curr_prio_in_rucio, session)
+            try:
+                with savepoint(session):
+                    rule = rules[req.rule_id]
+                    if isinstance(rule, Exception):
+                        raise rule
+                    curr_prio_in_rucio = rule.priority
+                    if req.priority != curr_prio_in_rucio:
+                        self._update_request_priority(req, curr_prio_in_rucio, session)
+            except Exception as e:
+                logging.error(f"Failed to check rule priority for {req.rule_id}, {e}, will try again")
 
     def _update_request_priority(self, req, new_priority, session):
         logging.debug(f"{req.rule_id} priority changed from {req.priority} to {new_priority}")
@@ -0,0 +1,54 @@
+import logging
+
+from dmm.daemons.base import DaemonBase
+from dmm.models.request import Request
+from dmm.db.session import databased, savepoint
+from dmm.core.config import config_get_int
+from dmm.core.rules import get_replication_rules
+
+class RucioSizeDaemon(DaemonBase):
+    """
+    Daemon to resolve the size of the requests created by the init daemon, Rucio rules do not carry
+    the size of their DID. The decider only schedules requests once they have a size.
+    """
+    resources = () # only writes the rule_size column which no other daemon touches
+    wakes_on = ("INIT",)
+
+    def __init__(self, frequency, **kwargs):
+        super().__init__(frequency, **kwargs)
+        self.concurrency = config_get_int("rucio", "concurrency", default=8, constraint="pos")
+
+    def process(self, **kwargs):
+        self.run_once(**kwargs)
+
+    @databased
+    def run_once(self, client=None, session=None) -> None:
+        # NOT_SENSE requests are never scheduled, sizing them would cost Rucio calls for every rule DMM only lists
+        reqs = Request.unsized(["INIT", "ALLOCATED", "STAGED", "DECIDED", "PROVISIONED", "MODIFIED"], session=session)
+        if not reqs:
+            return
+
+        rules = get_replication_rules(client, [req.rule_id for req in reqs], self.concurrency)
+        did_sizes = {} # rules on the same DID are only sized once per pass
+        for req in reqs:
+            try:
+                with savepoint(session):
+                    rule = rules[req.rule_id]
+                    if isinstance(rule, Exception):
+                        raise rule
+                    did = (rule["scope"], rule["name"])
+                    if did not in did_sizes:
+                        did_sizes[did] = self._get_did_size(*did, client)
+                    logging.debug(f"Request {req.rule_id} has size {did_sizes[did]}")
+                    req.update_rule_size(did_sizes[did], session=session)
+            except Exception as e:
+                logging.error(f"Failed to get rule size for rule {req.rule_id}: {e}, will try again")
+
+    def _get_did_size(self, scope, name, client) -> int:
+        """
+        Get the total size of the files in the DID (in bytes), summed by Rucio when it can, file by file otherwise.
+        """
+        size = client.get_did(scope=scope, name=name, dynamic_depth="FILE").get("bytes")
+        if size is None:
+            size = sum(f.get("bytes") or 0 for f in client.list_files(scope=scope, name=name))
+        return size
@@ -4,12 +4,15 @@ import re
 
 from dmm.daemons.base import DaemonBase
 
-from dmm.db.session import databased
+from dmm.db.session import databased, savepoint
 from dmm.models.request import Request
 
-from sense.client.workflow_combined_api import WorkflowCombinedApi
+from dmm.core.sense_api import get_workflow_api
 
 class SENSECancellerDaemon(DaemonBase):
+    resources = ("request:FINISHED", "endpoints")
+    wakes_on = ("FINISHED",)
+
     def __init__(self, frequency, **kwargs):
         super().__init__(frequency, **kwargs)
     
@@ -22,30 +25,30 @@ class SENSECancellerDaemon(DaemonBase):
         if reqs_finished == []:
             return
         for req in reqs_finished:
-            if req.sense_uuid is None:
+            if req.sense_uuid is None or req.sense_operation:
                 continue
             if (datetime.now() - req.updated_at).seconds > 60:
                 try:
-                    logging.info(f"cancelling sense link with uuid {req.sense_uuid}")
-                    workflow_api = WorkflowCombinedApi()
-                    status = req.sense_circuit_status
-                    if re.match(r"(CANCEL) - READY$", status):
-                        logging.debug(f"Request {req.sense_uuid} already in ready status, marking as canceled")
-                        req.src_endpoint.mark_inuse(in_use=False, session=session)
-                        req.dst_endpoint.mark_inuse(in_use=False, session=session)
-                        req.update_transfer_status(status="CANCELED", session=session)
-                        continue
-                    if re.match(r"(CREATE) - COMPILED$", status):
-                        logging.debug(f"Request {req.sense_uuid} in compiled status, safe to delete")
-                        req.src_endpoint.mark_inuse(in_use=False, session=session)
-                        req.dst_endpoint.mark_inuse(in_use=False, session=session)
-                        req.update_transfer_status(status="CANCELED", session=session)
-                        continue
-                    if not re.match(r"(CREATE|MODIFY|REINSTATE) - READY$", status):
-                        raise ValueError(f"Cannot cancel an instance in status '{status}', will try to cancel again")
-                    response = workflow_api.instance_operate("cancel", si_uuid=req.sense_uuid, sync="true", force=str("READY" not in status).lower())
-                    req.src_endpoint.mark_inuse(in_use=False, session=session)
-                    req.dst_endpoint.mark_inuse(in_use=False, session=session)
-                    req.update_transfer_status(status="CANCELED", session=session)
+                    with savepoint(session):
+                        logging.info(f"cancelling sense link with uuid {req.sense_uuid}")
+                        workflow_api = get_workflow_api()
+                        status = req.sense_circuit_status
+                        if re.match(r"(CANCEL) - READY$", status):
+                            logging.debug(f"Request {req.sense_uuid} already in ready status, marking as canceled")
+                            req.src_endpoint.mark_inuse(in_use=False, session=session)
+                            req.dst_endpoint.mark_inuse(in_use=False, session=session)
+                            req.update_transfer_status(status="CANCELED", session=session)
+                            continue
+                        if re.match(r"(CREATE) - COMPILED$", status):
+                            logging.debug(f"Request {req.sense_uuid} in compiled status, safe to delete")
+                            req.src_endpoint.mark_inuse(in_use=False, session=session)
+                            req.dst_endpoint.mark_inuse(in_use=False, session=session)
+                            req.update_transfer_status(status="CANCELED", session=session)
+                            continue
+                        if not re.match(r"(CREATE|MODIFY|REINSTATE) - READY$", status):
+                            raise ValueError(f"Cannot cancel an instance in status '{status}', will try to cancel again")
+                        response = workflow_api.instance_operate("cancel", si_uuid=req.sense_uuid, sync="false", force=str("READY" not in status).lower())
+                        # the SENSE handler frees the endpoints and marks the request as canceled once the cancel is ready
+                        req.update_sense_operation("cancel", session=session)
                 except Exception as e:
                     logging.error(f"Failed to cancel link for {req.rule_id}, {e}, will try again")
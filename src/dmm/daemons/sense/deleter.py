@@ -3,12 +3,15 @@ import re
 
 from dmm.daemons.base import DaemonBase
 
-from dmm.db.session import databased
+from dmm.db.session import databased, savepoint
 from dmm.models.request import Request
 
-from sense.client.workflow_combined_api import WorkflowCombinedApi
+from dmm.core.sense_api import get_workflow_api
 
 class SENSEDeleterDaemon(DaemonBase):
+    resources = ("request:CANCELED",)
+    wakes_on = ("CANCELED",)
+
     def __init__(self, frequency, **kwargs):
         super().__init__(frequency, **kwargs)
     
@@ -24,11 +27,12 @@ class SENSEDeleterDaemon(DaemonBase):
             if req.sense_uuid is None:
                 continue
             try:
-                workflow_api = WorkflowCombinedApi()
-                status = req.sense_circuit_status
-                if not re.match(r"(CANCEL) - READY$", status):
-                    raise AssertionError(f"Request {req.sense_uuid} not in cancel - ready status, will try to delete again")
-                response = workflow_api.instance_delete(si_uuid=req.sense_uuid)
-                req.update_transfer_status(status="DELETED", session=session)
+                with savepoint(session):
+                    workflow_api = get_workflow_api()
+                    status = req.sense_circuit_status
+                    if not re.match(r"(CANCEL) - READY$", status):
+                        raise AssertionError(f"Request {req.sense_uuid} not in cancel - ready status, will try to delete again")
+                    response = workflow_api.instance_delete(si_uuid=req.sense_uuid)
+                    req.update_transfer_status(status="DELETED", session=session)
             except Exception as e:
                 logging.error(f"Failed to delete link for {req.rule_id}, {e}, will try again")
\ No newline at end of file
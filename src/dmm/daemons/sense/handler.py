@@ -1,51 +1,100 @@
 import logging
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import json
 import ipaddress
 import re
+from time import perf_counter
 
 from dmm.core.config import config_get_int
 from dmm.daemons.base import DaemonBase
 from dmm.models.request import Request
-from dmm.db.session import databased
+from dmm.db.session import databased, savepoint
 
-from sense.client.workflow_combined_api import WorkflowCombinedApi
-from sense.client.address_api import AddressApi
+from dmm.core.sense_api import get_workflow_api, get_address_api, get_instance_statuses
 
 class SENSEHandlerDaemon(DaemonBase):
+    # the SENSE-O calls only hold sense:status, the requests are only locked while the results are applied (see run_once)
+    resources = ()
+    poll_resources = ("sense:status",)
+    # also completes the operations submitted by the provisioner, modifier and canceller, moving their requests on
+    apply_resources = ("sense:status", "request:DECIDED", "request:STALE", "request:MODIFIED", "request:FINISHED", "endpoints")
+    wakes_on = ("STAGED", "PROVISIONED", "CANCELED")
+    request_statuses = ["STAGED", "PROVISIONED", "CANCELED", "STALE", "DECIDED", "MODIFIED", "FINISHED"]
+    # status the request was in when the operation was submitted, status of the instance once the operation
+    # is done and the status the request then moves to
+    completions = {
+        "provision": ("DECIDED", r"(CREATE) - READY$", "PROVISIONED"),
+        "modify": ("STALE", r"(MODIFY) - READY$", "PROVISIONED"),
+        "cancel": ("FINISHED", r"(CANCEL) - READY$", "CANCELED"),
+    }
+
     def __init__(self, frequency, **kwargs):
         super().__init__(frequency, **kwargs)
-        
+        self.concurrency = config_get_int("sense", "concurrency", default=8, constraint="pos")
+        self.operation_timeout = config_get_int("sense", "operation_timeout", default=3600, constraint="pos")
+
     def process(self, **kwargs):
         self.run_once(**kwargs)
 
-    @databased
     def run_once(self, session=None):
-        reqs = Request.from_status(status=["STAGED", "PROVISIONED", "CANCELED", "STALE", "DECIDED", "FINISHED"], session=session)
-        if not reqs:
-            return
-        
-        for req in reqs:
-            if req.sense_uuid is None:
-                continue
+        """
+        Poll the SENSE-O instances of the requests, then apply their statuses in a second, short step
+        holding the locks of the requests, which are loaded again as other daemons may have moved them meanwhile.
+        """
+        with self.hold(self.poll_resources):
+            si_uuids = self._instances(session=session)
+            if not si_uuids:
+                return
+            start = perf_counter()
+            statuses = get_instance_statuses(si_uuids, self.concurrency)
+            elapsed = perf_counter() - start
+        with self.hold(self.apply_resources):
+            changed = self._apply_statuses(statuses, session=session)
+        logging.info(f"Polled {len(statuses)} SENSE instances in {elapsed:.2f}s with {self.concurrency} workers, "
+                     f"{changed} statuses changed, {len(statuses) - changed} unchanged rows not written")
 
-            workflow_api = WorkflowCombinedApi()
+    @databased
+    def _instances(self, session=None) -> list:
+        reqs = Request.from_status(status=self.request_statuses, session=session)
+        return [req.sense_uuid for req in reqs if req.sense_uuid is not None]
 
-            status = workflow_api.instance_get_status(si_uuid=req.sense_uuid) or "UNKNOWN"
-            req.update_sense_circuit_status(status=status, session=session)
+    @databased
+    def _apply_statuses(self, statuses, session=None) -> int:
+        """
+        Write the polled statuses to the requests and move on the requests whose pending operation is done,
+        returns the number of statuses which changed
+        """
+        changed = 0
+        for req in Request.from_status(status=self.request_statuses, session=session):
+            if req.sense_uuid not in statuses:
+                continue
+            try:
+                with savepoint(session):
+                    status = statuses[req.sense_uuid]
+                    if isinstance(status, Exception):
+                        raise status
+                    if status != req.sense_circuit_status:
+                        changed += 1
+                        req.update_sense_circuit_status(status=status, session=session)
 
-            if not req.sense_affiliated and re.match(r"(CREATE) - (COMPILED|COMMITTED|COMMITTING|READY)$", status):
-                logging.debug(f"Request {req.rule_id} is not affiliated with SENSE instance {req.sense_uuid}, affiliating now.")
-                self._affiliate_endpoints(req, workflow_api)
-                req.update({"sense_affiliated": True}, session=session)
+                    if not req.sense_affiliated and re.match(r"(CREATE) - (COMPILED|COMMITTED|COMMITTING|READY)$", status):
+                        logging.debug(f"Request {req.rule_id} is not affiliated with SENSE instance {req.sense_uuid}, affiliating now.")
+                        self._affiliate_endpoints(req, get_workflow_api())
+                        req.update({"sense_affiliated": True}, session=session)
 
-            # update sense_provisioned_at if the status is COMPILED for monit
-            if not req.sense_provisioned_at and re.match(r"(CREATE) - READY$", status):
-                logging.debug(f"Request {req.rule_id} is ready, updating sense_provisioned_at to current time.")
-                req.update({"sense_provisioned_at": datetime.now()})
+                    # update sense_provisioned_at if the status is COMPILED for monit
+                    if not req.sense_provisioned_at and re.match(r"(CREATE) - READY$", status):
+                        logging.debug(f"Request {req.rule_id} is ready, updating sense_provisioned_at to current time.")
+                        req.update({"sense_provisioned_at": datetime.now()})
             
-                fts_limit = config_get_int("fts-streams", f"{req.src_site.name}-{req.dst_site.name}", 200)
-                req.update_fts_limit_desired(limit=fts_limit, session=session)
+                        fts_limit = config_get_int("fts-streams", f"{req.src_site.name}-{req.dst_site.name}", 200)
+                        req.update_fts_limit_desired(limit=fts_limit, session=session)
+
+                    if req.sense_operation:
+                        self._track_operation(req, status, session)
+            except Exception as e:
+                logging.error(f"Failed to update SENSE status for {req.rule_id}, {e}, will try again")
+        return changed
 
             # TODO: if sense creation fails, should retry
             # at staging step, i.e. before create - committed: 
@@ -54,9 +103,40 @@ class SENSEHandlerDaemon(DaemonBase):
                 # should put in allocated state, so vlan allocation can be retried
             # at finished step, i.e. after cancel - committed: should force retry
 
+    def _track_operation(self, req, status, session):
+        """
+        Move the request on once its pending SENSE-O operation is done, or drop the operation if it failed or timed out
+        so the daemon which submitted it tries again.
+        """
+        submitted_from, pattern, transfer_status = self.completions[req.sense_operation]
+        elapsed = datetime.now() - req.sense_operation_at
+        if req.sense_operation_from is not None and status != req.sense_operation_from:
+            # a circuit modified before is already in MODIFY - READY when the next modify is submitted,
+            # only a READY status reached after the instance left its submission status completes the operation
+            req.update({"sense_operation_from": None}, session=session)
+        done = req.sense_operation_from is None and re.match(pattern, status)
+        if done and req.transfer_status != submitted_from:
+            # another daemon moved the request on meanwhile (e.g. a priority change), it acts on the request from there
+            logging.info(f"SENSE {req.sense_operation} of {req.rule_id} completed after {elapsed.total_seconds():.0f}s, "
+                         f"request now {req.transfer_status}, leaving its status as is")
+            req.update_sense_operation(None, session=session)
+        elif done:
+            logging.info(f"SENSE {req.sense_operation} of {req.rule_id} completed after {elapsed.total_seconds():.0f}s")
+            if req.sense_operation == "cancel":
+                req.src_endpoint.mark_inuse(in_use=False, session=session)
+                req.dst_endpoint.mark_inuse(in_use=False, session=session)
+            req.update_sense_operation(None, session=session)
+            req.update_transfer_status(status=transfer_status, session=session)
+        elif re.match(r".* - FAILED$", status):
+            logging.error(f"SENSE {req.sense_operation} of {req.rule_id} failed with status {status}, will try again")
+            req.update_sense_operation(None, session=session)
+        elif elapsed > timedelta(seconds=self.operation_timeout):
+            logging.error(f"SENSE {req.sense_operation} of {req.rule_id} still in status {status} after {elapsed}, will try again")
+            req.update_sense_operation(None, session=session)
+
     def _affiliate_endpoints(self, req, workflow_api):
         # Affiliate endpoints with this instance
-        address_api = AddressApi()
+        address_api = get_address_api()
 
         src_pool_name = f'RUCIO_Site_BGP_Subnet_Pool-{req.src_site.name}'
         exploded_source_ip = self.format_ipv6(ipaddress.IPv6Network(req.src_endpoint.ip_range))
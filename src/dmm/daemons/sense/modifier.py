@@ -4,19 +4,23 @@ import json
 
 from dmm.daemons.base import DaemonBase
 
-from dmm.db.session import databased
+from dmm.db.session import databased, savepoint
 from dmm.models.request import Request
 from dmm.models.site import Site
 from dmm.models.mesh import Mesh
 
-from dmm.core.config import config_get
+from dmm.core.config import config_get, config_get_int
 
-from sense.client.workflow_combined_api import WorkflowCombinedApi
+from dmm.core.sense_api import get_workflow_api, map_concurrently
 
 class SENSEModifierDaemon(DaemonBase):
+    resources = ("request:STALE",)
+    wakes_on = ("STALE",)
+
     def __init__(self, frequency, **kwargs):
         super().__init__(frequency, **kwargs)
         self.profile_uuid = config_get("sense", "profile_uuid")
+        self.concurrency = config_get_int("sense", "concurrency", default=8, constraint="pos")
         
     def process(self, **kwargs):
         self.run_once(**kwargs)
@@ -26,55 +30,84 @@ class SENSEModifierDaemon(DaemonBase):
         reqs_stale = Request.from_status(status=["STALE"], session=session)
         if reqs_stale == []:
             return
-        
+
+        # sites with a modification in progress, a site only goes through one modification at a time
+        busy_sites = set()
+        for req in Request.from_status(status=["STALE", "PROVISIONED"], session=session):
+            if req.sense_operation == "modify" or re.match(r"(MODIFY) - (COMMITTING|COMMITTED)", req.sense_circuit_status or ""):
+                busy_sites.update(self._sites(req))
+
         # Sort requests by previous bandwidth to prioritize modifications which reduce bandwidth
         # This ensures that make bandwidth available for other requests
         reqs_stale = sorted(reqs_stale, key=lambda x: x.bandwidth - x.previous_bandwidth)
 
+        # modifications sharing a site wait for the ones before them, the others are submitted together
+        modifications = []
         for req in reqs_stale:
-            # Check if there are any other modifications in progress
-            all_reqs = Request.from_status(status=["STALE", "PROVISIONED"], session=session)
-            for req_ in all_reqs:
-                if re.match(r"(MODIFY) - (COMMITTING|COMMITTED)", req_.sense_circuit_status):
-                    raise AssertionError("Another modification is in progress, skipping this run")
-            if req.sense_uuid is None:
+            if req.sense_uuid is None or req.sense_operation:
+                continue
+            sites = self._sites(req)
+            if sites & busy_sites:
+                logging.debug(f"Another modification is in progress or waiting at {sorted(sites & busy_sites)}, not modifying {req.rule_id} yet")
+                busy_sites |= sites
                 continue
+            busy_sites |= sites
             try:
                 status = req.sense_circuit_status
                 if not re.match(r"(CREATE|MODIFY|REINSTATE) - READY$", status):
                     raise ValueError(f"Cannot modify an instance in status '{status}', will try to modify again")
                 vlan_range = Mesh.get_vlan_range(site_1=req.src_site, site_2=req.dst_site, session=session)
-                response = self._modify_request(req, vlan_range, session=session)
-                
-                req.update_transfer_status(status="PROVISIONED", session=session)
+                modifications.append((req, self._modify_intent(req, vlan_range, session=session)))
             except Exception as e:
                 logging.error(f"Failed to modify link for {req.rule_id}, {e}, will try again")
 
-    def _modify_request(self, req, vlan_range, session=None):
+        responses = map_concurrently(self._modify_request, [(req.rule_id, req.sense_uuid, intent) for req, intent in modifications], self.concurrency)
+        for (req, _), response in zip(modifications, responses):
+            try:
+                with savepoint(session):
+                    if isinstance(response, Exception):
+                        raise response
+                    # the SENSE handler marks the request as provisioned once the modification is ready
+                    req.update_sense_operation("modify", session=session)
+            except Exception as e:
+                logging.error(f"Failed to modify link for {req.rule_id}, {e}, will try again")
+        if modifications:
+            logging.info(f"Submitted {len(modifications)} modifications, {len(reqs_stale) - len(modifications)} waiting")
+
+    @staticmethod
+    def _sites(req) -> set:
+        return {req.src_site_, req.dst_site_}
+
+    def _modify_intent(self, req, vlan_range, session=None) -> dict:
+        return {
+            "service_profile_uuid": self.profile_uuid,
+            "queries": [
+                {
+                    "ask": "edit",
+                    "options": [
+                        {"data.connections[0].bandwidth.capacity": str(int(req.bandwidth))},
+                        {"data.connections[0].terminals[0].uri": Site.from_name(name=req.src_site.name, session=session).sense_uri},
+                        {"data.connections[0].terminals[0].ipv6_prefix_list": req.src_endpoint.ip_range},
+                        {"data.connections[0].terminals[1].uri": Site.from_name(name=req.dst_site.name, session=session).sense_uri},
+                        {"data.connections[0].terminals[1].ipv6_prefix_list": req.dst_endpoint.ip_range},
+                        {"data.connections[0].terminals[0].vlan_tag": vlan_range},
+                        {"data.connections[0].terminals[1].vlan_tag": vlan_range}
+                    ]
+                }
+            ],
+            "alias": req.rule_id
+        }
+
+    def _modify_request(self, modification):
+        """
+        Submit a modification to SENSE-O, runs in the SENSE-O thread pool so it only gets plain values
+        """
+        rule_id, sense_uuid, intent = modification
         try:
-            workflow_api = WorkflowCombinedApi()
-            workflow_api.si_uuid = req.sense_uuid
-            intent = {
-                "service_profile_uuid": self.profile_uuid,
-                "queries": [
-                    {
-                        "ask": "edit",
-                        "options": [
-                            {"data.connections[0].bandwidth.capacity": str(int(req.bandwidth))},
-                            {"data.connections[0].terminals[0].uri": Site.from_name(name=req.src_site.name, session=session).sense_uri},
-                            {"data.connections[0].terminals[0].ipv6_prefix_list": req.src_endpoint.ip_range},
-                            {"data.connections[0].terminals[1].uri": Site.from_name(name=req.dst_site.name, session=session).sense_uri},
-                            {"data.connections[0].terminals[1].ipv6_prefix_list": req.dst_endpoint.ip_range},
-                            {"data.connections[0].terminals[0].vlan_tag": vlan_range},
-                            {"data.connections[0].terminals[1].vlan_tag": vlan_range}
-                        ]
-                    }
-                ],
-                "alias": req.rule_id
-            }
-            response = workflow_api.instance_modify(json.dumps(intent), sync="true")
+            workflow_api = get_workflow_api()
+            workflow_api.si_uuid = sense_uuid
+            response = workflow_api.instance_modify(json.dumps(intent), sync="false")
             return response
         except Exception as e:
-            logging.error(f"Failed to modify request {req.rule_id}: {e}")
+            logging.error(f"Failed to modify request {rule_id}: {e}")
             raise e
-            
\ No newline at end of file
@@ -1,9 +1,10 @@
 import logging
 import json
 import re
+from datetime import datetime
 
 from dmm.daemons.base import DaemonBase
-from dmm.db.session import databased
+from dmm.db.session import databased, savepoint
 
 from dmm.models.request import Request
 from dmm.models.site import Site
@@ -11,9 +12,12 @@ from dmm.models.mesh import Mesh
 
 from dmm.core.config import config_get
 
-from sense.client.workflow_combined_api import WorkflowCombinedApi
+from dmm.core.sense_api import get_workflow_api
 
 class SENSEProvisionerDaemon(DaemonBase):
+    resources = ("request:DECIDED",)
+    wakes_on = ("DECIDED", "PROVISIONED")
+
     def __init__(self, frequency, **kwargs):
         super().__init__(frequency, **kwargs)
 
@@ -34,24 +38,32 @@ class SENSEProvisionerDaemon(DaemonBase):
         for req in reqs_decided:
             if req.sense_uuid is None:
                 continue
+            if req.sense_operation:
+                logging.debug(f"Request {req.rule_id} has a pending SENSE {req.sense_operation}, waiting for it to complete")
+                continue
+            if req.scheduled_start and req.scheduled_start > datetime.now():
+                logging.debug(f"Request {req.rule_id} is scheduled to start at {req.scheduled_start}, not provisioning yet")
+                continue
             try:
-                status = req.sense_circuit_status
-                if re.match(r"(CREATE) - READY$", status):
-                    logging.debug(f"Request {req.sense_uuid} already in ready status, marking as provisioned")
-                    req.update_transfer_status(status="PROVISIONED", session=session)
-                if not re.match(r"(CREATE) - COMPILED$", status):
-                    logging.debug(f"Request {req.sense_uuid} not in compiled status, will try to provision again")
-                    continue
-                vlan_range = Mesh.get_vlan_range(site_1=req.src_site, site_2=req.dst_site, session=session)
-                response = self._provision_request(req, vlan_range, session=session)
-                req.update_transfer_status(status="PROVISIONED", session=session)
+                with savepoint(session):
+                    status = req.sense_circuit_status
+                    if re.match(r"(CREATE) - READY$", status):
+                        logging.debug(f"Request {req.sense_uuid} already in ready status, marking as provisioned")
+                        req.update_transfer_status(status="PROVISIONED", session=session)
+                    if not re.match(r"(CREATE) - COMPILED$", status):
+                        logging.debug(f"Request {req.sense_uuid} not in compiled status, will try to provision again")
+                        continue
+                    vlan_range = Mesh.get_vlan_range(site_1=req.src_site, site_2=req.dst_site, session=session)
+                    response = self._provision_request(req, vlan_range, session=session)
+                    # the SENSE handler marks the request as provisioned once the instance is ready
+                    req.update_sense_operation("provision", session=session)
             except Exception as e:
                 logging.error(f"Failed to provision link for {req.rule_id}, {e}, will try again")
     
     @databased
     def _provision_request(self, req, vlan_range, session=None):
         try:
-            workflow_api = WorkflowCombinedApi()
+            workflow_api = get_workflow_api()
             workflow_api.si_uuid = req.sense_uuid
             intent = {
                 "service_profile_uuid": self.profile_uuid,
@@ -74,7 +86,7 @@ class SENSEProvisionerDaemon(DaemonBase):
             response = workflow_api.instance_create(json.dumps(intent))
             if not self._good_response(response):
                 raise AssertionError(f"Failed to create instance for request {req.rule_id}, response: {response}")
-            workflow_api.instance_operate("provision", sync="true")
+            workflow_api.instance_operate("provision", sync="false")
             return response
         except Exception as e:
             logging.error(f"Failed to provision request {req.rule_id}: {e}")
@@ -3,7 +3,7 @@ import json
 
 from dmm.daemons.base import DaemonBase
 
-from dmm.db.session import databased
+from dmm.db.session import databased, savepoint
 from dmm.models.request import Request
 
 from dmm.core.config import config_get
@@ -11,9 +11,12 @@ from dmm.core.config import config_get
 from dmm.models.site import Site
 from dmm.models.mesh import Mesh
 
-from sense.client.workflow_combined_api import WorkflowCombinedApi
+from dmm.core.sense_api import get_workflow_api
 
 class SENSEStagerDaemon(DaemonBase):
+    resources = ("request:ALLOCATED",)
+    wakes_on = ("ALLOCATED",)
+
     def __init__(self, frequency, **kwargs):
         super().__init__(frequency, **kwargs)
         self.profile_uuid = config_get("sense", "profile_uuid")
@@ -28,27 +31,28 @@ class SENSEStagerDaemon(DaemonBase):
             return
         for req in reqs_allocated:
             try:
-                vlan_range = Mesh.get_vlan_range(site_1=req.src_site, site_2=req.dst_site, session=session)
-                if vlan_range is None:
-                    logging.error(f"No VLAN range found for {req.rule_id}, skipping staging")
-                    continue
-                response = self._stage_request(req, vlan_range, session=session)
-                logging.debug(f"Staging returned response {response}")
-                sense_uuid = response["service_uuid"]
-                req.update_sense_uuid(sense_uuid, session=session)
-                # available_bandwidth = int(response.get("queries")[1].get("results")[0].get("bandwidth")) / 1000 ** 2
-                available_bandwidth = 100000
-                req.update_source_affiliation_uri(response.get("queries")[2].get("results")[0].get("ipv6_subnet_uri"), session=session)
-                req.update_destination_affiliation_uri(response.get("queries")[2].get("results")[1].get("ipv6_subnet_uri"), session=session)
-                req.update_available_bandwidth(available_bandwidth, session=session)
-                req.update_transfer_status(status="STAGED", session=session)
+                with savepoint(session):
+                    vlan_range = Mesh.get_vlan_range(site_1=req.src_site, site_2=req.dst_site, session=session)
+                    if vlan_range is None:
+                        logging.error(f"No VLAN range found for {req.rule_id}, skipping staging")
+                        continue
+                    response = self._stage_request(req, vlan_range, session=session)
+                    logging.debug(f"Staging returned response {response}")
+                    sense_uuid = response["service_uuid"]
+                    req.update_sense_uuid(sense_uuid, session=session)
+                    # available_bandwidth = int(response.get("queries")[1].get("results")[0].get("bandwidth")) / 1000 ** 2
+                    available_bandwidth = 100000
+                    req.update_source_affiliation_uri(response.get("queries")[2].get("results")[0].get("ipv6_subnet_uri"), session=session)
+                    req.update_destination_affiliation_uri(response.get("queries")[2].get("results")[1].get("ipv6_subnet_uri"), session=session)
+                    req.update_available_bandwidth(available_bandwidth, session=session)
+                    req.update_transfer_status(status="STAGED", session=session)
             except Exception as e:
                 logging.error(f"Failed to stage link for {req.rule_id}, {e}, will try again")
     
     @databased
     def _stage_request(self, req, vlan_range, session=None):
         try:
-            workflow_api = WorkflowCombinedApi()
+            workflow_api = get_workflow_api()
             workflow_api.instance_new()
             intent = {
                 "service_profile_uuid": self.profile_uuid,
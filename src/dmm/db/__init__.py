@@ -3,8 +3,12 @@ from dmm.models.request import Request
 from dmm.models.site import Site
 from dmm.models.endpoint import Endpoint
 from dmm.models.mesh import Mesh
+from dmm.models.archive import RequestArchive
+from dmm.models.rule_state import RuleState
 
 from dmm.db.session import get_engine
+from dmm.db.migrations import upgrade
 
 engine = get_engine()
-SQLModel.metadata.create_all(engine)
\ No newline at end of file
+SQLModel.metadata.create_all(engine)
+upgrade(engine)
\ No newline at end of file
@@ -0,0 +1,32 @@
+import logging
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+from sqlmodel import SQLModel
+
+def upgrade(engine) -> None:
+    """
+    Bring the tables of an existing database up to date with the models.
+    SQLModel.metadata.create_all only creates missing tables, this adds the columns and indexes
+    that were introduced after the tables were created. New columns must be nullable.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                logging.info(f"Migrating table {table.name}: adding column {column.name}")
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}")
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                logging.info(f"Migrating table {table.name}: creating index {index.name}")
+                index.create(conn)
@@ -1,45 +1,154 @@
+import logging
+import os
+from contextlib import contextmanager
 from functools import wraps
 from inspect import iscoroutinefunction
+from time import monotonic
 
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
 from sqlmodel import create_engine, Session
 
-from dmm.core.config import config_get
+from dmm.core.config import config_get, config_get_int, config_get_bool
 
 _ENGINE = None
+_ENGINE_PID = None
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool which keeps track of how long checkouts wait for a free connection
+    """
+    wait_warning = 1. # seconds, slower checkouts are logged
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.total_wait = 0.
+        self.max_wait = 0.
+
+    def recreate(self):
+        # dispose() replaces the pool through recreate, carry the threshold over
+        pool = super().recreate()
+        pool.wait_warning = self.wait_warning
+        return pool
+
+    def _do_get(self):
+        start = monotonic()
+        conn = super()._do_get()
+        wait = monotonic() - start
+        self.checkouts += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        if wait > self.wait_warning:
+            logging.warning(f"Waited {wait:.2f}s for a database connection, {self.status()}")
+        return conn
+
+def _create_engine():
+    db_type = config_get("db", "db_type", default="postgresql")
+    if db_type == "postgresql":
+        username = config_get("db", "username", default="dmm")
+        password = config_get("db", "password", default="dmm")
+        host = config_get("db", "db_host", default="localhost")
+        port = config_get("db", "db_port", default="5432")
+        db_name = config_get("db", "db_name", default="dmm")
+        # every daemon runs in its own process with its own pool, keep them small
+        engine = create_engine(
+        f"postgresql+psycopg2://{username}:{password}@{host}:{port}/{db_name}",
+        poolclass=TimedQueuePool,
+        pool_size=config_get_int("db", "pool_size", default=2, constraint="pos"),
+        max_overflow=config_get_int("db", "max_overflow", default=2),
+        pool_timeout=config_get_int("db", "pool_timeout", default=30, constraint="pos"),
+        pool_recycle=config_get_int("db", "pool_recycle", default=1800),
+        pool_pre_ping=config_get_bool("db", "pool_pre_ping", default=True),
+        )
+        engine.pool.wait_warning = config_get_int("db", "pool_wait_warning", default=1, constraint="pos")
+        return engine
+    elif db_type == "sqlite":
+        db_file = config_get("db", "db_file", default="dmm.db")
+        engine = create_engine(
+        f"sqlite:///{db_file}"
+        )
+        _enable_sqlite_savepoints(engine)
+        return engine
+    else:
+        raise ValueError(f"Unknown database type: {db_type}")
 
 def get_engine():
-    global _ENGINE
+    """
+    Get the engine for the current process, an engine inherited across fork() gets a fresh pool
+    so the daemons never share the parent's sockets.
+    """
+    global _ENGINE, _ENGINE_PID
+    if _ENGINE is not None and _ENGINE_PID != os.getpid():
+        logging.debug(f"Engine inherited from process {_ENGINE_PID}, replacing its connection pool")
+        _ENGINE.dispose(close=False) # leave the parent's connections open, they are still in use there
+        _ENGINE_PID = os.getpid()
     if not _ENGINE:
-        db_type = config_get("db", "db_type", default="postgresql")
-        if db_type == "postgresql":
-            username = config_get("db", "username", default="dmm")
-            password = config_get("db", "password", default="dmm")
-            host = config_get("db", "db_host", default="localhost")
-            port = config_get("db", "db_port", default="5432")
-            db_name = config_get("db", "db_name", default="dmm")
-            _ENGINE = create_engine(
-            f"postgresql+psycopg2://{username}:{password}@{host}:{port}/{db_name}"
-            )
-        elif db_type == "sqlite":
-            db_file = config_get("db", "db_file", default="dmm.db")
-            _ENGINE = create_engine(
-            f"sqlite:///{db_file}"
-            )
-        else:
-            raise ValueError(f"Unknown database type: {db_type}")
+        _ENGINE = _create_engine()
+        _ENGINE_PID = os.getpid()
     assert _ENGINE
     return _ENGINE
 
+def pool_stats() -> dict:
+    """
+    Connection pool usage and checkout wait times for this process
+    """
+    pool = get_engine().pool
+    stats = {"status": pool.status()}
+    if isinstance(pool, TimedQueuePool):
+        stats.update({
+            "checkouts": pool.checkouts,
+            "mean_wait": pool.total_wait / pool.checkouts if pool.checkouts else 0.,
+            "max_wait": pool.max_wait,
+        })
+    return stats
+
+def _enable_sqlite_savepoints(engine):
+    # pysqlite manages transactions on its own which breaks SAVEPOINT, let SQLAlchemy emit BEGIN instead
+    @event.listens_for(engine, "connect")
+    def do_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def do_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+@contextmanager
+def count_queries(session):
+    """
+    Count the statements sent to the database by this process while the block runs
+    """
+    counter = {"queries": 0}
+    def count(conn, cursor, statement, parameters, context, executemany):
+        counter["queries"] += 1
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
 def get_session():
     get_engine()
     return Session(_ENGINE)
 
+@contextmanager
+def savepoint(session):
+    """
+    Isolate the changes made for a single request within a unit of work,
+    if the block raises only its own changes are rolled back and the rest of the pass is still committed
+    """
+    with session.begin_nested():
+        yield session
+
 def databased(function):
     if iscoroutinefunction(function):
         @wraps(function)
         async def new_funct(*args, **kwargs):
             if not kwargs.get('session'):
                 with get_session() as session:
+                    # unit of work: model updates are only staged and committed once the whole pass is done
+                    session.info["unit_of_work"] = True
                     try:
                         kwargs['session'] = session
                         result = await function(*args, **kwargs)
@@ -55,6 +164,8 @@ def databased(function):
         def new_funct(*args, **kwargs):
             if not kwargs.get('session'):
                 with get_session() as session:
+                    # unit of work: model updates are only staged and committed once the whole pass is done
+                    session.info["unit_of_work"] = True
                     try:
                         kwargs['session'] = session
                         result = function(*args, **kwargs)
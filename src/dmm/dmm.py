@@ -20,17 +20,19 @@ logging.basicConfig(
     handlers=[logging.FileHandler(filename="dmm.log"), logging.StreamHandler(sys.stdout)]
 )
 
-from multiprocessing import Lock
 import uvicorn # web server for the frontend
 
 from rucio.client import Client
 from dmm.core.config import config_get_int
+from dmm.core.locks import ResourceLocks
+from dmm.core.events import TransitionBus, set_bus
 
 from dmm.daemons.core.sites import RefreshSiteDBDaemon
 
 from dmm.daemons.rucio.initializer import RucioInitDaemon
 from dmm.daemons.rucio.modifier import RucioModifierDaemon
 from dmm.daemons.rucio.finisher import RucioFinisherDaemon
+from dmm.daemons.rucio.sizer import RucioSizeDaemon
 
 from dmm.daemons.fts.modifier import FTSModifierDaemon
 
@@ -44,6 +46,7 @@ from dmm.daemons.sense.deleter import SENSEDeleterDaemon
 from dmm.daemons.core.allocator import AllocatorDaemon
 from dmm.daemons.core.decider import DeciderDaemon
 from dmm.daemons.core.monit import MonitDaemon
+from dmm.daemons.core.archiver import ArchiverDaemon
 
 from dmm.api.frontend import api
 
@@ -58,8 +61,13 @@ class DMM:
         self.monit_frequency = config_get_int("daemons", "monit", default=60, constraint="nonneg")
         self.sites_frequency = config_get_int("daemons", "db", default=7200, constraint="nonneg")
         self.fts_frequency = config_get_int("daemons", "fts", default=60)
+        self.archive_frequency = config_get_int("daemons", "archive", default=3600)
 
-        self.lock = Lock()
+        # locks are keyed by the resources each daemon changes, so independent daemons can run at the same time
+        self.locks = ResourceLocks(stripes=config_get_int("dmm", "lock_stripes", default=64, constraint="pos"))
+        # daemons are woken up as soon as a request moves into a status they handle, frequencies act as a fallback
+        self.bus = TransitionBus()
+        set_bus(self.bus)
         
         try:
             self.rucio_client = Client()
@@ -75,11 +83,13 @@ class DMM:
         decider = DeciderDaemon(frequency=self.dmm_frequency)
 
         monit = MonitDaemon(frequency=self.monit_frequency)
+        archiver = ArchiverDaemon(frequency=self.archive_frequency)
         fts = FTSModifierDaemon(frequency=self.fts_frequency)
         
         rucio_init = RucioInitDaemon(frequency=self.rucio_frequency, kwargs={"client": self.rucio_client})
         rucio_modifier = RucioModifierDaemon(frequency=self.rucio_frequency, kwargs={"client": self.rucio_client})
         rucio_finisher = RucioFinisherDaemon(frequency=self.rucio_frequency, kwargs={"client": self.rucio_client})
+        rucio_sizer = RucioSizeDaemon(frequency=self.rucio_frequency, kwargs={"client": self.rucio_client})
         
         sense_updater = SENSEHandlerDaemon(frequency=self.sense_frequency)
         stager = SENSEStagerDaemon(frequency=self.sense_frequency)
@@ -88,20 +98,16 @@ class DMM:
         canceller = SENSECancellerDaemon(frequency=self.sense_frequency)
         deleter = SENSEDeleterDaemon(frequency=self.sense_frequency)
 
-        sitedb.start(self.lock)
-        fts.start(self.lock)
-        allocator.start(self.lock)
-        decider.start(self.lock)
-        monit.start(self.lock)
-        rucio_init.start(self.lock)
-        rucio_modifier.start(self.lock)
-        rucio_finisher.start(self.lock)
-        sense_updater.start(self.lock)
-        stager.start(self.lock)
-        provision.start(self.lock)
-        sense_modifier.start(self.lock)
-        canceller.start(self.lock)
-        deleter.start(self.lock)
+        daemons = [
+            sitedb, fts, allocator, decider, monit, archiver,
+            rucio_init, rucio_modifier, rucio_finisher, rucio_sizer,
+            sense_updater, stager, provision, sense_modifier, canceller, deleter,
+        ]
+        # subscribe all the daemons before forking any of them, so every process shares the full set of subscriptions
+        for daemon in daemons:
+            daemon.subscribe(self.bus)
+        for daemon in daemons:
+            daemon.start(self.locks)
 
         try:
             # start the frontend and listen on all interfaces
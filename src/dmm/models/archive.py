@@ -0,0 +1,47 @@
+from sqlmodel import Field
+from typing import Optional
+import json
+import logging
+
+from dmm.models.base import *
+
+class RequestArchive(ModelBase, table=True):
+    """
+    Requests in a terminal state moved out of the request table by the archiver,
+    the full row is kept as JSON in payload so the archive does not need to follow schema changes of Request.
+    """
+    rule_id: str = Field(primary_key=True)
+    transfer_status: Optional[str] = Field(default=None)
+    src_site: Optional[str] = Field(default=None)
+    dst_site: Optional[str] = Field(default=None)
+    sense_uuid: Optional[str] = Field(default=None)
+    archived_at: datetime = Field(default_factory=lambda: datetime.now(), index=True)
+    payload: Optional[str] = Field(default=None)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+    @classmethod
+    def from_request(cls, req):
+        payload = {column.name: getattr(req, column.name) for column in req.__table__.columns}
+        return cls(
+            rule_id=req.rule_id,
+            transfer_status=req.transfer_status,
+            src_site=req.src_site_,
+            dst_site=req.dst_site_,
+            sense_uuid=req.sense_uuid,
+            created_at=req.created_at,
+            updated_at=req.updated_at,
+            payload=json.dumps(payload, default=str)
+        )
+
+    @classmethod
+    def rule_ids_since(cls, since=None, session=None):
+        """
+        Rule ids and archive times of the requests archived at or after since (all of them if since is None)
+        """
+        logging.debug(f"ARCHIVE QUERY: rule ids archived since {since}")
+        query = session.query(cls.rule_id, cls.archived_at)
+        if since is not None:
+            query = query.filter(cls.archived_at >= since)
+        return query.all()
@@ -4,7 +4,8 @@ from sqlmodel import SQLModel, Field
 
 class ModelBase(SQLModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now())
-    updated_at: datetime = Field(default_factory=lambda: datetime.now())
+    # bumped by every UPDATE of the row, the archiver and the canceller rely on it
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(), sa_column_kwargs={"onupdate": lambda: datetime.now()})
 
     def __repr__(self):
         attrs = {k: getattr(self, k) for k in vars(self) if not k.startswith('_')}
@@ -18,7 +19,9 @@ class ModelBase(SQLModel):
     
     def save(self, session=None):
         session.add(self)
-        session.commit()
+        # inside a unit of work (see dmm.db.session.databased) the change is only staged and committed at the end of the pass
+        if not session.info.get("unit_of_work"):
+            session.commit()
 
     def delete(self, session=None):
         session.delete(self)
@@ -1,4 +1,5 @@
 from sqlmodel import Field, Relationship
+from sqlalchemy import Index
 from typing import List, Optional
 
 import logging
@@ -6,6 +7,10 @@ import logging
 from dmm.models.base import *
 
 class Endpoint(ModelBase, table=True):
+    __table_args__ = (
+        Index("ix_endpoint_site_name_ip_range", "site_name", "ip_range"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     site_name: Optional[str] = Field(default=None, foreign_key='site.name')
     ip_range: Optional[str] = Field(default=None, unique=True)
@@ -1,10 +1,17 @@
 from sqlmodel import Field, Relationship, or_
+from sqlalchemy import Index
 from typing import Optional
 import logging
 
 from dmm.models.base import *
 
 class Mesh(ModelBase, table=True):
+    # site lookups match either side of the link, so site_2 needs its own index as well
+    __table_args__ = (
+        Index("ix_mesh_site_1_site_2", "site_1", "site_2"),
+        Index("ix_mesh_site_2", "site_2"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     site_1: Optional[str] = Field(default=None, foreign_key='site.name')
     site_2: Optional[str] = Field(default=None, foreign_key='site.name')
@@ -42,4 +49,16 @@ class Mesh(ModelBase, table=True):
         ).first()
         if not mesh:
             return None
-        return mesh.link_capacity
\ No newline at end of file
+        return mesh.link_capacity
+
+    @classmethod
+    def port_capacities(cls, session=None):
+        """
+        Map of site name to max bandwidth for every site in the mesh, same as calling max_bandwidth for each of them
+        """
+        logging.debug("MESH QUERY: max bandwidth of all sites")
+        capacities = {}
+        for site_1, site_2, link_capacity in session.query(cls.site_1, cls.site_2, cls.link_capacity).order_by(cls.id):
+            capacities.setdefault(site_1, link_capacity)
+            capacities.setdefault(site_2, link_capacity)
+        return capacities
\ No newline at end of file
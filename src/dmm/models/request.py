@@ -1,13 +1,14 @@
-from sqlmodel import Field, Relationship
+from sqlmodel import Field, Relationship, or_, and_
 from typing import Optional
 
 import logging
 
 from dmm.models.base import *
+from dmm.core.events import record_transition
 
 class Request(ModelBase, table=True):
     rule_id: str = Field(primary_key=True)
-    transfer_status: Optional[str] = Field(default=None)
+    transfer_status: Optional[str] = Field(default=None, index=True)
     priority: Optional[int] = Field(default=None)
     rule_size: Optional[float] = Field(default=None)
     modified_priority: Optional[int] = Field(default=None)
@@ -22,6 +23,12 @@ class Request(ModelBase, table=True):
     fts_limit_current: Optional[int] = Field(default=0)
     fts_limit_desired: Optional[int] = Field(default=None)
     sense_provisioned_at: Optional[datetime] = Field(default=None)
+    # SENSE-O operation submitted without waiting for it (provision, modify or cancel), completed by the SENSE handler
+    sense_operation: Optional[str] = Field(default=None)
+    sense_operation_at: Optional[datetime] = Field(default=None)
+    # instance status the pending operation was submitted from, cleared once the instance has left it
+    sense_operation_from: Optional[str] = Field(default=None)
+    scheduled_start: Optional[datetime] = Field(default=None)
     prometheus_throughput: Optional[float] = Field(default=None)
     prometheus_bytes: Optional[float] = Field(default=None)
     health: Optional[str] = Field(default=None)
@@ -51,14 +58,52 @@ class Request(ModelBase, table=True):
         logging.debug(f"REQUEST QUERY: requests from status: {status}")
         return [req for req in session.query(cls).filter(cls.transfer_status.in_(status)).all()]
 
+    @classmethod
+    def archivable(cls, before, limit=None, session=None):
+        """
+        Requests in a terminal state last updated before the given time, which no daemon will touch again
+        """
+        logging.debug(f"REQUEST QUERY: archivable requests updated before {before}")
+        return session.query(cls).filter(
+            cls.updated_at < before,
+            or_(
+                cls.transfer_status.in_(["FAILED", "NOT_SENSE"]),
+                # the FTS modifier still has to remove the limits of deleted requests
+                and_(cls.transfer_status == "DELETED", or_(cls.fts_limit_current.is_(None), cls.fts_limit_current == 0)),
+                # canceled requests with a SENSE instance are still waiting for the deleter
+                and_(cls.transfer_status == "CANCELED", cls.sense_uuid.is_(None))
+            )
+        ).limit(limit).all()
+
     @classmethod
     def from_id(cls, rule_id, session=None):
         logging.debug(f"REQUEST QUERY: requests from rule_id: {rule_id}")
         return session.query(cls).filter(cls.rule_id == rule_id).first()
     
+    @classmethod
+    def unsized(cls, status, session=None):
+        logging.debug(f"REQUEST QUERY: requests without a size from status: {status}")
+        return session.query(cls).filter(cls.transfer_status.in_(status), cls.rule_size.is_(None)).all()
+
+    @classmethod
+    def known_ids(cls, rule_ids, session=None):
+        """
+        The subset of rule_ids which already have a request, in one query
+        """
+        logging.debug(f"REQUEST QUERY: known rule ids among {len(rule_ids)} rules")
+        if not rule_ids:
+            return set()
+        return {rule_id for rule_id, in session.query(cls.rule_id).filter(cls.rule_id.in_(rule_ids)).all()}
+
+    def update(self, values, session=None):
+        super().update(values, session=session)
+        if "transfer_status" in values and session is not None:
+            record_transition(values["transfer_status"], session)
+
     def update_transfer_status(self, status, session=None):
         logging.debug(f"REQUEST UPDATE: marking request {self.rule_id} as {status}")
         self.transfer_status = status 
+        record_transition(status, session)
         self.save(session)
 
     def update_available_bandwidth(self, bandwidth, session=None):
@@ -91,6 +136,11 @@ class Request(ModelBase, table=True):
         self.previous_bandwidth = previous_bandwidth
         self.save(session)
 
+    def update_rule_size(self, rule_size, session=None):
+        logging.debug(f"REQUEST UPDATE: updating rule size for request {self.rule_id} to {rule_size}")
+        self.rule_size = rule_size
+        self.save(session)
+
     def update_priority(self, priority, session=None):
         logging.debug(f"REQUEST UPDATE: updating priority for request {self.rule_id} to {priority}")
         self.priority = priority
@@ -102,6 +152,13 @@ class Request(ModelBase, table=True):
         self.sense_circuit_status = status
         self.save(session)
     
+    def update_sense_operation(self, operation, session=None):
+        logging.debug(f"REQUEST UPDATE: updating pending sense operation for request {self.rule_id} to {operation}")
+        self.sense_operation = operation
+        self.sense_operation_at = datetime.now() if operation else None
+        self.sense_operation_from = self.sense_circuit_status if operation else None
+        self.save(session)
+
     def update_fts_limit_current(self, limit, session=None):
         logging.debug(f"REQUEST UPDATE: updating fts limit current for request {self.rule_id} to {limit}")
         self.fts_limit_current = limit
@@ -0,0 +1,42 @@
+from sqlmodel import Field
+from typing import Optional
+import logging
+
+from dmm.models.base import *
+
+class RuleState(ModelBase, table=True):
+    """
+    Last state of a Rucio rule fetched by the rucio daemons (see dmm.core.rules.get_rule_states),
+    shared by all daemons and the frontend so each rule is fetched from Rucio at most once per ttl.
+    """
+    rule_id: str = Field(primary_key=True)
+    state: Optional[str] = Field(default=None)
+    priority: Optional[int] = Field(default=None)
+    fetched_at: datetime = Field(default_factory=lambda: datetime.now(), index=True)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+    @classmethod
+    def from_id(cls, rule_id, session=None):
+        logging.debug(f"RULE STATE QUERY: rule state from rule_id: {rule_id}")
+        return session.query(cls).filter(cls.rule_id == rule_id).first()
+
+    @classmethod
+    def from_ids(cls, rule_ids, session=None):
+        logging.debug(f"RULE STATE QUERY: rule states of {len(rule_ids)} rules")
+        return {state.rule_id: state for state in session.query(cls).filter(cls.rule_id.in_(rule_ids)).all()}
+
+    @classmethod
+    def prune(cls, before, session=None):
+        """
+        Drop the states not refreshed since before, their rules are no longer followed by any daemon
+        """
+        logging.debug(f"RULE STATE QUERY: pruning rule states fetched before {before}")
+        return session.query(cls).filter(cls.fetched_at < before).delete(synchronize_session=False)
+
+    def update_from_rule(self, rule, fetched_at, session=None):
+        self.state = rule["state"]
+        self.priority = rule["priority"]
+        self.fetched_at = fetched_at
+        self.save(session)
@@ -0,0 +1,30 @@
+"""
+The models and daemons read their configuration when they are imported,
+point DMM_CONFIG to a throwaway sqlite config before any dmm module is loaded.
+"""
+import os
+import tempfile
+
+_tmpdir = tempfile.mkdtemp(prefix="dmm-tests-")
+_config = os.path.join(_tmpdir, "dmm.cfg")
+with open(_config, "w") as f:
+    f.write(f"[db]\ndb_type=sqlite\ndb_file={os.path.join(_tmpdir, 'dmm.db')}\n\n[sense]\nprofile_uuid=test\n")
+os.environ["DMM_CONFIG"] = _config
+
+import pytest
+from sqlmodel import SQLModel
+
+@pytest.fixture
+def session():
+    """
+    A unit of work session on empty tables
+    """
+    from dmm.db.session import get_engine, get_session
+    import dmm.db # noqa: F401, registers and creates the tables
+
+    engine = get_engine()
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    with get_session() as session:
+        session.info["unit_of_work"] = True
+        yield session
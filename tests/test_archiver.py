@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+from dmm.daemons.core.archiver import ArchiverDaemon
+from dmm.models.archive import RequestArchive
+from dmm.models.request import Request
+from dmm.models.rule_state import RuleState
+
+OLD = datetime.now() - timedelta(days=30)
+
+def _add(session, rule_id, status, updated_at=OLD, **kwargs):
+    Request(rule_id=rule_id, transfer_status=status, updated_at=updated_at, **kwargs).save(session)
+
+def test_updates_bump_updated_at(session):
+    _add(session, "rule", "INIT")
+    session.commit()
+    req = Request.from_id("rule", session=session)
+    req.update_transfer_status("FAILED", session=session)
+    session.commit()
+    assert req.updated_at > datetime.now() - timedelta(minutes=1)
+    assert Request.archivable(datetime.now() - timedelta(days=7), session=session) == []
+
+def test_archiver_moves_old_terminal_requests(session):
+    _add(session, "failed", "FAILED")
+    _add(session, "not_sense", "NOT_SENSE")
+    _add(session, "deleted", "DELETED")
+    _add(session, "deleted_limited", "DELETED", fts_limit_current=100)
+    _add(session, "canceled", "CANCELED")
+    _add(session, "canceled_instance", "CANCELED", sense_uuid="uuid")
+    _add(session, "failed_recently", "FAILED", updated_at=datetime.now())
+    _add(session, "provisioned", "PROVISIONED")
+    RuleState(rule_id="stale", fetched_at=OLD).save(session)
+    RuleState(rule_id="fresh").save(session)
+    session.commit()
+
+    ArchiverDaemon(frequency=60).run_once(session=session)
+    session.commit()
+
+    assert {req.rule_id for req in Request.get_all(session=session)} == {
+        "deleted_limited", "canceled_instance", "failed_recently", "provisioned"
+    }
+    archived = {req.rule_id: req for req in RequestArchive.get_all(session=session)}
+    assert set(archived) == {"failed", "not_sense", "deleted", "canceled"}
+    assert archived["failed"].transfer_status == "FAILED"
+    assert archived["failed"].updated_at == OLD
+    assert [state.rule_id for state in RuleState.get_all(session=session)] == ["fresh"]
+
+def test_archiver_batches(session):
+    for n in range(5):
+        _add(session, f"failed-{n}", "FAILED")
+    session.commit()
+    archiver = ArchiverDaemon(frequency=60)
+    archiver.batch_size = 2
+    archiver.run_once(session=session)
+    session.commit()
+    assert len(Request.get_all(session=session)) == 3
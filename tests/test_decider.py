@@ -0,0 +1,135 @@
+from datetime import datetime
+
+import networkx as nx
+import numpy as np
+import pytest
+
+import dmm.daemons.core.decider as decider
+from dmm.daemons.core.decider import DeciderDaemon
+from dmm.models.mesh import Mesh
+from dmm.models.request import Request
+from dmm.models.site import Site
+
+def _graph(port_capacities, edges):
+    graph = nx.Graph()
+    for site, capacity in port_capacities.items():
+        graph.add_node(site, port_capacity=capacity)
+    for u, v, priority, available_bandwidth in edges:
+        graph.add_edge(u, v, priority=priority, available_bandwidth=available_bandwidth)
+    return graph, list(graph.nodes), list(graph.edges(data=True))
+
+def _optimize(port_capacities, edges):
+    daemon = DeciderDaemon(frequency=60)
+    graph, nodes, edges = _graph(port_capacities, edges)
+    A, c, b, caps, _ = daemon._prepare_optimization_matrices(graph, nodes, edges)
+    return daemon._optimize_bandwidth(A, b, c, caps)
+
+def test_lp_shares_a_port_by_priority_above_the_max_min():
+    x = _optimize({"hub": 10000, "a": 10000, "b": 10000}, [("hub", "a", 3, 10000), ("hub", "b", 1, 10000)])
+    # every edge gets at least the max-min share, the rest goes to the highest priority
+    assert x[0] >= x[1] >= 5000
+    assert x.sum() == pytest.approx(10000)
+
+def test_lp_respects_available_bandwidth():
+    x = _optimize({"a": 10000, "b": 10000}, [("a", "b", 1, 4000)])
+    assert x.tolist() == pytest.approx([4000])
+
+def test_lp_lower_bound_never_rounds_above_the_max_min():
+    # the max-min is just below 5, rounding it up to 5 would make the second problem infeasible
+    x = _optimize({"hub": 14.99999, "a": 100, "b": 100, "c": 100}, [("hub", site, 1, 100) for site in "abc"])
+    assert x.sum() <= 14.99999 + 1e-6
+
+def test_lp_falls_back_to_the_max_min_allocation(monkeypatch):
+    calls, original = [], decider.linprog
+    def linprog(*args, **kwargs):
+        result = original(*args, **kwargs)
+        calls.append(result)
+        result.success = len(calls) == 1 # the priority optimization fails
+        return result
+    monkeypatch.setattr(decider, "linprog", linprog)
+    x = _optimize({"hub": 10000, "a": 10000, "b": 10000}, [("hub", "a", 3, 10000), ("hub", "b", 1, 10000)])
+    assert len(calls) == 2
+    assert np.array_equal(x, calls[0].x[:-1])
+
+@pytest.fixture
+def mesh(session):
+    for name in ["a", "b", "c"]:
+        Site(name=name).save(session)
+    Mesh(site_1="a", site_2="b", link_capacity=100000).save(session)
+    Mesh(site_1="a", site_2="c", link_capacity=100000).save(session)
+    Mesh(site_1="b", site_2="c", link_capacity=100000).save(session)
+    session.commit()
+
+def test_decide_writes_allocations_back(session, mesh):
+    Request(rule_id="high", transfer_status="STAGED", src_site_="a", dst_site_="b", priority=3, available_bandwidth=100000).save(session)
+    Request(rule_id="low", transfer_status="STAGED", src_site_="a", dst_site_="c", priority=1, available_bandwidth=100000).save(session)
+    session.commit()
+
+    DeciderDaemon(frequency=60).run_once(session=session)
+
+    reqs = {req.rule_id: req for req in Request.get_all(session=session)}
+    assert {req.transfer_status for req in reqs.values()} == {"DECIDED"}
+    assert reqs["high"].bandwidth >= reqs["low"].bandwidth >= 50000
+    assert reqs["high"].bandwidth + reqs["low"].bandwidth <= 100000
+    assert all(req.bandwidth % 1000 == 0 for req in reqs.values())
+
+def _slots_decider():
+    daemon = DeciderDaemon(frequency=60)
+    daemon.strategy = "slots"
+    return daemon
+
+def test_slots_plans_staged_requests(session, mesh):
+    Request(rule_id="rule", transfer_status="STAGED", src_site_="a", dst_site_="b", priority=1, rule_size=1e12, sense_uuid="uuid").save(session)
+    session.commit()
+
+    _slots_decider().run_once(session=session)
+
+    req = Request.from_id("rule", session=session)
+    assert req.transfer_status == "DECIDED"
+    assert 0 < req.bandwidth <= 100000 and req.bandwidth % 1000 == 0
+    assert req.scheduled_start is not None
+
+def test_slots_settles_modified_requests(session, mesh):
+    now = datetime.now()
+    common = dict(transfer_status="MODIFIED", src_site_="a", dst_site_="b", priority=2, rule_size=1e12)
+    Request(rule_id="staged", sense_uuid="uuid-1", **common).save(session)
+    Request(rule_id="provisioned", sense_uuid="uuid-2", sense_provisioned_at=now, bandwidth=20000, **common).save(session)
+    Request(rule_id="provisioning", sense_uuid="uuid-3", sense_operation="provision", sense_operation_at=now, bandwidth=20000, **common).save(session)
+    Request(rule_id="allocated", **common).save(session)
+    session.commit()
+
+    _slots_decider().run_once(session=session)
+
+    reqs = {req.rule_id: req for req in Request.get_all(session=session)}
+    assert reqs["staged"].transfer_status == "DECIDED" and reqs["staged"].bandwidth > 0
+    assert reqs["provisioned"].transfer_status == "PROVISIONED" and reqs["provisioned"].bandwidth == 20000
+    assert reqs["provisioning"].transfer_status == "DECIDED" and reqs["provisioning"].bandwidth == 20000
+    assert reqs["allocated"].transfer_status == "ALLOCATED"
+    # the replanned request fits next to the bandwidth held by the two others
+    assert reqs["staged"].bandwidth <= 100000 - 40000
+
+def test_lp_waits_for_pending_operations_before_modifying(session, mesh):
+    now = datetime.now()
+    # a priority change while the circuit was being provisioned at 10000
+    Request(rule_id="rule", transfer_status="MODIFIED", src_site_="a", dst_site_="b", priority=2, available_bandwidth=100000,
+            bandwidth=10000, sense_uuid="uuid", sense_operation="provision", sense_operation_at=now).save(session)
+    session.commit()
+    decider = DeciderDaemon(frequency=60)
+
+    decider.run_once(session=session)
+    req = Request.from_id("rule", session=session)
+    assert (req.transfer_status, req.bandwidth) == ("MODIFIED", 10000)
+
+    # the handler clears the operation once the circuit is up, the next pass modifies it
+    req.update({"sense_operation": None, "sense_provisioned_at": now}, session=session)
+    session.commit()
+    decider.run_once(session=session)
+    req = Request.from_id("rule", session=session)
+    assert (req.transfer_status, req.previous_bandwidth, req.bandwidth) == ("STALE", 10000, 100000)
+
+def test_lp_settles_modified_requests_keeping_their_bandwidth(session, mesh):
+    Request(rule_id="rule", transfer_status="MODIFIED", src_site_="a", dst_site_="b", priority=2, available_bandwidth=100000,
+            bandwidth=100000, sense_uuid="uuid", sense_provisioned_at=datetime.now()).save(session)
+    session.commit()
+    DeciderDaemon(frequency=60).run_once(session=session)
+    assert Request.from_id("rule", session=session).transfer_status == "PROVISIONED"
@@ -0,0 +1,81 @@
+from multiprocessing import Queue
+from queue import Empty
+
+from dmm.core.events import TransitionBus, record_transition, set_bus
+from dmm.core.locks import ResourceLocks
+from dmm.daemons.base import DaemonBase
+from dmm.models.request import Request
+
+class Publisher(DaemonBase):
+    def process(self, **kwargs):
+        from dmm.core.events import publish_transition
+        publish_transition("STAGED")
+
+class Subscriber(DaemonBase):
+    wakes_on = ("STAGED",)
+
+    def __init__(self, frequency, runs, **kwargs):
+        super().__init__(frequency, **kwargs)
+        self.runs = runs
+
+    def process(self, **kwargs):
+        self.runs.put(True)
+
+def test_publish_sets_subscribed_events_only():
+    bus = TransitionBus()
+    staged = bus.subscribe(["STAGED", "MODIFIED"])
+    finished = bus.subscribe(["FINISHED"])
+    bus.publish("MODIFIED")
+    assert staged.is_set() and not finished.is_set()
+
+def test_subscribe_is_done_once():
+    bus = TransitionBus()
+    daemon = Subscriber(frequency=1, runs=None)
+    daemon.subscribe(bus)
+    wakeup = daemon.wakeup
+    daemon.subscribe(bus)
+    assert daemon.wakeup is wakeup
+    assert bus.subscribers["STAGED"] == [wakeup]
+
+def test_daemon_forked_first_wakes_daemons_subscribed_after_it():
+    """
+    The publisher is forked before the subscriber is started, it still has to see the subscription
+    """
+    bus = TransitionBus()
+    set_bus(bus)
+    runs = Queue()
+    publisher, subscriber = Publisher(frequency=0.2), Subscriber(frequency=60, runs=runs)
+    daemons = [publisher, subscriber]
+    try:
+        for daemon in daemons:
+            daemon.subscribe(bus)
+        for daemon in daemons:
+            daemon.start(ResourceLocks())
+        runs.get(timeout=5)
+        # the second pass only happens this early if the publisher woke the subscriber up
+        runs.get(timeout=5)
+    except Empty:
+        raise AssertionError("subscriber was not woken up by the publisher")
+    finally:
+        for daemon in daemons:
+            daemon.stop()
+        set_bus(None)
+
+def test_transitions_are_published_on_commit_only(session):
+    bus = TransitionBus()
+    set_bus(bus)
+    staged = bus.subscribe(["STAGED"])
+    try:
+        req = Request(rule_id="rule", transfer_status="INIT")
+        req.save(session)
+        req.update_transfer_status("STAGED", session=session)
+        assert not staged.is_set()
+        session.rollback()
+        session.commit()
+        assert not staged.is_set()
+
+        record_transition("STAGED", session)
+        session.commit()
+        assert staged.is_set()
+    finally:
+        set_bus(None)
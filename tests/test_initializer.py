@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("rucio")
+
+from dmm.daemons.rucio.initializer import RucioInitDaemon
+from dmm.models.request import Request
+from dmm.models.site import Site
+
+class FakeRucio:
+    """
+    list_replication_rules of the Rucio client, filtering on state and updated_after like the server does
+    """
+    state_codes = {"REPLICATING": "R", "OK": "O", "STUCK": "S", "SUSPENDED": "U", "WAITING_APPROVAL": "W", "INJECT": "I"}
+
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+        self.filters = []
+
+    def list_replication_rules(self, filters=None):
+        filters = dict(filters or {})
+        self.filters.append(filters)
+        if "state" in filters and filters["state"] not in self.state_codes.values():
+            raise ValueError(f"'{filters['state']}' is not a valid RuleState") # the server turns the filter into its enum
+        for rule in self.rules:
+            if "state" in filters and self.state_codes[rule["state"]] != filters["state"]:
+                continue
+            if "updated_after" in filters and rule["updated_at"] <= datetime.strptime(filters["updated_after"], "%a, %d %b %Y %H:%M:%S UTC"):
+                continue
+            yield dict(rule)
+
+def test_states_are_listed_by_their_rucio_code(monkeypatch):
+    monkeypatch.setattr(RucioInitDaemon, "_config_list", staticmethod(
+        lambda option, default: {"activities": ["SENSE"], "states": ["REPLICATING", "s"]}[option]
+    ))
+    daemon = RucioInitDaemon(frequency=60)
+    client = FakeRucio()
+    list(daemon._list_rules(client))
+    assert client.filters == [{"activity": "SENSE", "state": "R"}, {"activity": "SENSE", "state": "S"}]
+
+HOUR_AGO = datetime.now().replace(microsecond=0) - timedelta(hours=1)
+
+def _rule(rule_id, src="a", dst="b", updated_at=HOUR_AGO, **kwargs):
+    rule = dict(id=rule_id, source_replica_expression=src, rse_expression=dst, priority=3, activity="SENSE",
+                state="REPLICATING", updated_at=updated_at)
+    rule.update(kwargs)
+    return rule
+
+@pytest.fixture
+def sites(session):
+    for name in ["a", "b"]:
+        Site(name=name).save(session)
+    session.commit()
+
+def _statuses(session):
+    return {req.rule_id: req.transfer_status for req in Request.get_all(session=session)}
+
+def test_only_rules_updated_since_the_last_pass_are_listed(session, sites):
+    client = FakeRucio([_rule("sense"), _rule("other", activity="User Subscriptions")])
+    daemon = RucioInitDaemon(frequency=60)
+    daemon.run_once(client=client, session=session)
+    assert _statuses(session) == {"sense": "INIT", "other": "NOT_SENSE"}
+    assert "updated_after" not in client.filters[0]
+    assert daemon.updated_after == HOUR_AGO - daemon.scan_overlap
+
+    client.rules.append(_rule("new", updated_at=HOUR_AGO + timedelta(minutes=30)))
+    daemon.run_once(client=client, session=session)
+    assert client.filters[-1]["updated_after"] == (HOUR_AGO - daemon.scan_overlap).strftime("%a, %d %b %Y %H:%M:%S UTC")
+    assert _statuses(session) == {"sense": "INIT", "other": "NOT_SENSE", "new": "INIT"}
+    assert daemon.updated_after == HOUR_AGO + timedelta(minutes=25)
+
+def test_failed_rules_do_not_hold_the_scan_back(session, sites):
+    client = FakeRucio([_rule("unknown", dst="c", updated_at=HOUR_AGO - timedelta(days=1)), _rule("known")])
+    daemon = RucioInitDaemon(frequency=60)
+    daemon.run_once(client=client, session=session)
+    assert _statuses(session) == {"known": "INIT"}
+    assert daemon.updated_after == HOUR_AGO - daemon.scan_overlap
+    assert set(daemon.failed_rules) == {"unknown"}
+
+    # the rule is not listed again, it is retried from the last pass once its site is known
+    Site(name="c").save(session)
+    daemon.run_once(client=client, session=session)
+    assert _statuses(session) == {"known": "INIT", "unknown": "INIT"}
+    assert daemon.failed_rules == {}
+    assert daemon.updated_after == HOUR_AGO - daemon.scan_overlap
+
+def test_rules_are_processed_in_batches(session, sites):
+    client = FakeRucio([_rule(f"rule-{i}", updated_at=HOUR_AGO + timedelta(seconds=i)) for i in range(7)])
+    daemon = RucioInitDaemon(frequency=60)
+    daemon.batch_size = 3
+    daemon.run_once(client=client, session=session)
+    assert len(_statuses(session)) == 7
+    assert daemon.updated_after == HOUR_AGO + timedelta(seconds=6) - daemon.scan_overlap
@@ -0,0 +1,59 @@
+from multiprocessing import Process, Queue
+from time import monotonic, sleep
+
+import pytest
+
+from dmm.core.locks import ResourceLocks
+
+def _hold(locks, keys, seconds, started):
+    with locks.hold(keys):
+        started.put(monotonic())
+        sleep(seconds)
+
+def _time_to_acquire(locks, keys):
+    start = monotonic()
+    with locks.hold(keys):
+        return monotonic() - start
+
+def test_stripes_must_be_positive():
+    with pytest.raises(ValueError):
+        ResourceLocks(stripes=0)
+
+def test_indices_are_sorted_and_unique():
+    locks = ResourceLocks(stripes=4)
+    indices = locks._indices(["request:STAGED", "request:DECIDED", "endpoints", "fts", "sites", "request:STAGED"])
+    assert indices == sorted(set(indices))
+    assert all(0 <= index < 4 for index in indices)
+
+def test_empty_keys_do_not_lock():
+    locks = ResourceLocks(stripes=1)
+    with locks.hold(["fts"]):
+        with locks.hold(()):
+            pass
+
+def test_locks_are_released_on_error():
+    locks = ResourceLocks(stripes=2)
+    with pytest.raises(RuntimeError):
+        with locks.hold(["fts", "endpoints"]):
+            raise RuntimeError
+    assert _time_to_acquire(locks, ["fts", "endpoints"]) < 0.1
+
+def test_shared_resource_is_held_across_processes():
+    locks = ResourceLocks()
+    started = Queue()
+    holder = Process(target=_hold, args=(locks, ["request:STAGED"], 0.5, started))
+    holder.start()
+    started.get(timeout=5)
+    assert _time_to_acquire(locks, ["request:STAGED", "fts"]) > 0.3
+    holder.join()
+
+def test_disjoint_resources_do_not_wait():
+    locks = ResourceLocks(stripes=1024)
+    keys, other = ["request:STAGED"], ["fts"]
+    assert locks._indices(keys) != locks._indices(other)
+    started = Queue()
+    holder = Process(target=_hold, args=(locks, keys, 0.5, started))
+    holder.start()
+    started.get(timeout=5)
+    assert _time_to_acquire(locks, other) < 0.2
+    holder.join()
@@ -0,0 +1,64 @@
+from datetime import timedelta
+from threading import Lock
+
+from dmm.core.rules import get_replication_rules, get_rule_states
+from dmm.models.rule_state import RuleState
+
+class FakeRucio:
+    """
+    get_replication_rule of the Rucio client over a fixed set of rules, counting the calls per rule
+    """
+    def __init__(self, rules):
+        self.rules = rules
+        self.calls = {}
+        self.lock = Lock()
+
+    def get_replication_rule(self, rule_id):
+        with self.lock:
+            self.calls[rule_id] = self.calls.get(rule_id, 0) + 1
+        if rule_id not in self.rules:
+            raise KeyError(rule_id)
+        return dict(self.rules[rule_id], id=rule_id)
+
+def _rules(n):
+    return {f"rule-{i}": {"state": "REPLICATING", "priority": i} for i in range(n)}
+
+def test_rules_are_fetched_concurrently_once_each():
+    client = FakeRucio(_rules(20))
+    rule_ids = list(client.rules) + ["rule-0", "missing"]
+    rules = get_replication_rules(client, rule_ids, concurrency=8)
+    assert list(rules) == list(client.rules) + ["missing"]
+    assert all(rules[rule_id]["priority"] == client.rules[rule_id]["priority"] for rule_id in client.rules)
+    assert isinstance(rules["missing"], KeyError)
+    assert set(client.calls.values()) == {1}
+
+def test_rules_are_fetched_serially_without_concurrency():
+    client = FakeRucio(_rules(3))
+    assert get_replication_rules(client, list(client.rules)) == {
+        rule_id: dict(rule, id=rule_id) for rule_id, rule in client.rules.items()
+    }
+
+def test_rule_states_are_reused_within_the_ttl(session):
+    client = FakeRucio(_rules(2))
+    first = get_rule_states(client, ["rule-0", "rule-1"], ttl=60, session=session)
+    client.rules["rule-0"]["priority"] = 5
+    second = get_rule_states(client, ["rule-0", "rule-1"], ttl=60, session=session)
+    assert client.calls == {"rule-0": 1, "rule-1": 1}
+    assert second["rule-0"] is first["rule-0"] and second["rule-0"].priority == 0
+
+def test_rule_states_are_fetched_again_after_the_ttl(session):
+    client = FakeRucio(_rules(1))
+    state = get_rule_states(client, ["rule-0"], ttl=60, session=session)["rule-0"]
+    state.fetched_at -= timedelta(seconds=61)
+    client.rules["rule-0"].update(priority=5, state="OK")
+    state = get_rule_states(client, ["rule-0"], ttl=60, session=session)["rule-0"]
+    assert client.calls == {"rule-0": 2}
+    assert (state.priority, state.state) == (5, "OK")
+    assert len(RuleState.get_all(session=session)) == 1
+
+def test_failed_fetches_are_not_stored(session):
+    client = FakeRucio({})
+    assert isinstance(get_rule_states(client, ["missing"], ttl=60, session=session)["missing"], KeyError)
+    assert isinstance(get_rule_states(client, ["missing"], ttl=60, session=session)["missing"], KeyError)
+    assert client.calls == {"missing": 2}
+    assert RuleState.get_all(session=session) == []
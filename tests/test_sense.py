@@ -0,0 +1,165 @@
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from time import sleep
+
+import pytest
+
+pytest.importorskip("sense")
+
+from dmm.core import sense_api
+from dmm.core.sense_api import get_instance_statuses, map_concurrently
+from dmm.daemons.sense import handler as handler_module
+from dmm.daemons.sense.handler import SENSEHandlerDaemon
+from dmm.daemons.sense.modifier import SENSEModifierDaemon
+from dmm.db.session import get_session
+from dmm.models.request import Request
+from dmm.models.site import Site
+
+def test_instance_statuses_are_fetched_once_per_instance(monkeypatch):
+    calls = []
+    class WorkflowApi:
+        def instance_get_status(self, si_uuid):
+            calls.append(si_uuid)
+            if si_uuid == "broken":
+                raise RuntimeError(si_uuid)
+            return {"a": "CREATE - READY", "b": "MODIFY - COMMITTING"}.get(si_uuid)
+    monkeypatch.setattr(sense_api, "get_workflow_api", WorkflowApi)
+    statuses = get_instance_statuses(["a", "b", "a", "c", "broken"], concurrency=4)
+    assert sorted(calls) == ["a", "b", "broken", "c"]
+    assert {uuid: status for uuid, status in statuses.items() if uuid != "broken"} == {
+        "a": "CREATE - READY", "b": "MODIFY - COMMITTING", "c": "UNKNOWN"
+    }
+    assert isinstance(statuses["broken"], RuntimeError)
+
+def _pending(session, operation, started=None, transfer_status="DECIDED", submitted_from="CREATE - COMPILED"):
+    req = Request(rule_id="rule", transfer_status=transfer_status, sense_uuid="uuid", sense_circuit_status=submitted_from)
+    req.save(session)
+    req.update_sense_operation(operation, session=session)
+    if started:
+        req.sense_operation_at = started
+    return req
+
+def test_completed_operations_move_the_request_on(session):
+    req = _pending(session, "provision")
+    SENSEHandlerDaemon(frequency=60)._track_operation(req, "CREATE - READY", session)
+    assert (req.transfer_status, req.sense_operation) == ("PROVISIONED", None)
+
+def test_pending_operations_wait_for_their_status(session):
+    req = _pending(session, "provision")
+    # SENSE-O has not moved the instance out of its previous status yet
+    SENSEHandlerDaemon(frequency=60)._track_operation(req, "CREATE - COMPILED", session)
+    assert (req.transfer_status, req.sense_operation) == ("DECIDED", "provision")
+
+def test_failed_or_timed_out_operations_are_dropped(session):
+    handler = SENSEHandlerDaemon(frequency=60)
+    req = _pending(session, "provision")
+    handler._track_operation(req, "CREATE - FAILED", session)
+    assert (req.transfer_status, req.sense_operation) == ("DECIDED", None)
+
+    req.sense_operation, req.sense_operation_at = "provision", datetime.now() - timedelta(seconds=handler.operation_timeout + 1)
+    handler._track_operation(req, "CREATE - COMMITTING", session)
+    assert (req.transfer_status, req.sense_operation) == ("DECIDED", None)
+
+def test_map_concurrently_keeps_the_order_and_returns_exceptions():
+    def fn(item):
+        if item == 3:
+            raise ValueError(item)
+        sleep(0.01 * (5 - item))
+        return item * 2
+    for concurrency in (1, 4):
+        results = map_concurrently(fn, list(range(5)), concurrency)
+        assert results[:3] + results[4:] == [0, 2, 4, 8]
+        assert isinstance(results[3], ValueError)
+
+def test_map_concurrently_runs_up_to_concurrency_calls():
+    running, peak, lock = [0], [0], threading.Lock()
+    def fn(item):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        sleep(0.05)
+        with lock:
+            running[0] -= 1
+    map_concurrently(fn, list(range(12)), 4)
+    assert peak[0] == 4
+
+def _stale(session, rule_id, src, dst, bandwidth, previous_bandwidth, **kwargs):
+    values = dict(transfer_status="STALE", sense_uuid=f"uuid-{rule_id}", sense_circuit_status="CREATE - READY")
+    values.update(kwargs)
+    Request(rule_id=rule_id, src_site_=src, dst_site_=dst, bandwidth=bandwidth, previous_bandwidth=previous_bandwidth, **values).save(session)
+
+def test_modifications_sharing_a_site_are_serialized(session, monkeypatch):
+    for name in "abcdefgh":
+        Site(name=name).save(session)
+    _stale(session, "increase", "a", "c", 2000, 1000)
+    _stale(session, "reduce", "a", "b", 1000, 5000)
+    _stale(session, "behind-increase", "c", "d", 3000, 1000)
+    _stale(session, "alone", "e", "f", 2500, 1000)
+    _stale(session, "busy", "g", "h", 2500, 1000)
+    Request(rule_id="modifying", transfer_status="PROVISIONED", src_site_="h", dst_site_="g", sense_operation="modify").save(session)
+    session.commit()
+
+    submitted = []
+    monkeypatch.setattr(SENSEModifierDaemon, "_modify_intent", lambda self, req, vlan_range, session=None: {})
+    monkeypatch.setattr(SENSEModifierDaemon, "_modify_request", lambda self, modification: submitted.append(modification[0]))
+    SENSEModifierDaemon(frequency=60).run_once(session=session)
+
+    # reductions go first, a request waiting for a site keeps it from the requests after it
+    assert sorted(submitted) == ["alone", "reduce"]
+    operations = {req.rule_id: req.sense_operation for req in Request.from_status(status=["STALE"], session=session)}
+    assert operations == {"increase": None, "reduce": "modify", "behind-increase": None, "alone": "modify", "busy": None}
+
+@pytest.mark.parametrize("transfer_status", ["MODIFIED", "FINISHED"])
+def test_completions_leave_requests_moved_on_meanwhile(session, transfer_status):
+    req = _pending(session, "provision")
+    req.transfer_status = transfer_status
+    SENSEHandlerDaemon(frequency=60)._track_operation(req, "CREATE - READY", session)
+    assert (req.transfer_status, req.sense_operation) == (transfer_status, None)
+
+def test_modifications_complete_once_the_instance_left_its_ready_status(session):
+    handler = SENSEHandlerDaemon(frequency=60)
+    req = _pending(session, "modify", transfer_status="STALE", submitted_from="MODIFY - READY")
+    # SENSE-O has not picked the modification up yet
+    handler._track_operation(req, "MODIFY - READY", session)
+    assert (req.transfer_status, req.sense_operation) == ("STALE", "modify")
+    handler._track_operation(req, "MODIFY - COMMITTING", session)
+    assert (req.transfer_status, req.sense_operation) == ("STALE", "modify")
+    handler._track_operation(req, "MODIFY - READY", session)
+    assert (req.transfer_status, req.sense_operation) == ("PROVISIONED", None)
+
+class RecordingLocks:
+    def __init__(self):
+        self.held = set()
+        self.history = []
+
+    @contextmanager
+    def hold(self, keys):
+        assert not self.held, "locks taken while holding others"
+        self.held = set(keys)
+        self.history.append(self.held)
+        try:
+            yield
+        finally:
+            self.held = set()
+
+def test_statuses_are_polled_without_holding_the_request_locks(session, monkeypatch):
+    Request(rule_id="rule", transfer_status="DECIDED", sense_uuid="uuid", sense_circuit_status="CREATE - COMPILED",
+            sense_affiliated=True).save(session)
+    session.commit()
+    handler = SENSEHandlerDaemon(frequency=60)
+    handler.locks = RecordingLocks()
+
+    def get_instance_statuses(si_uuids, concurrency):
+        assert handler.locks.held == {"sense:status"}
+        # the request finishes while SENSE-O is polled
+        with get_session() as other:
+            Request.from_id("rule", session=other).update_transfer_status("FINISHED", session=other)
+        return {"uuid": "CREATE - COMMITTING"}
+    monkeypatch.setattr(handler_module, "get_instance_statuses", get_instance_statuses)
+    handler.run_once()
+
+    assert handler.locks.history == [{"sense:status"}, set(handler.apply_resources)]
+    session.expire_all()
+    req = Request.from_id("rule", session=session)
+    assert (req.transfer_status, req.sense_circuit_status) == ("FINISHED", "CREATE - COMMITTING")
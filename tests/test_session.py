@@ -0,0 +1,55 @@
+import pytest
+
+from dmm.db.session import count_queries, databased, get_session, savepoint
+from dmm.models.request import Request
+
+@pytest.fixture
+def tables(session):
+    session.close()
+
+def _statuses():
+    with get_session() as session:
+        return {req.rule_id: req.transfer_status for req in session.query(Request).all()}
+
+def test_failing_savepoint_only_rolls_back_its_own_changes(tables):
+    @databased
+    def run_once(session=None):
+        for rule_id in ["a", "b", "c"]:
+            try:
+                with savepoint(session):
+                    Request(rule_id=rule_id, transfer_status="INIT").save(session)
+                    if rule_id == "b":
+                        raise RuntimeError("failed")
+            except RuntimeError:
+                pass
+
+    run_once()
+    assert _statuses() == {"a": "INIT", "c": "INIT"}
+
+def test_failing_pass_commits_nothing(tables):
+    @databased
+    def run_once(session=None):
+        Request(rule_id="a", transfer_status="INIT").save(session)
+        raise RuntimeError("failed")
+
+    with pytest.raises(RuntimeError):
+        run_once()
+    assert _statuses() == {}
+
+def test_pass_commits_once(tables):
+    @databased
+    def run_once(session=None):
+        with count_queries(session) as counter:
+            for rule_id in ["a", "b", "c"]:
+                req = Request(rule_id=rule_id, transfer_status="INIT")
+                req.save(session)
+                req.update_transfer_status("ALLOCATED", session=session)
+            assert counter["queries"] == 0 # nothing is sent before the end of the pass
+
+    run_once()
+    assert _statuses() == {"a": "ALLOCATED", "b": "ALLOCATED", "c": "ALLOCATED"}
+
+def test_save_commits_outside_a_unit_of_work(tables):
+    with get_session() as session:
+        Request(rule_id="a", transfer_status="INIT").save(session)
+    assert _statuses() == {"a": "INIT"}
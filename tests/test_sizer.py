@@ -0,0 +1,56 @@
+from dmm.daemons.rucio.sizer import RucioSizeDaemon
+from dmm.models.request import Request
+
+class FakeRucio:
+    """
+    The Rucio client calls of the size daemon, with the DIDs summed by Rucio or only listed file by file
+    """
+    def __init__(self, rules, dids, files):
+        self.rules, self.dids, self.files = rules, dids, files
+        self.calls = []
+
+    def get_replication_rule(self, rule_id):
+        self.calls.append(("get_replication_rule", rule_id))
+        return self.rules[rule_id]
+
+    def get_did(self, scope, name, dynamic_depth=None):
+        self.calls.append(("get_did", name))
+        return {"bytes": self.dids.get(name)}
+
+    def list_files(self, scope, name):
+        self.calls.append(("list_files", name))
+        return iter({"bytes": size} for size in self.files[name])
+
+def test_requests_are_sized_from_their_did(session):
+    client = FakeRucio(
+        rules={
+            "summed": {"scope": "cms", "name": "summed"},
+            "summed-again": {"scope": "cms", "name": "summed"},
+            "files": {"scope": "cms", "name": "files"},
+        },
+        dids={"summed": 20},
+        files={"files": [1, 2, None, 3]},
+    )
+    for rule_id in client.rules:
+        Request(rule_id=rule_id, transfer_status="INIT").save(session)
+    Request(rule_id="not-sense", transfer_status="NOT_SENSE").save(session)
+    session.commit()
+
+    RucioSizeDaemon(frequency=60).run_once(client=client, session=session)
+
+    sizes = {req.rule_id: req.rule_size for req in Request.get_all(session=session)}
+    assert sizes == {"summed": 20, "summed-again": 20, "files": 6, "not-sense": None}
+    # the DID shared by two rules is only sized once, the files are only listed when Rucio has no sum
+    assert [call for call in client.calls if call[0] != "get_replication_rule"] == [
+        ("get_did", "summed"), ("get_did", "files"), ("list_files", "files")
+    ]
+
+def test_failed_requests_are_sized_in_a_later_pass(session):
+    client = FakeRucio(rules={"ok": {"scope": "cms", "name": "ok"}}, dids={"ok": 10}, files={})
+    Request(rule_id="ok", transfer_status="STAGED").save(session)
+    Request(rule_id="missing", transfer_status="STAGED").save(session)
+    session.commit()
+
+    RucioSizeDaemon(frequency=60).run_once(client=client, session=session)
+
+    assert [req.rule_id for req in Request.unsized(["STAGED"], session=session)] == ["missing"]
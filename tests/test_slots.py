@@ -0,0 +1,151 @@
+import random
+from math import inf
+
+import pytest
+
+from dmm.daemons.core.slots import (
+    EXACT_MAX_RULES, BandwidthUsage, SlotScheduler, find_best_over_and_best_under, get_next_slot
+)
+
+def _overlap(a, b):
+    return a[0] < b[1] and b[0] < a[1] and a[2] < b[3] and b[2] < a[3]
+
+def _check(scheduler, rules, allocations, unavailable=()):
+    assert scheduler.is_valid(allocations)
+    for x1, x2, y1, y2, rid in allocations:
+        assert (x2 - x1) * (y2 - y1) == pytest.approx(rules[rid - 1][0])
+        assert 0 <= x1 < x2 <= scheduler.time + 1e-9 and 0 <= y1 < y2 <= scheduler.bandwidth + 1e-9
+        for ux1, ux2, uh in unavailable:
+            assert not _overlap((x1, x2, y1, y2), (ux1, ux2, 0, uh))
+    for i, a in enumerate(allocations):
+        for b in allocations[i + 1:]:
+            assert not _overlap(a[:4], b[:4])
+
+def test_scheduler_packs_rules_without_overlaps():
+    rules = [(300, 1), (200, 2), (100, 1), (250, 3)]
+    scheduler = SlotScheduler(bandwidth=10, time=100)
+    allocations, dropped = scheduler.schedule(rules)
+    assert dropped == []
+    assert sorted(rid for *_, rid in allocations) == [1, 2, 3, 4]
+    _check(scheduler, rules, allocations)
+
+def test_scheduler_packs_around_reservations():
+    unavailable = [(0, 40, 6), (60, 100, 8)]
+    rules = [(100, 1), (150, 1), (80, 2)]
+    scheduler = SlotScheduler(bandwidth=10, time=100, unavailable=unavailable)
+    allocations, dropped = scheduler.schedule(rules)
+    assert allocations
+    assert sorted([rid - 1 for *_, rid in allocations] + dropped) == [0, 1, 2]
+    _check(scheduler, rules, allocations, unavailable)
+
+def test_scheduler_leaves_out_rules_larger_than_the_link():
+    rules = [(2000, 1), (100, 1)]
+    scheduler = SlotScheduler(bandwidth=10, time=100)
+    allocations, dropped = scheduler.schedule(rules)
+    assert 0 in dropped
+    assert all(rid != 1 for *_, rid in allocations)
+    _check(scheduler, rules, allocations)
+
+def _best_groups(rules, slot_area):
+    """
+    Closest totals under and over the slot area by brute force
+    """
+    from itertools import combinations
+    totals = [sum(area for area, _ in group) for n in range(len(rules) + 1) for group in combinations(rules, n)]
+    under = max(total for total in totals if total <= slot_area)
+    over = min((total for total in totals if total > slot_area), default=inf)
+    return under, over
+
+@pytest.mark.parametrize("seed", range(5))
+def test_subset_sum_is_exact(seed):
+    rng = random.Random(seed)
+    rules = [(rng.randint(1, 100), rid) for rid in range(1, 11)]
+    slot_area = rng.randint(50, 400)
+    best_under, under_sum, best_over, over_sum = find_best_over_and_best_under(rules, slot_area)
+    assert (under_sum, over_sum) == _best_groups(rules, slot_area)
+    assert sum(area for area, _ in best_under) == under_sum
+    assert sum(area for area, _ in best_over) == over_sum
+
+def test_subset_sum_prefers_fewer_rules():
+    best_under, under_sum, _, _ = find_best_over_and_best_under([(1, 1), (2, 2), (3, 3)], 3)
+    assert under_sum == 3 and best_under == ((3, 3),)
+
+def test_subset_sum_without_a_group_over_the_slot():
+    _, under_sum, best_over, over_sum = find_best_over_and_best_under([(1, 1), (2, 2)], 10)
+    assert under_sum == 3 and best_over == () and over_sum == inf
+
+@pytest.mark.parametrize("seed", range(5))
+def test_subset_sum_with_epsilon_is_within_epsilon(seed):
+    rng = random.Random(seed)
+    rules = [(rng.uniform(1, 1000), rid) for rid in range(1, EXACT_MAX_RULES + 5)]
+    slot_area, epsilon = rng.uniform(2000, 6000), 0.01
+    best_under, under_sum, best_over, over_sum = find_best_over_and_best_under(rules, slot_area, epsilon)
+    under, over = _best_groups(rules, slot_area)
+    assert under - epsilon * slot_area <= under_sum <= slot_area
+    assert slot_area < over_sum <= over + epsilon * slot_area
+    assert sum(area for area, _ in best_under) == pytest.approx(under_sum)
+    assert sum(area for area, _ in best_over) == pytest.approx(over_sum)
+
+def _max_used(reservations, x1, x2):
+    return max((h for r1, r2, h in reservations if r1 < x2 and x1 < r2), default=0)
+
+def test_bandwidth_usage_tracks_the_highest_reservation():
+    usage = BandwidthUsage([(0, 10, 5), (5, 20, 3)], end=20)
+    assert usage.max_used(0, 5) == 5
+    assert usage.max_used(10, 20) == 3
+    assert usage.max_used(9.5, 10.5) == 5
+    assert usage.max_used(20, 30) == 0
+
+def test_bandwidth_usage_grows_past_its_end():
+    usage = BandwidthUsage(end=1)
+    usage.reserve(50, 120, 7)
+    assert usage.end >= 120
+    assert usage.max_used(100, 110) == 7
+    assert usage.max_used(0, 50) == 0
+
+@pytest.mark.parametrize("seed", range(5))
+def test_bandwidth_usage_matches_a_linear_scan(seed):
+    rng = random.Random(seed)
+    usage, reservations = BandwidthUsage(end=100), []
+    for _ in range(200):
+        x1 = rng.uniform(0, 150)
+        reservation = (x1, x1 + rng.uniform(0.001, 30), rng.uniform(0, 100))
+        usage.reserve(*reservation)
+        reservations.append(reservation)
+        q1 = rng.uniform(0, 180)
+        q2 = q1 + rng.uniform(0.001, 40)
+        assert usage.max_used(q1, q2) == _max_used(reservations, q1, q2)
+
+def _next_slots(unavailable, total):
+    """
+    Free slots one reservation at a time, what get_next_slot computes with arrays
+    """
+    t_x1, t_x2, t_h = total[0]
+    regions, current_y = [], 0
+    for u_x1, u_x2, u_h in sorted(unavailable, key=lambda u: (u[0], u[2])):
+        if u_h <= current_y:
+            continue
+        if u_x1 > t_x1:
+            regions.append((t_x1, u_x1, current_y, t_h))
+        regions.append((t_x1, u_x1, current_y, u_h))
+        current_y = u_h
+    if current_y < t_h:
+        regions.append((t_x1, t_x2, current_y, t_h))
+    return sorted((r for r in regions if r[1] > r[0] and r[3] > r[2]), key=lambda r: (r[2], r[0], -r[3], r[1]))
+
+def test_next_slot_steps_up_at_every_higher_reservation():
+    assert get_next_slot([(20, 40, 6), (60, 100, 8)], [(0, 100, 10)]) == [
+        (0, 20, 0, 10), (0, 20, 0, 6), (0, 60, 6, 10), (0, 60, 6, 8), (0, 100, 8, 10)
+    ]
+    assert get_next_slot([], [(0, 100, 10)]) == [(0, 100, 0, 10)]
+    assert get_next_slot([(0, 10, 4)], []) == []
+
+@pytest.mark.parametrize("seed", range(20))
+def test_next_slot_matches_a_reservation_by_reservation_scan(seed):
+    rng = random.Random(seed)
+    unavailable = []
+    for _ in range(rng.randint(0, 30)):
+        x1 = rng.choice([0, rng.randint(0, 100)])
+        unavailable.append((x1, x1 + rng.randint(1, 50), rng.randint(1, 12)))
+    total = [(0, 100, 10)]
+    assert get_next_slot(unavailable, total) == _next_slots(unavailable, total)